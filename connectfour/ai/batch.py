@@ -0,0 +1,195 @@
+"""Many Connect Four games at once, as NumPy arrays.
+
+This follows the same rules as Board (any dimensions, any num_to_win, any
+number of colors), but plays and checks for wins in every game with a few
+vectorized operations. It is meant for running large numbers of random
+playouts or self-play games.
+
+NumPy is optional for the rest of connectfour, but required here.
+"""
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Grid value of an empty position. Other positions hold their Color's value
+# plus one.
+EMPTY = 0
+
+# Row and column steps of the four directions a line can run in
+DIRECTIONS = ((0, 1), (1, 0), (1, 1), (1, -1))
+
+
+class BatchBoard(object):
+    """A batch of Connect Four boards with the same dimensions."""
+
+    def __init__(self, num_games, num_rows, num_columns, num_to_win):
+        """Create a batch of empty boards.
+
+        Args:
+            num_games (int): Number of boards in the batch.
+            num_rows (int): Number of rows in each board.
+            num_columns (int): Number of columns in each board.
+            num_to_win (int): Number in a row needed to win.
+        Raises:
+            ImportError: If NumPy is not installed.
+        """
+        if np is None:
+            raise ImportError('BatchBoard requires numpy')
+
+        self.num_games = num_games
+        self.num_rows = num_rows
+        self.num_columns = num_columns
+        self.num_to_win = num_to_win
+
+        # Row 0 is the top row, as in Board
+        self.grid = np.zeros((num_games, num_rows, num_columns), dtype=np.int8)
+        self.heights = np.zeros((num_games, num_columns), dtype=np.int32)
+        self._game_indices = np.arange(num_games)
+
+    def __repr__(self):
+        return ('{} num_games={} num_rows={} num_columns={} num_to_win={}'
+                .format(self.__class__.__name__, self.num_games, self.num_rows,
+                        self.num_columns, self.num_to_win))
+
+    def reset(self):
+        """Empty every board."""
+        self.grid[:] = EMPTY
+        self.heights[:] = 0
+
+    def get_legal_mask(self):
+        """Find the columns that can be played in, in every game.
+
+        Returns:
+            numpy.ndarray: Boolean array of shape (num_games, num_columns),
+                True where a column is not full.
+        """
+        return self.heights < self.num_rows
+
+    def is_full(self):
+        """Determine which boards are entirely full.
+
+        Returns:
+            numpy.ndarray: Boolean array of shape (num_games,).
+        """
+        return (self.heights == self.num_rows).all(axis=1)
+
+    def drop(self, columns, values, active=None):
+        """Play a color in one column of each game.
+
+        Args:
+            columns: Array of shape (num_games,) of the column to play in,
+                in each game.
+            values: The Color value to play, either one int for every game
+                or an array of shape (num_games,).
+            active (Optional): Boolean array of shape (num_games,). Only
+                games where this is True are played in.
+        Returns:
+            numpy.ndarray: Array of shape (num_games,) of the row each color
+                landed in, or -1 for inactive games.
+        Raises:
+            ValueError: If a column is out of bounds or full, in an active
+                game.
+        """
+        columns = np.asarray(columns)
+        values = np.broadcast_to(np.asarray(values), (self.num_games,))
+        games = self._game_indices
+
+        if active is not None:
+            games = games[active]
+            columns = columns[active]
+            values = values[active]
+
+        if ((columns < 0) | (columns >= self.num_columns)).any():
+            raise ValueError('Column out of bounds')
+
+        heights = self.heights[games, columns]
+        if (heights >= self.num_rows).any():
+            raise ValueError('Column is full')
+
+        rows = self.num_rows - 1 - heights
+        self.grid[games, rows, columns] = values + 1
+        self.heights[games, columns] += 1
+
+        all_rows = np.full(self.num_games, -1)
+        all_rows[games] = rows
+        return all_rows
+
+    def has_line(self, values):
+        """Determine which games have num_to_win of a color in a row.
+
+        Lines are found with sliding-window sums in each direction, over
+        every game at once.
+
+        Args:
+            values: The Color value to check for, either one int for every
+                game or an array of shape (num_games,).
+        Returns:
+            numpy.ndarray: Boolean array of shape (num_games,).
+        """
+        values = np.broadcast_to(np.asarray(values), (self.num_games,))
+        matches = (self.grid == (values + 1)[:, None, None]).astype(np.int32)
+        has_line = np.zeros(self.num_games, dtype=bool)
+        length = self.num_to_win - 1
+
+        for row_step, column_step in DIRECTIONS:
+            # Number of windows of num_to_win in each dimension
+            num_row_windows = self.num_rows - length * row_step
+            num_column_windows = self.num_columns - length * abs(column_step)
+            if num_row_windows <= 0 or num_column_windows <= 0:
+                continue
+
+            sums = np.zeros(
+                (self.num_games, num_row_windows, num_column_windows),
+                dtype=np.int32)
+
+            for i in range(self.num_to_win):
+                row = i * row_step
+                if column_step >= 0:
+                    column = i * column_step
+                else:
+                    column = length - i
+
+                sums += matches[:, row:row + num_row_windows,
+                                column:column + num_column_windows]
+
+            has_line |= (sums == self.num_to_win).any(axis=(1, 2))
+
+        return has_line
+
+    def play_random_games(self, num_players, rng=None):
+        """Play every game to the end with random plays.
+
+        Players take turns with Color values 0 to num_players - 1, starting
+        with 0. Boards are not reset first, so games can be continued from
+        positions already set up (in which case player 0 plays next).
+
+        Args:
+            num_players (int): Number of players.
+            rng (Optional[numpy.random.Generator]): Source of randomness.
+        Returns:
+            numpy.ndarray: Array of shape (num_games,) of the Color value of
+                each game's winner, or -1 for a draw.
+        """
+        if rng is None:
+            rng = np.random.default_rng()
+
+        winners = np.full(self.num_games, -1)
+        active = ~self.is_full()
+        value = 0
+
+        while active.any():
+            # Pick a random legal column in every game
+            scores = rng.random((self.num_games, self.num_columns))
+            scores[~self.get_legal_mask()] = -1
+            columns = scores.argmax(axis=1)
+
+            self.drop(columns, value, active=active)
+
+            won = active & self.has_line(value)
+            winners[won] = value
+            active &= ~won & ~self.is_full()
+            value = (value + 1) % num_players
+
+        return winners
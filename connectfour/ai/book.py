@@ -0,0 +1,227 @@
+"""Opening book of precomputed best plays, stored in a binary file.
+
+The file is a header followed by fixed-size records, sorted by position key.
+It is read through mmap and searched with binary search, so opening it is
+instant, and processes that open the same file share one copy in memory.
+
+Positions are keyed by their turn order hashes as two-player games (see
+Board.get_turn_order_hashes), so the book works for any pair of colors. A
+position and its left-right reflection share a key.
+"""
+
+import mmap
+import os
+import struct
+
+from connectfour.ai.search import NegamaxSearch, is_decided
+from connectfour.ai.transposition import TranspositionTable
+
+DEFAULT_BOOK_PATH = os.path.join(os.path.dirname(__file__),
+                                 'opening_book.bin')
+DEFAULT_NUM_PLIES = 4
+
+BOOK_MAGIC = b'C4OB'
+BOOK_VERSION = 1
+
+# Magic, version, num_rows, num_columns, num_to_win, number of records
+HEADER = struct.Struct('>4sBBBBI')
+
+# Key, score, column (plus padding to 16 bytes)
+RECORD = struct.Struct('>Qib3x')
+
+# The book opened by get_default_book (False if there is no book file)
+_default_book = None
+
+
+class OpeningBook(object):
+    """A read-only opening book, memory-mapped from a file."""
+
+    def __init__(self, path):
+        """Open a book.
+
+        Args:
+            path (str): The book file, as written by write_book.
+        Raises:
+            ValueError: If the file is not a book of a supported version.
+        """
+        self.path = path
+
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if len(self._mmap) < HEADER.size:
+            raise ValueError('{} is not an opening book'.format(path))
+
+        (magic, version, self.num_rows, self.num_columns, self.num_to_win,
+            self.num_records) = HEADER.unpack_from(self._mmap, 0)
+
+        if magic != BOOK_MAGIC or version != BOOK_VERSION:
+            raise ValueError('{} is not a version {} opening book'
+                             .format(path, BOOK_VERSION))
+
+    def __repr__(self):
+        return '{} path={} num_records={}'.format(
+            self.__class__.__name__, self.path, self.num_records)
+
+    def __len__(self):
+        return self.num_records
+
+    def close(self):
+        """Close the book's memory map."""
+        self._mmap.close()
+
+    def lookup(self, board):
+        """Look up the best play for a position.
+
+        Args:
+            board (Board): The board, with plays made by two players taking
+                turns.
+        Returns:
+            tuple: The best column and its score for the player to play,
+                or None if the position is not in the book.
+        """
+        if (board.num_rows, board.num_columns, board.num_to_win) != (
+                self.num_rows, self.num_columns, self.num_to_win):
+            return None
+
+        key, is_mirrored = get_book_key(board)
+
+        low = 0
+        high = self.num_records
+
+        while low < high:
+            middle = (low + high) // 2
+            record_key, score, column = RECORD.unpack_from(
+                self._mmap, HEADER.size + middle * RECORD.size)
+
+            if record_key < key:
+                low = middle + 1
+            elif record_key > key:
+                high = middle
+            else:
+                if is_mirrored:
+                    column = board.right_column - column
+                return column, score
+
+        return None
+
+
+def get_default_book():
+    """Get the book at DEFAULT_BOOK_PATH, opening it the first time.
+
+    Returns:
+        OpeningBook: The book, or None if there is no book file.
+    """
+    global _default_book
+
+    if _default_book is None:
+        if os.path.exists(DEFAULT_BOOK_PATH):
+            _default_book = OpeningBook(DEFAULT_BOOK_PATH)
+        else:
+            _default_book = False
+
+    return _default_book or None
+
+
+def get_book_key(board):
+    """Get the key of a position in a book.
+
+    Args:
+        board (Board): The board, with plays made by two players taking
+            turns.
+    Returns:
+        tuple: The key, and whether the book stores the position's
+            reflection rather than the position itself (in which case the
+            book's columns must be reflected too).
+    """
+    key, mirror_key = board.get_turn_order_hashes(2)
+    return min(key, mirror_key), mirror_key < key
+
+
+def generate_book(board, colors, num_plies=DEFAULT_NUM_PLIES,
+                  max_depth=None, max_time=1.0):
+    """Search every position up to some number of plays in.
+
+    Positions where the game is already over are skipped. So are
+    reflections of positions already searched.
+
+    Args:
+        board (Board): The empty board to start from. Not modified.
+        colors: A 2-tuple of the colors for the first and second player
+            to play in the searches. The book does not depend on which
+            colors are used.
+        num_plies (Optional[int]): Book positions have up to this many plays.
+        max_depth (Optional[int]): Number of plays to look ahead from each
+            position. Defaults to the rest of the game.
+        max_time (Optional[float]): Seconds to search each position for.
+            None to always search to max_depth.
+    Yields:
+        tuple: A record in format (key, score, column), in the book's
+            orientation of the position.
+    """
+    if max_depth is None:
+        max_depth = board.num_rows * board.num_columns
+
+    search = NegamaxSearch(max_depth=max_depth, max_nodes=None,
+                           table=TranspositionTable())
+    seen = set()
+    positions = [board.copy()]
+
+    for num_plays in range(num_plies + 1):
+        color, other_color = colors
+        if num_plays % 2:
+            color, other_color = other_color, color
+
+        next_positions = []
+
+        for board in positions:
+            key, is_mirrored = get_book_key(board)
+            if key in seen:
+                continue
+            seen.add(key)
+
+            if max_time is None:
+                column, score = search.search(board, color, other_color)
+            else:
+                column, score = search.iterative_search(
+                    board, color, other_color, max_time)
+
+            if column is None:
+                continue
+
+            if is_mirrored:
+                column = board.right_column - column
+            yield key, score, column
+
+            if num_plays == num_plies or is_decided(score):
+                continue
+
+            for next_column in range(board.num_columns):
+                if (board.is_column_full(next_column) or
+                        board.is_winning_column(next_column, color)):
+                    continue
+
+                next_board = board.copy()
+                next_board.play(next_column, color)
+                next_positions.append(next_board)
+
+        positions = next_positions
+
+
+def write_book(path, board, records):
+    """Write a book file.
+
+    Args:
+        path (str): Where to write the book.
+        board (Board): A board with the book's dimensions.
+        records: Iterable of records in format (key, score, column).
+    """
+    records = sorted(records)
+
+    with open(path, 'wb') as f:
+        f.write(HEADER.pack(BOOK_MAGIC, BOOK_VERSION, board.num_rows,
+                            board.num_columns, board.num_to_win,
+                            len(records)))
+
+        for key, score, column in records:
+            f.write(RECORD.pack(key, score, column))
@@ -0,0 +1,217 @@
+"""Monte Carlo tree search for games with any number of players.
+
+The search uses UCT (upper confidence bounds applied to trees), with a
+reward for each player: 1 for a win, 0 for a loss, and 1 / num_players each
+for a draw. Each player chooses plays to maximize their own reward.
+
+New positions are scored by a batch of random playouts, made with play and
+undo on a copy of the board, so the board being searched is never modified.
+"""
+
+import math
+import random
+import time
+
+DEFAULT_MAX_PLAYOUTS = 5000
+DEFAULT_BATCH_SIZE = 8
+DEFAULT_EXPLORATION = math.sqrt(2)
+
+
+class MonteCarloSearch(object):
+    """Monte Carlo tree search for any number of players."""
+
+    def __init__(self, max_playouts=DEFAULT_MAX_PLAYOUTS, max_time=None,
+                 batch_size=DEFAULT_BATCH_SIZE,
+                 exploration=DEFAULT_EXPLORATION, rng=None):
+        """Create a search.
+
+        Args:
+            max_playouts (Optional[int]): Number of random playouts to make.
+                None for no limit (in which case max_time is required).
+            max_time (Optional[float]): Seconds to search for. None for no
+                limit.
+            batch_size (Optional[int]): Number of playouts made from each
+                new position.
+            exploration (Optional[float]): How much to favor plays that
+                have been tried less often.
+            rng (Optional[random.Random]): Source of randomness.
+        """
+        if max_playouts is None and max_time is None:
+            raise ValueError('Need a playout limit or a time limit')
+
+        self.max_playouts = max_playouts
+        self.max_time = max_time
+        self.batch_size = batch_size
+        self.exploration = exploration
+        self.rng = rng or random.Random()
+        self.num_playouts = 0
+
+    def find_best_column(self, board, colors, player_index):
+        """Find the best column for a player to play in.
+
+        Args:
+            board (Board): The board to search. Not modified.
+            colors (list): Colors of all the players, in playing order.
+            player_index (int): Index in colors of the player to play.
+        Returns:
+            int: The best column, or None if the board is full.
+        """
+        board = board.copy()
+        self.num_playouts = 0
+
+        color = colors[player_index]
+        winning_columns = board.get_winning_columns(color)
+        if winning_columns:
+            return winning_columns[0]
+
+        root = _Node(board, None, None, player_index, len(colors))
+        if not root.untried_columns:
+            return None
+
+        deadline = None
+        if self.max_time is not None:
+            deadline = time.monotonic() + self.max_time
+
+        # At least once, so that there is a column to choose even if the
+        # deadline has already passed
+        self._iterate(root, board, colors)
+
+        while ((self.max_playouts is None or
+                self.num_playouts < self.max_playouts) and
+               (deadline is None or time.monotonic() < deadline)):
+            self._iterate(root, board, colors)
+
+        best = max(root.children, key=lambda child: child.visits)
+        return best.column
+
+    def _iterate(self, root, board, colors):
+        """Select, expand, simulate, and back up once."""
+        node = root
+        num_plays = 0
+
+        # Select
+        while not node.untried_columns and node.children:
+            node = node.select_child(self.exploration)
+            board.play(node.column, colors[node.parent.player_index])
+            num_plays += 1
+
+        # Expand
+        if node.untried_columns and node.rewards is None:
+            column = node.untried_columns.pop()
+            color = colors[node.player_index]
+            is_win = board.is_winning_column(column, color)
+            board.play(column, color)
+            num_plays += 1
+            node = node.add_child(board, column, is_win, len(colors))
+
+        # Simulate
+        if node.rewards is not None:
+            rewards = [reward * self.batch_size for reward in node.rewards]
+        else:
+            rewards = [0.0] * len(colors)
+            for i in range(self.batch_size):
+                winner = self._playout(board, colors, node.player_index)
+                if winner is None:
+                    for index in range(len(colors)):
+                        rewards[index] += 1 / len(colors)
+                else:
+                    rewards[winner] += 1
+
+        self.num_playouts += self.batch_size
+
+        # Back up
+        while node is not None:
+            node.visits += self.batch_size
+            for index, reward in enumerate(rewards):
+                node.total_rewards[index] += reward
+            node = node.parent
+
+        for i in range(num_plays):
+            board.undo()
+
+    def _playout(self, board, colors, player_index):
+        """
+        Play randomly until the game ends, then undo the plays. Returns the
+        index of the winner, or None for a draw.
+        """
+        columns = [column for column in range(board.num_columns)
+                   if not board.is_column_full(column)]
+        num_players = len(colors)
+        num_plays = 0
+        winner = None
+
+        while columns:
+            index = self.rng.randrange(len(columns))
+            column = columns[index]
+            color = colors[player_index]
+
+            if board.is_winning_column(column, color):
+                winner = player_index
+                break
+
+            board.play(column, color)
+            num_plays += 1
+
+            if board.is_column_full(column):
+                columns[index] = columns[-1]
+                columns.pop()
+
+            player_index = (player_index + 1) % num_players
+
+        for i in range(num_plays):
+            board.undo()
+
+        return winner
+
+
+class _Node(object):
+    """A position in the search tree."""
+
+    __slots__ = ('parent', 'column', 'player_index', 'children',
+                 'untried_columns', 'visits', 'total_rewards', 'rewards')
+
+    def __init__(self, board, parent, column, player_index, num_players,
+                 rewards=None):
+        self.parent = parent
+        self.column = column
+        self.player_index = player_index
+        self.children = []
+        self.visits = 0
+        self.total_rewards = [0.0] * num_players
+
+        # For game-ending positions, the players' rewards
+        self.rewards = rewards
+
+        if rewards is None:
+            self.untried_columns = [
+                column for column in range(board.num_columns)
+                if not board.is_column_full(column)]
+            if not self.untried_columns:
+                self.rewards = [1 / num_players] * num_players
+        else:
+            self.untried_columns = []
+
+    def add_child(self, board, column, is_win, num_players):
+        """Add the child reached by playing in column, already played."""
+        player_index = (self.player_index + 1) % num_players
+
+        rewards = None
+        if is_win:
+            rewards = [0.0] * num_players
+            rewards[self.player_index] = 1.0
+
+        child = _Node(board, self, column, player_index, num_players,
+                      rewards=rewards)
+        self.children.append(child)
+        return child
+
+    def select_child(self, exploration):
+        """Select the child with the best upper confidence bound."""
+        log_visits = math.log(self.visits)
+        index = self.player_index
+
+        return max(
+            self.children,
+            key=lambda child: (
+                child.total_rewards[index] / child.visits +
+                exploration * math.sqrt(log_visits / child.visits)))
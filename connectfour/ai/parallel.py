@@ -0,0 +1,210 @@
+"""Negamax search split across processes, one root column per process.
+
+Each column that could be played is searched in a worker process of a
+ProcessPoolExecutor. Boards are sent to workers in their compact pickled
+form (dimensions and plays), and each worker keeps its own transposition
+table between searches.
+"""
+
+import atexit
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+import math
+import multiprocessing
+import os
+import time
+
+from connectfour.ai.search import (
+    NegamaxSearch, DEFAULT_MAX_DEPTH, DEFAULT_MAX_NODES, WIN_SCORE,
+    get_column_order)
+from connectfour.ai.transposition import TranspositionTable
+
+DEFAULT_NUM_WORKERS = os.cpu_count() or 1
+
+# Boards with fewer empty positions than this are searched in-process,
+# since they are searched quickly enough that sending them to workers would
+# only add overhead
+MIN_PARALLEL_EMPTY_POSITIONS = 16
+
+# Seconds of each worker's time budget to set aside for sending work and
+# results between processes
+WORKER_OVERHEAD_TIME = 0.005
+
+# To map numbers of workers to executors, so that worker processes (and
+# their tables) are reused between searches
+_executors = {}
+
+# In worker processes, the table shared by all searches in that process
+_worker_table = None
+
+
+class ParallelSearch(object):
+    """Negamax search with the root columns split across processes."""
+
+    def __init__(self, num_workers=DEFAULT_NUM_WORKERS,
+                 max_depth=DEFAULT_MAX_DEPTH, max_nodes=DEFAULT_MAX_NODES,
+                 max_time=None, table=None):
+        """Create a search.
+
+        Args:
+            num_workers (Optional[int]): Number of worker processes. With
+                one (or fewer), everything is searched in-process.
+            max_depth (Optional[int]): Number of plays to look ahead.
+            max_nodes (Optional[int]): Number of positions each worker may
+                visit (see NegamaxSearch). None for no limit.
+            max_time (Optional[float]): Seconds that find_best_column may
+                take. If given, workers use iterative deepening.
+            table (Optional[TranspositionTable]): Table for searches done
+                in-process. Workers use their own tables.
+        """
+        self.num_workers = num_workers
+        self.max_depth = max_depth
+        self.max_nodes = max_nodes
+        self.max_time = max_time
+        self.table = table
+
+    def find_best_column(self, board, color, other_color):
+        """Find the best column for a color to play in.
+
+        Args:
+            board (Board): The board to search. Not modified.
+            color (Color): The color to play.
+            other_color (Color): The opponent's color.
+        Returns:
+            int: The best column, or None if the board is full.
+        """
+        column, score = self.search(board, color, other_color)
+        return column
+
+    def search(self, board, color, other_color):
+        """Search a position.
+
+        Args:
+            board (Board): The board to search. Not modified.
+            color (Color): The color to play.
+            other_color (Color): The opponent's color.
+        Returns:
+            tuple: The best column (or None if the board is full), and its
+                score.
+        """
+        columns = [column for column in get_column_order(board)
+                   if not board.is_column_full(column)]
+        num_empty = (board.num_rows * board.num_columns
+                     - board.get_num_moves())
+
+        # Plays that must be made are found without searching
+        forced_columns = (board.get_winning_columns(color) or
+                          board.get_winning_columns(other_color))
+
+        if (self.num_workers <= 1 or len(columns) <= 1 or forced_columns or
+                num_empty < MIN_PARALLEL_EMPTY_POSITIONS):
+            return self._search_in_process(board, color, other_color)
+
+        max_time = None
+        deadline = None
+        if self.max_time is not None:
+            deadline = time.monotonic() + self.max_time
+
+            # Columns are searched in rounds when there are more columns
+            # than workers
+            num_rounds = math.ceil(len(columns) / self.num_workers)
+            max_time = max(0, self.max_time / num_rounds
+                           - WORKER_OVERHEAD_TIME)
+
+        executor = get_executor(self.num_workers)
+        futures = [
+            executor.submit(
+                _search_column, board, column, color, other_color,
+                self.max_depth, self.max_nodes, max_time)
+            for column in columns]
+
+        best_column = None
+        best_score = -WIN_SCORE
+
+        # Ties go to the column searched first (nearest the center). Once
+        # the deadline passes (e.g. while workers start up), only columns
+        # already searched are counted.
+        for column, future in zip(columns, futures):
+            timeout = None
+            if deadline is not None:
+                timeout = max(0, deadline - time.monotonic())
+
+            try:
+                score = future.result(timeout=timeout)
+            except TimeoutError:
+                future.cancel()
+                continue
+
+            if best_column is None or score > best_score:
+                best_column = column
+                best_score = score
+
+        # No column was searched in time, so look just one play ahead
+        if best_column is None:
+            return NegamaxSearch(max_depth=1).search(
+                board, color, other_color)
+
+        return best_column, best_score
+
+    def _search_in_process(self, board, color, other_color):
+        search = NegamaxSearch(
+            max_depth=self.max_depth, max_nodes=self.max_nodes,
+            table=self.table)
+
+        if self.max_time is None:
+            return search.search(board, color, other_color)
+        else:
+            return search.iterative_search(
+                board, color, other_color, self.max_time)
+
+
+def get_executor(num_workers):
+    """Get the process pool with some number of workers.
+
+    The pool is created the first time it is needed, and then reused. Its
+    workers are spawned rather than forked, since searches may be run from
+    a web server with threads and sockets that forked workers would copy.
+
+    Args:
+        num_workers (int): Number of worker processes.
+    Returns:
+        ProcessPoolExecutor: The pool.
+    """
+    if num_workers not in _executors:
+        _executors[num_workers] = ProcessPoolExecutor(
+            num_workers, mp_context=multiprocessing.get_context('spawn'))
+
+    return _executors[num_workers]
+
+
+@atexit.register
+def shutdown_executors():
+    """Shut down all process pools, dropping searches not yet started.
+
+    Called when the interpreter exits, and may be called earlier.
+    """
+    while _executors:
+        _, executor = _executors.popitem()
+        executor.shutdown(cancel_futures=True)
+
+
+def _search_column(board, column, color, other_color, max_depth, max_nodes,
+                   max_time):
+    """
+    In a worker process, search the position after color plays in column.
+    Returns the score of that play for color.
+    """
+    global _worker_table
+    if _worker_table is None:
+        _worker_table = TranspositionTable()
+
+    board.play(column, color)
+    search = NegamaxSearch(
+        max_depth=max_depth - 1, max_nodes=max_nodes, table=_worker_table)
+
+    if max_time is None:
+        reply, score = search.search(board, other_color, color)
+    else:
+        reply, score = search.iterative_search(
+            board, other_color, color, max_time)
+
+    return -score
@@ -0,0 +1,318 @@
+"""Negamax search for two-player games.
+
+The search plays and undoes moves on a copy of a Board, so the board being
+searched is never modified.
+"""
+
+import functools
+import random
+import time
+
+from connectfour.ai.transposition import Bound
+
+# Score of a win, before subtracting the number of plays it takes. Positional
+# scores from evaluate() are always much smaller than this.
+WIN_SCORE = 1000000
+
+DEFAULT_MAX_DEPTH = 8
+DEFAULT_MAX_NODES = 10000
+
+# Number of (color, num_rows, num_columns, num_to_win) combinations to keep
+# search keys for (see _get_search_key)
+SEARCH_KEY_CACHE_SIZE = 64
+
+
+class SearchTimeout(Exception):
+    """Raised inside a search when its deadline has passed."""
+
+
+class NegamaxSearch(object):
+    """Negamax search with alpha-beta pruning.
+
+    Scores are from the point of view of the color to play. A win is scored
+    as WIN_SCORE minus the number of plays on the board once it is made, so
+    faster wins score higher. Positions at the search horizon are scored by
+    evaluate().
+    """
+
+    def __init__(self, max_depth=DEFAULT_MAX_DEPTH,
+                 max_nodes=DEFAULT_MAX_NODES, max_time=None, table=None):
+        """Create a search.
+
+        Args:
+            max_depth (Optional[int]): Number of plays to look ahead.
+            max_nodes (Optional[int]): Number of positions to visit before
+                scoring all remaining positions at the horizon. None for
+                no limit.
+            max_time (Optional[float]): Seconds that find_best_column may
+                take. If given, find_best_column searches deeper and deeper
+                up to max_depth, until time runs out.
+            table (Optional[TranspositionTable]): Where to cache results.
+                Can be shared between searches (and between games) to
+                avoid searching the same positions again.
+        """
+        self.max_depth = max_depth
+        self.max_nodes = max_nodes
+        self.max_time = max_time
+        self.table = table
+        self.num_nodes = 0
+        self.depth_reached = 0
+
+    def find_best_column(self, board, color, other_color):
+        """Find the best column for a color to play in.
+
+        Args:
+            board (Board): The board to search. Not modified.
+            color (Color): The color to play.
+            other_color (Color): The opponent's color.
+        Returns:
+            int: The best column, or None if the board is full.
+        """
+        if self.max_time is None:
+            column, score = self.search(board, color, other_color)
+        else:
+            column, score = self.iterative_search(
+                board, color, other_color, self.max_time)
+
+        return column
+
+    def iterative_search(self, board, color, other_color, max_time):
+        """Search a position deeper and deeper, until time runs out.
+
+        Searches one play deep, then two, and so on up to max_depth. The
+        search in progress when max_time passes is abandoned. Earlier
+        searches fill the table (if any), which makes later ones faster.
+
+        The one-play search always finishes, so there is a result even if
+        max_time is very short.
+
+        Args:
+            board (Board): The board to search. Not modified.
+            color (Color): The color to play.
+            other_color (Color): The opponent's color.
+            max_time (float): Seconds to search for.
+        Returns:
+            tuple: The best column (or None if the board is full), and its
+                score, from the deepest search that finished.
+        """
+        deadline = time.monotonic() + max_time
+        board = board.copy()
+        num_empty = (board.num_rows * board.num_columns
+                     - board.get_num_moves())
+
+        result = self._search_root(board, color, other_color, 1)
+        num_nodes = self.num_nodes
+        self.depth_reached = 1
+
+        for depth in range(2, min(self.max_depth, num_empty) + 1):
+            if is_decided(result[1]):
+                break
+
+            try:
+                result = self._search_root(
+                    board, color, other_color, depth, deadline=deadline)
+            except SearchTimeout:
+                break
+            finally:
+                num_nodes += self.num_nodes
+
+            self.depth_reached = depth
+
+        self.num_nodes = num_nodes
+        return result
+
+    def search(self, board, color, other_color, depth=None):
+        """Search a position.
+
+        Args:
+            board (Board): The board to search. Not modified.
+            color (Color): The color to play.
+            other_color (Color): The opponent's color.
+            depth (Optional[int]): Number of plays to look ahead. Defaults
+                to max_depth.
+        Returns:
+            tuple: The best column (or None if the board is full), and its
+                score.
+        """
+        if depth is None:
+            depth = self.max_depth
+
+        self.depth_reached = depth
+        return self._search_root(board.copy(), color, other_color, depth)
+
+    def _search_root(self, board, color, other_color, depth, deadline=None):
+        """
+        Search a position on a board that may be modified. If deadline (in
+        terms of time.monotonic) passes, raises SearchTimeout and leaves the
+        board in an arbitrary state.
+        """
+        self.num_nodes = 0
+        self._deadline = deadline
+        self._node_limit = (self.max_nodes if self.max_nodes is not None
+                            else float('inf'))
+        self._column_order = get_column_order(board)
+        num_moves = board.get_num_moves()
+
+        winning_columns = board.get_winning_columns(color)
+        if winning_columns:
+            return winning_columns[0], WIN_SCORE - num_moves - 1
+
+        # A column the opponent would win in must be blocked
+        losing_columns = board.get_winning_columns(other_color)
+        if len(losing_columns) > 1:
+            return losing_columns[0], -(WIN_SCORE - num_moves - 2)
+
+        columns = losing_columns or self._get_playable_columns(board)
+        if not columns:
+            return None, 0
+
+        return self._search_columns(
+            board, color, other_color, columns, depth, -WIN_SCORE, WIN_SCORE)
+
+    def _negamax(self, board, color, other_color, depth, alpha, beta):
+        self.num_nodes += 1
+
+        if self._deadline is not None and time.monotonic() > self._deadline:
+            raise SearchTimeout()
+        num_moves = board.get_num_moves()
+
+        if board.get_winning_columns(color):
+            return WIN_SCORE - num_moves - 1
+
+        losing_columns = board.get_winning_columns(other_color)
+        if len(losing_columns) > 1:
+            return -(WIN_SCORE - num_moves - 2)
+
+        columns = losing_columns or self._get_playable_columns(board)
+        if not columns:
+            return 0
+
+        if depth <= 0 or self.num_nodes >= self._node_limit:
+            return evaluate(board, color, other_color)
+
+        column, score = self._search_columns(
+            board, color, other_color, columns, depth, alpha, beta)
+        return score
+
+    def _search_columns(self, board, color, other_color, columns, depth,
+                        alpha, beta):
+        """
+        Search the plays in some columns, consulting and updating the table.
+        Returns the best column and its score.
+        """
+        if self.table is not None:
+            key = board.get_hash() ^ _get_search_key(color, board)
+            entry = self.table.lookup(key)
+
+            # An entry whose column cannot be played here is for another
+            # position whose key collides with this one's
+            if entry is not None and entry[4] in columns:
+                _, entry_depth, bound, score, best_column = entry
+
+                if entry_depth >= depth:
+                    if bound is Bound.exact:
+                        return best_column, score
+                    elif bound is Bound.lower and score > alpha:
+                        alpha = score
+                    elif bound is Bound.upper and score < beta:
+                        beta = score
+
+                    if alpha >= beta:
+                        return best_column, score
+
+                # Try the best column from before first
+                columns = ([best_column] +
+                           [c for c in columns if c != best_column])
+
+        original_alpha = alpha
+        best_column = columns[0]
+        best_score = -WIN_SCORE
+
+        for column in columns:
+            board.play(column, color)
+            score = -self._negamax(
+                board, other_color, color, depth - 1, -beta, -alpha)
+            board.undo()
+
+            if score > best_score:
+                best_score = score
+                best_column = column
+
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        break
+
+        # Results cut short by the node budget are not stored, since they
+        # are not as deep as they claim to be
+        if self.table is not None and self.num_nodes < self._node_limit:
+            if best_score <= original_alpha:
+                bound = Bound.upper
+            elif best_score >= beta:
+                bound = Bound.lower
+            else:
+                bound = Bound.exact
+
+            self.table.store(key, depth, bound, best_score, best_column)
+
+        return best_column, best_score
+
+    def _get_playable_columns(self, board):
+        return [column for column in self._column_order
+                if not board.is_column_full(column)]
+
+
+def is_decided(score):
+    """Determine if a score means a forced win or loss.
+
+    Args:
+        score (int): A score returned by a search.
+    Returns:
+        bool: True if the score is a win or a loss, False otherwise.
+    """
+    return abs(score) >= WIN_SCORE // 2
+
+
+def evaluate(board, color, other_color):
+    """Score a position without searching it.
+
+    Args:
+        board (Board): The board to score.
+        color (Color): The color to play.
+        other_color (Color): The opponent's color.
+    Returns:
+        int: How many more open lines color has than other_color.
+    """
+    return (board.get_num_open_lines(color)
+            - board.get_num_open_lines(other_color))
+
+
+def get_column_order(board):
+    """Get a board's columns, center columns first.
+
+    Args:
+        board (Board): The board.
+    Returns:
+        list: The column numbers.
+    """
+    center = board.right_column / 2
+    return sorted(range(board.num_columns),
+                  key=lambda column: abs(column - center))
+
+
+def _get_search_key(color, board):
+    """
+    Get the key mixed into a position's hash, since the same discs can be
+    searched with either color to play, or on boards with other dimensions
+    (e.g. the empty board hashes to 0 at every size), or with a different
+    number needed to win.
+    """
+    return _get_search_key_for(color.value, board.num_rows,
+                               board.num_columns, board.num_to_win)
+
+
+@functools.lru_cache(maxsize=SEARCH_KEY_CACHE_SIZE)
+def _get_search_key_for(color_value, num_rows, num_columns, num_to_win):
+    rng = random.Random('{}:{}:{}:{}'.format(
+        color_value, num_rows, num_columns, num_to_win))
+    return rng.getrandbits(64)
@@ -0,0 +1,127 @@
+"""Transposition table for caching search results by position hash."""
+
+from enum import Enum
+
+DEFAULT_NUM_BUCKETS = 1 << 16
+
+
+class Bound(Enum):
+    """How a stored score relates to the true score of a position."""
+
+    exact, lower, upper = range(3)
+
+
+class TranspositionTable(object):
+    """A fixed-size table of search results, keyed by position hash.
+
+    The table has a fixed number of buckets, so its memory use is capped no
+    matter how many positions are stored. Each bucket has two slots:
+
+    -   A depth-preferred slot, which is only replaced by a result searched
+        at least as deeply (or by a newer result for the same position).
+
+    -   An always-replace slot, which holds whatever result was most recently
+        pushed out of the depth-preferred slot's way.
+
+    Entries are tuples in format (key, depth, bound, score, column).
+    """
+
+    def __init__(self, num_buckets=DEFAULT_NUM_BUCKETS):
+        """Create a table.
+
+        Args:
+            num_buckets (Optional[int]): Number of buckets. The table holds
+                at most twice this many entries.
+        """
+        self.num_buckets = num_buckets
+        self.clear()
+
+    def __repr__(self):
+        return '{} num_buckets={}'.format(
+            self.__class__.__name__, self.num_buckets)
+
+    def clear(self):
+        """Remove all entries and reset the statistics."""
+        self._depth_slots = [None] * self.num_buckets
+        self._recent_slots = [None] * self.num_buckets
+        self.num_hits = 0
+        self.num_misses = 0
+        self.num_stores = 0
+        self.num_replacements = 0
+
+    def lookup(self, key):
+        """Look up the entry for a position.
+
+        Args:
+            key (int): The position's hash.
+        Returns:
+            tuple: The entry in format (key, depth, bound, score, column),
+                or None if the position is not in the table.
+        """
+        index = key % self.num_buckets
+
+        entry = self._depth_slots[index]
+        if entry is not None and entry[0] == key:
+            self.num_hits += 1
+            return entry
+
+        entry = self._recent_slots[index]
+        if entry is not None and entry[0] == key:
+            self.num_hits += 1
+            return entry
+
+        self.num_misses += 1
+        return None
+
+    def store(self, key, depth, bound, score, column):
+        """Store the result of searching a position.
+
+        Args:
+            key (int): The position's hash.
+            depth (int): How many plays deep the position was searched.
+            bound (Bound): How score relates to the true score.
+            score (int): The score found.
+            column (int): The best column found, or None.
+        """
+        index = key % self.num_buckets
+        entry = (key, depth, bound, score, column)
+        self.num_stores += 1
+
+        current = self._depth_slots[index]
+
+        if current is None or current[0] == key or depth >= current[1]:
+            if current is not None and current[0] != key:
+                self.num_replacements += 1
+            self._depth_slots[index] = entry
+        else:
+            if self._recent_slots[index] is not None:
+                self.num_replacements += 1
+            self._recent_slots[index] = entry
+
+    def get_num_entries(self):
+        """Get the number of entries stored.
+
+        Returns:
+            int: The number of entries.
+        """
+        return (self.num_buckets - self._depth_slots.count(None)
+                + self.num_buckets - self._recent_slots.count(None))
+
+    def get_stats(self):
+        """Get statistics about how the table has been used.
+
+        Returns:
+            dict: Counts of hits, misses, stores, and replacements, plus the
+                hit rate and the number of entries.
+        """
+        num_lookups = self.num_hits + self.num_misses
+
+        return {
+            'hits': self.num_hits,
+            'misses': self.num_misses,
+            'hit_rate': self.num_hits / num_lookups if num_lookups else 0.0,
+            'stores': self.num_stores,
+            'replacements': self.num_replacements,
+            'entries': self.get_num_entries(),
+            'capacity': 2 * self.num_buckets,
+        }
@@ -28,6 +28,9 @@ FLASH_CYCLES = 10
 FLASH_CYCLE_TIME = 1000
 FLASH_WAIT_TIME = 500
 
+# Milliseconds to wait before an AI player plays, so that plays are visible
+AI_WAIT_TIME = 500
+
 WINDOW_TITLE = 'Connect Four'
 
 SETUP_TEXT = {
@@ -18,6 +18,7 @@ class GUIView(object):
         """
         self.pubsub = pubsub
         self.model = model
+        self.model.schedule_ai_play = self.schedule_ai_play
         self._create_subscriptions()
 
         # Initialize GUI window
@@ -48,6 +49,18 @@ class GUIView(object):
         """Quit the game."""
         self.window.quit()
 
+    def schedule_ai_play(self, ai_play):
+        """Make an AI play after a delay, without blocking the GUI.
+
+        Args:
+            ai_play (function): Makes the AI play when called.
+        """
+        def do_ai_play():
+            ai_play()
+            self.pubsub.do_queue()
+
+        self.window.after(config.AI_WAIT_TIME, do_ai_play)
+
     ###########################
     # Respond to model events #
     ###########################
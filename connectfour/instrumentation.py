@@ -0,0 +1,329 @@
+"""Statistics about how a PubSub is used, for finding where time goes.
+
+Collecting statistics is opt-in (see PubSub.enable_stats). A PubSubStats can
+be shared by many pubsubs (e.g. one per room) to collect totals for all of
+them.
+
+Also formats the web server's room counts (see RoomManager.get_metrics) for
+Prometheus.
+"""
+
+import inspect
+import math
+import random
+import time
+
+# Callback latencies kept per subscriber, for estimating percentiles
+DEFAULT_SAMPLE_SIZE = 1000
+
+# Latency percentiles to report, as fractions
+QUANTILES = (0.5, 0.9, 0.99)
+
+DEFAULT_PROMETHEUS_PREFIX = 'connectfour_pubsub'
+
+DEFAULT_ROOMS_PROMETHEUS_PREFIX = 'connectfour_rooms'
+
+
+class PubSubStats(object):
+    """Publish counts, queue depths, and callback latencies, per action."""
+
+    def __init__(self, sample_size=DEFAULT_SAMPLE_SIZE):
+        """Create empty statistics.
+
+        Args:
+            sample_size (Optional[int]): Number of latencies to keep per
+                subscriber to each action. Percentiles are estimated from a
+                uniform random sample of this size.
+        """
+        self.sample_size = sample_size
+        self._rng = random.Random()
+        self.reset()
+
+    def __repr__(self):
+        return '{} num_actions={}'.format(
+            self.__class__.__name__, len(self._actions))
+
+    def reset(self):
+        """Forget all statistics collected so far."""
+        # Keyed on action name, each an _ActionStats
+        self._actions = {}
+        self.max_queue_depth = 0
+
+    def record_publish(self, action, queue_depth):
+        """Count an action being published.
+
+        Args:
+            action (Action): The action.
+            queue_depth (int): Length of the queue once the action's
+                callbacks were queued.
+        """
+        stats = self._get_action_stats(action)
+        stats.num_publishes += 1
+
+        if queue_depth > stats.max_queue_depth:
+            stats.max_queue_depth = queue_depth
+
+            if queue_depth > self.max_queue_depth:
+                self.max_queue_depth = queue_depth
+
+    def call(self, action, callback, args, kwargs):
+        """Call a subscriber's callback, timing it.
+
+        If the callback returns an awaitable, returns an awaitable that
+        also includes the time until it finishes.
+
+        Args:
+            action (Action): The action the callback subscribed to.
+            callback (function): The callback.
+            args (tuple): Positional arguments for callback.
+            kwargs (dict): Keyword arguments for callback.
+        Returns:
+            Whatever callback returns.
+        """
+        start = time.perf_counter()
+        result = callback(*args, **kwargs)
+
+        if inspect.isawaitable(result):
+            return self._time_awaitable(action, callback, result, start)
+
+        self.record_latency(action, callback, time.perf_counter() - start)
+        return result
+
+    async def _time_awaitable(self, action, callback, awaitable, start):
+        try:
+            return await awaitable
+        finally:
+            self.record_latency(action, callback,
+                                time.perf_counter() - start)
+
+    def record_latency(self, action, callback, seconds):
+        """Record how long a subscriber's callback took.
+
+        Args:
+            action (Action): The action the callback subscribed to.
+            callback (function): The callback.
+            seconds (float): How long it took.
+        """
+        subscribers = self._get_action_stats(action).subscribers
+        name = get_callback_name(callback)
+
+        if name not in subscribers:
+            subscribers[name] = _LatencyStats()
+
+        stats = subscribers[name]
+        stats.num_calls += 1
+        stats.total_seconds += seconds
+
+        if seconds > stats.max_seconds:
+            stats.max_seconds = seconds
+
+        # Reservoir sampling, so every call is equally likely to be sampled
+        if len(stats.samples) < self.sample_size:
+            stats.samples.append(seconds)
+        else:
+            index = self._rng.randrange(stats.num_calls)
+            if index < self.sample_size:
+                stats.samples[index] = seconds
+
+    def get_dict(self):
+        """Get all statistics.
+
+        Returns:
+            dict: With 'max_queue_depth' (across all actions) and 'actions'.
+                'actions' is keyed on action name (e.g.
+                'ModelAction.color_played'), each with 'publishes',
+                'max_queue_depth', and 'subscribers'. 'subscribers' is keyed
+                on callback name, each with 'calls', 'total_seconds',
+                'mean_seconds', 'max_seconds', and a 'p50'-style key per
+                QUANTILES.
+        """
+        actions = {}
+
+        for action_name, stats in sorted(self._actions.items()):
+            subscribers = {}
+
+            for name, latency in sorted(stats.subscribers.items()):
+                subscriber = {
+                    'calls': latency.num_calls,
+                    'total_seconds': latency.total_seconds,
+                    'mean_seconds': latency.total_seconds / latency.num_calls,
+                    'max_seconds': latency.max_seconds,
+                }
+
+                for quantile, seconds in latency.get_quantiles():
+                    subscriber['p{:g}'.format(quantile * 100)] = seconds
+
+                subscribers[name] = subscriber
+
+            actions[action_name] = {
+                'publishes': stats.num_publishes,
+                'max_queue_depth': stats.max_queue_depth,
+                'subscribers': subscribers,
+            }
+
+        return {
+            'max_queue_depth': self.max_queue_depth,
+            'actions': actions,
+        }
+
+    def get_prometheus_text(self, prefix=DEFAULT_PROMETHEUS_PREFIX):
+        """Get all statistics in the Prometheus text exposition format.
+
+        Args:
+            prefix (Optional[str]): Prefix of every metric name.
+        Returns:
+            str: Publish counts (a counter), queue depth high-water marks
+                (a gauge), and callback latencies (a summary).
+        """
+        publishes = '{}_publishes_total'.format(prefix)
+        depth = '{}_max_queue_depth'.format(prefix)
+        latency = '{}_callback_seconds'.format(prefix)
+
+        lines = [
+            '# HELP {} Actions published.'.format(publishes),
+            '# TYPE {} counter'.format(publishes),
+        ]
+        for action_name, stats in sorted(self._actions.items()):
+            lines.append(_get_sample(publishes, stats.num_publishes,
+                                     action=action_name))
+
+        lines += [
+            '# HELP {} Most callbacks ever queued at once.'.format(depth),
+            '# TYPE {} gauge'.format(depth),
+        ]
+        for action_name, stats in sorted(self._actions.items()):
+            lines.append(_get_sample(depth, stats.max_queue_depth,
+                                     action=action_name))
+
+        lines += [
+            '# HELP {} Time taken by subscribed callbacks.'.format(latency),
+            '# TYPE {} summary'.format(latency),
+        ]
+        for action_name, stats in sorted(self._actions.items()):
+            for name, subscriber in sorted(stats.subscribers.items()):
+                labels = {'action': action_name, 'subscriber': name}
+
+                for quantile, seconds in subscriber.get_quantiles():
+                    lines.append(_get_sample(latency, seconds,
+                                             quantile='{:g}'.format(quantile),
+                                             **labels))
+
+                lines.append(_get_sample(latency + '_sum',
+                                         subscriber.total_seconds, **labels))
+                lines.append(_get_sample(latency + '_count',
+                                         subscriber.num_calls, **labels))
+
+        return '\n'.join(lines) + '\n'
+
+    def _get_action_stats(self, action):
+        name = get_action_name(action)
+
+        if name not in self._actions:
+            self._actions[name] = _ActionStats()
+
+        return self._actions[name]
+
+
+class _ActionStats(object):
+    """Statistics about one action."""
+
+    def __init__(self):
+        self.num_publishes = 0
+        self.max_queue_depth = 0
+
+        # Keyed on callback name, each a _LatencyStats
+        self.subscribers = {}
+
+
+class _LatencyStats(object):
+    """Statistics about one subscriber's callback for one action."""
+
+    def __init__(self):
+        self.num_calls = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self.samples = []
+
+    def get_quantiles(self):
+        """
+        Get (quantile, seconds) for each of QUANTILES, estimated from the
+        samples by the nearest-rank method.
+        """
+        samples = sorted(self.samples)
+        return [(quantile,
+                 samples[max(0, math.ceil(quantile * len(samples)) - 1)])
+                for quantile in QUANTILES]
+
+
+def get_rooms_prometheus_text(metrics,
+                              prefix=DEFAULT_ROOMS_PROMETHEUS_PREFIX):
+    """Get room counts in the Prometheus text exposition format.
+
+    Args:
+        metrics (dict): As returned by RoomManager.get_metrics.
+        prefix (Optional[str]): Prefix of every metric name.
+    Returns:
+        str: Open rooms and clients in them (gauges), and rooms closed
+            (a counter, labelled by reason).
+    """
+    rooms = '{}_open'.format(prefix)
+    clients = '{}_clients'.format(prefix)
+    evicted = '{}_evicted_total'.format(prefix)
+
+    return '\n'.join([
+        '# HELP {} Rooms open.'.format(rooms),
+        '# TYPE {} gauge'.format(rooms),
+        _get_sample(rooms, metrics.get('rooms', 0)),
+        '# HELP {} Clients in open rooms.'.format(clients),
+        '# TYPE {} gauge'.format(clients),
+        _get_sample(clients, metrics.get('clients', 0)),
+        '# HELP {} Rooms closed by the server.'.format(evicted),
+        '# TYPE {} counter'.format(evicted),
+        _get_sample(evicted, metrics.get('idle_evictions', 0),
+                    reason='idle'),
+        _get_sample(evicted, metrics.get('capacity_evictions', 0),
+                    reason='capacity'),
+    ]) + '\n'
+
+
+def get_action_name(action):
+    """Get the name that statistics about an action are reported under.
+
+    Args:
+        action (Action): The action.
+    Returns:
+        str: e.g. 'ModelAction.color_played'.
+    """
+    return '{}.{}'.format(action.__class__.__name__, action.name)
+
+
+def get_callback_name(callback):
+    """Get the name that statistics about a callback are reported under.
+
+    Args:
+        callback (function): The callback. May be a weakly referenced
+            callback from a PubSub.
+    Returns:
+        str: e.g. 'RoomState.on_color_played'.
+    """
+    # Weakly referenced callbacks
+    ref = getattr(callback, 'ref', None)
+    if ref is not None:
+        callback = ref()
+
+    return getattr(callback, '__qualname__', repr(callback))
+
+
+def _get_sample(name, value, **labels):
+    """Format one Prometheus sample line."""
+    if not labels:
+        return '{} {}'.format(name, value)
+
+    return '{}{{{}}} {}'.format(name, ','.join(
+        '{}="{}"'.format(key, _escape_label(str(label)))
+        for key, label in sorted(labels.items())), value)
+
+
+def _escape_label(value):
+    return (value.replace('\\', '\\\\').replace('"', '\\"')
+            .replace('\n', '\\n'))
@@ -1,14 +1,33 @@
+import copy
 from enum import Enum
-import operator
+import functools
 import random
-import time
+import sys
 
+from connectfour.ai.book import get_default_book
+from connectfour.ai.mcts import MonteCarloSearch
+from connectfour.ai.parallel import ParallelSearch
+from connectfour.ai.search import NegamaxSearch
+from connectfour.ai.transposition import TranspositionTable
 from connectfour.pubsub import ModelAction, ViewAction
 
 DEFAULT_ROWS = 6
 DEFAULT_COLUMNS = 7
 DEFAULT_TO_WIN = 4
-AI_WAIT_TIME = 0.5
+# Seconds that an expert AI may spend searching for each play
+DEFAULT_AI_MOVE_TIME = 1.0
+
+# Seconds that a hard AI may spend searching for each play in games of more
+# than two players. Kept short, since the GUI makes AI plays in its UI
+# thread.
+HARD_AI_MOVE_TIME = 0.1
+
+# Fixed so that position hashes agree between processes and runs
+ZOBRIST_SEED = 20160612
+
+# Board dimensions to keep Zobrist keys for (see get_zobrist_keys). Keys for
+# the largest boards take a few MB.
+ZOBRIST_CACHE_SIZE = 8
 
 
 class ConnectFourModel(object):
@@ -19,9 +38,13 @@ class ConnectFourModel(object):
 
     Dependencies between the core methods:
 
-    -   _create_board(), _add_player(), and _remove_player() cannot be called
-        when a game is in progress. There must be a board created and a player
-        added before calling _start_game().
+    -   _create_board() and _add_player() cannot be called when a game is in
+        progress. There must be a board created and a player added before
+        calling _start_game().
+
+    -   _remove_player() can be called during a game, which then goes on
+        without the removed player. If only one player is left, that player
+        wins.
 
     -   _add_player() can be called multiple times to add multiple players.
         Since each player must have a distinct color, the number of players is
@@ -36,13 +59,44 @@ class ConnectFourModel(object):
     -   _play() can only be called while a game is in progress.
     """
 
-    def __init__(self, pubsub):
-        """Create this model."""
+    def __init__(self, pubsub, ai_move_time=None, ai_workers=1,
+                 schedule_ai_play=None, ai_table=None, rng=None):
+        """Create this model.
+
+        Args:
+            pubsub (PubSub): The pubsub this model publishes to, and receives
+                view actions from.
+            ai_move_time (Optional[float]): Seconds that an AI player may
+                spend deciding on each play. None for each difficulty's
+                default (DEFAULT_AI_MOVE_TIME for expert, HARD_AI_MOVE_TIME
+                for hard).
+            ai_workers (Optional[int]): Number of processes that an expert
+                AI player may split its search across. With 1, searches run
+                in-process.
+            schedule_ai_play (Optional[function]): Called with an AIPlay,
+                which makes the current AI player's play when called. Views
+                can use this to delay AI plays without blocking, e.g. with a
+                timer in their event loop. Defaults to making the play right
+                away. Can also be set after creation.
+            ai_table (Optional[TranspositionTable]): Where expert AI
+                players cache search results. Defaults to AI_TABLE, shared
+                by all models. Can also be set after creation.
+            rng (Optional[random.Random]): Source of randomness for AI
+                players. Defaults to the random module's.
+        """
         self.pubsub = pubsub
+        self.ai_move_time = ai_move_time
+        self.ai_workers = ai_workers
+        self.schedule_ai_play = schedule_ai_play or _call_now
+        self.ai_table = AI_TABLE if ai_table is None else ai_table
+        self.rng = rng or random
         self.board = None
         self.players = []
         self.used_colors = set()
 
+        # To map pks to players, for players added with a pk
+        self._players_by_pk = {}
+
         self.game_in_progress = False
 
         # After being incremented, which player goes first in the next game
@@ -60,6 +114,7 @@ class ConnectFourModel(object):
             ViewAction.remove_player: self._remove_player,
             ViewAction.start_game: self._start_game,
             ViewAction.play: self._play,
+            ViewAction.rejoin_player: self._rejoin_player,
         }
 
         for action, response in responses.items():
@@ -78,6 +133,72 @@ class ConnectFourModel(object):
     def get_json_players(self):
         return [p.get_json() for p in self.players]
 
+    def get_snapshot(self):
+        """Get this model's state in a compact form that can be serialized
+        as JSON, e.g. to restore it after a restart.
+
+        Returns:
+            dict: The board (dimensions and plays, as pickled), the players,
+                which player goes first and next, and whether a game is in
+                progress. AI settings and subscriptions are not included.
+        """
+        return {
+            'board': (list(self.board.__getstate__())
+                      if self.board else None),
+            'players': [[player.name, player.color.value, player.is_ai,
+                         player.pk, player.num_wins, player.num_games,
+                         player.difficulty if player.is_ai else None]
+                        for player in self.players],
+            'firstPlayerIndex': self.first_player_index,
+            'currentPlayerIndex': self.current_player_index,
+            'gameInProgress': self.game_in_progress,
+        }
+
+    def restore_snapshot(self, snapshot):
+        """Replace this model's state with a snapshot's.
+
+        Nothing is published, since there is nothing to tell views about
+        until they ask for the state. If it is an AI player's turn, its
+        play is scheduled.
+
+        Args:
+            snapshot (dict): As returned by get_snapshot.
+        """
+        if snapshot['board'] is None:
+            self.board = None
+        else:
+            self.board = Board.__new__(Board)
+            self.board.__setstate__(snapshot['board'])
+
+        self.players = []
+        self.used_colors = set()
+        self._players_by_pk = {}
+
+        for (name, color, is_ai, pk, num_wins, num_games,
+                difficulty) in snapshot['players']:
+            player = Player(name=name, color=Color(color), is_ai=is_ai,
+                            pk=pk)
+            player.num_wins = num_wins
+            player.num_games = num_games
+
+            if is_ai:
+                player.difficulty = difficulty
+
+            self.players.append(player)
+            self.used_colors.add(player.color)
+
+            if pk is not None:
+                self._players_by_pk[pk] = player
+
+        self.first_player_index = snapshot['firstPlayerIndex']
+        self.current_player_index = snapshot['currentPlayerIndex']
+        self.game_in_progress = snapshot['gameInProgress']
+
+        if self.game_in_progress:
+            player = self.get_current_player()
+            if player.is_ai:
+                self.schedule_ai_play(AIPlay(self, player))
+
     def _create_board(self, num_rows=DEFAULT_ROWS, num_columns=DEFAULT_COLUMNS,
                       num_to_win=DEFAULT_TO_WIN):
         """Add a playing board.
@@ -118,11 +239,12 @@ class ConnectFourModel(object):
                 unique. Defaults to next available color.
             is_ai (Optional[bool]): Whether this player is AI.
             pk (Optional): An identifier for this player. While not required,
-                might be useful in a view.
+                might be useful in a view. Must be unique. Players can be
+                looked up by pk with get_player_by_pk().
 
         Raises:
             RuntimeError: If a game is currently in progress.
-            ValueError: If name is empty or if color is already in use.
+            ValueError: If color or pk is already in use.
         """
         if self.game_in_progress:
             raise RuntimeError('Cannot add player while a game is in progress')
@@ -130,6 +252,9 @@ class ConnectFourModel(object):
         if color in self.used_colors:
             raise ValueError('Color {} is already used'.format(color))
 
+        if pk is not None and pk in self._players_by_pk:
+            raise ValueError('pk {} is already used'.format(pk))
+
         if not color:
             color = self._get_unassigned_color()
             if not color:
@@ -141,6 +266,10 @@ class ConnectFourModel(object):
         self.used_colors.add(color)
         player = Player(name=name, color=color, is_ai=is_ai, pk=pk)
         self.players.append(player)
+
+        if pk is not None:
+            self._players_by_pk[pk] = player
+
         self.pubsub.publish(ModelAction.player_added, player=player)
 
     def _remove_player(self, player):
@@ -148,23 +277,84 @@ class ConnectFourModel(object):
 
         Publishes a player_removed ModelAction.
 
+        A player removed during a game (e.g. whose view left for good) is
+        skipped from then on, and the game goes on without it. If it was
+        the player's turn, a next_player ModelAction follows. Its plays
+        stay on the board. If that leaves one player, the game ends there,
+        with a game_won ModelAction (with no winning positions) for the
+        player left.
+
         Args:
             player (Player): The player to be removed.
         Raises:
-            RuntimeError: If a game is currently in progress.
             ValueError: If player not currently in the model.
         """
-        if self.game_in_progress:
-            raise RuntimeError('Cannot remove player while a game is in '
-                               'progress')
-
         if player not in self.players:
             raise ValueError('Player {} not in this model'.format(player))
 
+        index = self.players.index(player)
         self.players.remove(player)
         self.used_colors.remove(player.color)
+
+        if player.pk is not None:
+            del self._players_by_pk[player.pk]
         self.pubsub.publish(ModelAction.player_removed, player=player)
 
+        if self.game_in_progress:
+            self._skip_removed_player(index)
+
+    def _skip_removed_player(self, index):
+        """Keep the turn order of a game in progress after the player at
+        index was removed."""
+        if not self.players:
+            self.game_in_progress = False
+            return
+
+        # So that the player after the first goes first in the next game
+        if index <= self.first_player_index:
+            self.first_player_index -= 1
+
+        # Rather than have one player take every turn
+        if self.get_num_players() == 1:
+            self.current_player_index = 0
+            self._process_win(self.players[0], set())
+            return
+
+        if index < self.current_player_index:
+            self.current_player_index -= 1
+
+        elif index == self.current_player_index:
+            self.current_player_index %= self.get_num_players()
+            self._process_next_player()
+
+    def _rejoin_player(self, player, pk):
+        """Give a player a new pk, e.g. when its view reconnects.
+
+        Unlike adding players, this may be done while a game is in
+        progress. Publishes a player_rejoined ModelAction.
+
+        Args:
+            player (Player): The player.
+            pk: The player's new pk.
+        Raises:
+            ValueError: If player not currently in the model, or pk is
+                already used.
+        """
+        if player not in self.players:
+            raise ValueError('Player {} not in this model'.format(player))
+
+        if pk in self._players_by_pk:
+            raise ValueError('pk {} is already used'.format(pk))
+
+        old_pk = player.pk
+        if old_pk is not None:
+            del self._players_by_pk[old_pk]
+
+        player.pk = pk
+        self._players_by_pk[pk] = player
+        self.pubsub.publish(ModelAction.player_rejoined, player=player,
+                            old_pk=old_pk)
+
     def _start_game(self):
         """Start a new game.
 
@@ -258,7 +448,7 @@ class ConnectFourModel(object):
         self.pubsub.publish(ModelAction.next_player, player=player)
 
         if player.is_ai:
-            player.do_strategy(self)
+            self.schedule_ai_play(AIPlay(self, player))
 
     def _get_unassigned_color(self):
         if len(self.used_colors) == len(Color):
@@ -334,6 +524,16 @@ class ConnectFourModel(object):
 
         return self.players[index]
 
+    def get_player_by_pk(self, pk):
+        """Get the player with a particular pk.
+
+        Args:
+            pk: The pk the player was added with.
+        Returns:
+            Player: The player with pk, or None if there is no such player.
+        """
+        return self._players_by_pk.get(pk)
+
     def get_current_player(self):
         """Get the current player.
 
@@ -357,6 +557,82 @@ class ConnectFourModel(object):
             return ''
 
 
+class AIPlay(object):
+    """An AI player's play, scheduled to be made later.
+
+    Calling it decides on a column and plays it. Alternatively, the decision
+    can be made elsewhere (e.g. in another thread, so that an event loop is
+    not blocked) with choose_column(), and the play then made with
+    make_play().
+
+    Either way, the play is only made if the game has not moved on since it
+    was scheduled.
+    """
+
+    def __init__(self, model, player):
+        """Create a play for the current player.
+
+        Args:
+            model (ConnectFourModel): The model to play in.
+            player (Player): The AI player whose turn it is.
+        """
+        self.model = model
+        self.player = player
+        self.num_moves = model.board.get_num_moves()
+
+    def __repr__(self):
+        return '{} player={} num_moves={}'.format(
+            self.__class__.__name__, self.player, self.num_moves)
+
+    def __call__(self):
+        if self.is_current():
+            self.player.do_strategy(self.model)
+
+    def is_current(self):
+        """Determine if it is still this play's turn.
+
+        Returns:
+            bool: True if the game is in progress, it is the player's turn,
+                and no plays have been made since this was scheduled.
+        """
+        model = self.model
+        return (model.game_in_progress
+                and model.get_current_player() is self.player
+                and model.board.get_num_moves() == self.num_moves)
+
+    def choose_column(self):
+        """Decide which column to play in, without playing it.
+
+        The decision is made on a snapshot of the model, so the model may
+        change (e.g. in another thread) while this runs.
+
+        Returns:
+            int: The column.
+        """
+        snapshot = copy.copy(self.model)
+        snapshot.board = self.model.board.copy()
+        snapshot.players = list(self.model.players)
+        return self.player.choose_column(snapshot)
+
+    def make_play(self, column):
+        """Play in a column, if it is still this play's turn.
+
+        Args:
+            column (int): The column, e.g. from choose_column().
+        Returns:
+            bool: True if the play was made, False if it was stale.
+        """
+        if not self.is_current():
+            return False
+
+        self.model.process_play(column)
+        return True
+
+
+def _call_now(function):
+    function()
+
+
 class Color(Enum):
     """A color for a player to play in the board."""
 
@@ -379,6 +655,11 @@ class TryAgainReason(Enum):
 AI_EASY = 'easy'
 AI_MEDIUM = 'medium'
 AI_HARD = 'hard'
+AI_EXPERT = 'expert'
+
+# Search results shared by all expert AI players, so that positions seen in
+# earlier moves and games do not need to be searched again
+AI_TABLE = TranspositionTable()
 
 
 class Player(object):
@@ -424,15 +705,17 @@ class Player(object):
         }
 
     def do_strategy(self, model):
+        model.process_play(self.choose_column(model))
+
+    def choose_column(self, model):
         AI_STRATEGIES = {
             AI_EASY: self.easy_ai_strategy,
             AI_MEDIUM: self.medium_ai_strategy,
             AI_HARD: self.hard_ai_strategy,
+            AI_EXPERT: self.expert_ai_strategy,
         }
 
-        column = AI_STRATEGIES[self.difficulty](model)
-        time.sleep(AI_WAIT_TIME)
-        model.process_play(column)
+        return AI_STRATEGIES[self.difficulty](model)
 
     def easy_ai_strategy(self, model):
         return self.find_random_legal_column(model)
@@ -453,12 +736,55 @@ class Player(object):
         if column is not None:
             return column
 
+        if model.get_num_players() > 2:
+            return self.find_monte_carlo_column(model)
+
         return self.find_random_legal_column(model)
 
+    def expert_ai_strategy(self, model):
+        if model.get_num_players() != 2:
+            return self.hard_ai_strategy(model)
+
+        other_player = [p for p in model.players if p is not self][0]
+        board = model.board
+
+        book = get_default_book()
+        if book is not None:
+            entry = book.lookup(board)
+            if entry is not None:
+                column, score = entry
+                return column
+
+        max_depth = board.num_rows * board.num_columns
+        max_time = model.ai_move_time
+        if max_time is None:
+            max_time = DEFAULT_AI_MOVE_TIME
+
+        if model.ai_workers > 1:
+            search = ParallelSearch(
+                num_workers=model.ai_workers, max_depth=max_depth,
+                max_nodes=None, max_time=max_time, table=model.ai_table)
+        else:
+            search = NegamaxSearch(
+                max_depth=max_depth, max_nodes=None, max_time=max_time,
+                table=model.ai_table)
+
+        return search.find_best_column(board, self.color, other_player.color)
+
+    def find_monte_carlo_column(self, model):
+        colors = [player.color for player in model.players]
+        max_time = model.ai_move_time
+        if max_time is None:
+            max_time = HARD_AI_MOVE_TIME
+
+        search = MonteCarloSearch(max_time=max_time, rng=model.rng)
+        return search.find_best_column(
+            model.board, colors, model.players.index(self))
+
     def find_random_legal_column(self, model):
         columns = [c for c in range(model.get_num_columns())
                    if not model.board.is_column_full(c)]
-        return random.choice(columns)
+        return model.rng.choice(columns)
 
     def find_win(self, model):
         columns = [c for c in range(model.get_num_columns())
@@ -466,9 +792,7 @@ class Player(object):
         color = self.color
 
         for column in columns:
-            row = model.board.find_next_row(column)
-            if model.board.get_winning_positions(
-                    (row, column), fake_color=color):
+            if model.board.is_winning_column(column, color):
                 return column
 
         return None
@@ -478,19 +802,24 @@ class Player(object):
                    if not model.board.is_column_full(c)]
 
         for column in columns:
-            row = model.board.find_next_row(column)
-
             # TODO: order this in playing order
             for player in model.players:
-                if model.board.get_winning_positions(
-                        (row, column), fake_color=player.color):
+                if model.board.is_winning_column(column, player.color):
                     return column
 
         return None
 
 
 class Board(object):
-    """A Connect Four playing board."""
+    """A Connect Four playing board.
+
+    The board is stored as bitboards: one int per color, plus one int marking
+    every occupied position. Bits are laid out column by column, from the
+    bottom of each column up, with one extra always-empty bit on top of every
+    column. That empty bit keeps shifted bitboards from carrying a line of
+    discs from one column into the next, so win checks can be done with
+    shifts and masks.
+    """
 
     def __init__(self, num_rows, num_columns, num_to_win):
         """Create a board.
@@ -509,8 +838,59 @@ class Board(object):
         self.left_column = 0
         self.right_column = num_columns - 1
 
-        self.grid = [[None for column in range(num_columns)]
-                     for row in range(num_rows)]
+        # Bits per column, including the empty bit on top
+        self._column_bits = num_rows + 1
+        self._board_mask = 0
+        self._bottom_mask = 0
+        for column in range(num_columns):
+            self._board_mask |= (((1 << num_rows) - 1)
+                                 << (column * self._column_bits))
+            self._bottom_mask |= 1 << (column * self._column_bits)
+
+        # Bit shifts to step horizontally, vertically, and along both
+        # diagonals
+        self._shifts = (
+            self._column_bits, 1, self._column_bits + 1, self._column_bits - 1,
+        )
+
+        # For each direction, the shifts that reduce a bitboard to the bits
+        # starting a line of num_to_win (see _has_line)
+        self._line_shifts = [_get_line_shifts(shift, num_to_win)
+                             for shift in self._shifts]
+
+        # For each direction, the shifts to each of the other positions in a
+        # line (see _get_completions)
+        self._completion_shifts = [
+            [i * shift for i in range(1, num_to_win)]
+            for shift in self._shifts]
+
+        # One bitboard per color (indexed by Color value), and one for all
+        # occupied positions
+        self._bitboards = [0] * len(Color)
+        self._mask = 0
+
+        # Number of discs in each column, and in the whole board
+        self._heights = [0] * num_columns
+        self._num_filled = 0
+
+        # Stack of (column, color) plays, most recent last
+        self._moves = []
+
+        # Zobrist hashes of this position and of its left-right reflection
+        self._zobrist_keys, self._mirror_zobrist_keys = get_zobrist_keys(
+            num_rows, num_columns)
+        self._hash = 0
+        self._mirror_hash = 0
+
+        # Cached grid for get_json, with the number of plays (from the
+        # start of _moves) it includes, and the height of each column in it.
+        # Rows are replaced rather than changed, so rows already returned
+        # can be shared. The last result of get_json is kept too, for when
+        # there have been no plays since.
+        self._json_grid = None
+        self._json_num_moves = 0
+        self._json_heights = None
+        self._json = None
 
     def __repr__(self):
         return '{} num_rows={} num_columns={} num_to_win={}'.format(
@@ -521,48 +901,117 @@ class Board(object):
         return '{} rows x {} columns ({} to win)'.format(
             self.num_rows, self.num_columns, self.num_to_win)
 
+    @property
+    def grid(self):
+        """list: The board as a list of rows, each a list of Colors or None."""
+        return [[self.get_color((row, column))
+                 for column in range(self.num_columns)]
+                for row in range(self.num_rows)]
+
+    def copy(self):
+        """Get a copy of this board, with the same plays in the same order.
+
+        Returns:
+            Board: The copy.
+        """
+        board = Board(self.num_rows, self.num_columns, self.num_to_win)
+
+        for column, color in self._moves:
+            board.play(column, color)
+
+        return board
+
+    def __getstate__(self):
+        """Get a compact state to pickle, e.g. to send to another process.
+
+        Only the dimensions and the plays are kept. Everything else is
+        rebuilt by replaying the plays when unpickled.
+        """
+        plays = tuple(column * len(Color) + color.value
+                      for column, color in self._moves)
+        return (self.num_rows, self.num_columns, self.num_to_win, plays)
+
+    def __setstate__(self, state):
+        num_rows, num_columns, num_to_win, plays = state
+        self.__init__(num_rows, num_columns, num_to_win)
+
+        for play in plays:
+            column, value = divmod(play, len(Color))
+            self.play(column, Color(value))
+
     def get_json(self):
-        new_grid = []
+        """Get this board in a form that can be serialized as JSON.
 
-        for row in self.grid:
-            new_row = []
-            for item in row:
-                if item:
-                    new_row.append(item.name)
-                else:
-                    new_row.append(None)
-            new_grid.append(new_row)
+        The grid is cached and brought up to date with only the rows
+        changed by plays made since the last call, so that sending the board
+        (e.g. to each new spectator) does not rebuild or copy it position by
+        position. Rows are shared between results, so results must not be
+        changed.
 
-        return {
+        Returns:
+            dict: The dimensions, number of plays made, and grid (a list of
+                rows, each a list of color names or None).
+        """
+        num_moves = len(self._moves)
+        if self._json is not None and self._json_num_moves == num_moves:
+            return self._json
+
+        if self._json_grid is None:
+            empty_row = [None] * self.num_columns
+            self._json_grid = [empty_row] * self.num_rows
+            self._json_num_moves = 0
+            self._json_heights = [0] * self.num_columns
+
+        grid = self._json_grid
+        heights = self._json_heights
+
+        # Each changed row is copied once, however many plays landed in it
+        changed_rows = set()
+        for column, color in self._moves[self._json_num_moves:]:
+            row = self.bottom_row - heights[column]
+            if row not in changed_rows:
+                grid[row] = grid[row][:]
+                changed_rows.add(row)
+
+            grid[row][column] = color.name
+            heights[column] += 1
+
+        self._json_num_moves = num_moves
+        self._json = {
             'numRows': self.num_rows,
             'numColumns': self.num_columns,
             'numToWin': self.num_to_win,
-            'grid': new_grid,
+            'numMoves': num_moves,
+            'grid': grid[:],
         }
+        return self._json
 
     def reset(self):
         """Reset this board for a new game.
 
         Sets all positions in this board's grid to None.
         """
-        for row in range(self.num_rows):
-            for column in range(self.num_columns):
-                self.grid[row][column] = None
+        self._bitboards = [0] * len(Color)
+        self._mask = 0
+        self._heights = [0] * self.num_columns
+        self._num_filled = 0
+        self._moves = []
+        self._hash = 0
+        self._mirror_hash = 0
+        self._json_grid = None
+        self._json = None
 
     def find_next_row(self, column):
         """Find the row where a disc would land if played in this column."""
         if not self.is_column_in_bounds(column):
             raise ValueError('Column {} out of bounds'.format(column))
 
-        if self.is_column_full(column):
-            raise ValueError('Column {} is full'.format(column))
-
-        current_row = self.bottom_row
+        height = self._heights[column]
 
-        while self.get_color((current_row, column)) is not None:
-            current_row -= 1
+        if height == self.num_rows:
+            raise ValueError('Column {} is full'.format(column))
 
-        return current_row
+        return self.bottom_row - height
 
     def add_color(self, color, column):
         """Add a color to a column.
@@ -575,9 +1024,142 @@ class Board(object):
         Raises:
             ValueError: If column is full or out of bounds.
         """
-        row = self.find_next_row(column)
-        self.grid[row][column] = color
-        return row
+        self.find_next_row(column)
+        return self.play(column, color)
+
+    def play(self, column, color):
+        """Play a color in a column, so that it can later be undone.
+
+        Unlike add_color, this does no error checking, so that search code
+        can make and take back many plays cheaply. The column must be in
+        bounds and not full.
+
+        Args:
+            column (int): The column to play in.
+            color (Color): The color to play.
+        Returns:
+            int: The row in which the color landed.
+        """
+        value = color.value
+        height = self._heights[column]
+        index = column * self._column_bits + height
+        bit = 1 << index
+        self._bitboards[value] |= bit
+        self._mask |= bit
+        self._heights[column] = height + 1
+        self._num_filled += 1
+        self._moves.append((column, color))
+        self._hash ^= self._zobrist_keys[value][index]
+        self._mirror_hash ^= self._mirror_zobrist_keys[value][index]
+        return self.bottom_row - height
+
+    def undo(self):
+        """Take back the most recent play.
+
+        Returns:
+            int: The column of the play that was taken back.
+        Raises:
+            ValueError: If there are no plays to take back.
+        """
+        if not self._moves:
+            raise ValueError('No plays to undo')
+
+        column, color = self._moves.pop()
+        value = color.value
+        height = self._heights[column] - 1
+        index = column * self._column_bits + height
+        bit = 1 << index
+        self._bitboards[value] ^= bit
+        self._mask ^= bit
+        self._heights[column] = height
+        self._num_filled -= 1
+        self._hash ^= self._zobrist_keys[value][index]
+        self._mirror_hash ^= self._mirror_zobrist_keys[value][index]
+
+        # Take the play back out of the cached JSON grid too, if it is there
+        if len(self._moves) < self._json_num_moves:
+            row = self.bottom_row - height
+            self._json_num_moves -= 1
+            self._json_heights[column] = height
+            self._json_grid[row] = self._json_grid[row][:]
+            self._json_grid[row][column] = None
+            self._json = None
+
+        return column
+
+    def get_num_moves(self):
+        """Get the number of plays made on this board since the last reset.
+
+        Returns:
+            int: The number of plays.
+        """
+        return len(self._moves)
+
+    def get_moves(self):
+        """Get the plays made on this board since the last reset.
+
+        Returns:
+            list: The plays, in order, as 2-tuples in format (column, color).
+        """
+        return list(self._moves)
+
+    def get_hash(self):
+        """Get a 64-bit Zobrist hash of the current position.
+
+        The hash is kept up to date as plays are made and undone, so this is
+        constant time. Positions reached through different orders of play
+        have the same hash.
+
+        Returns:
+            int: The hash.
+        """
+        return self._hash
+
+    def get_mirror_hash(self):
+        """Get the hash of the left-right reflection of the current position.
+
+        Returns:
+            int: The hash, as if every column c were column
+                num_columns - 1 - c.
+        """
+        return self._mirror_hash
+
+    def get_turn_order_hashes(self, num_players=2):
+        """Get hashes of this position that ignore which colors were played.
+
+        Plays are hashed as if the players, taking turns, had the first
+        num_players colors (in Color order). So positions that differ only
+        in which colors the players chose hash the same.
+
+        This replays the plays, so it is O(number of plays).
+
+        Args:
+            num_players (Optional[int]): Number of players taking turns.
+        Returns:
+            tuple: The hash of the position, and the hash of its left-right
+                reflection.
+        """
+        colors = list(Color)[:num_players]
+        heights = [0] * self.num_columns
+        position_hash = 0
+        mirror_hash = 0
+
+        for index, (column, color) in enumerate(self._moves):
+            value = colors[index % num_players].value
+            bit_index = column * self._column_bits + heights[column]
+            heights[column] += 1
+            position_hash ^= self._zobrist_keys[value][bit_index]
+            mirror_hash ^= self._mirror_zobrist_keys[value][bit_index]
+
+        return position_hash, mirror_hash
+
+    def get_symmetric_hash(self):
+        """Get a hash shared by the current position and its reflection.
+
+        Returns:
+            int: The smaller of get_hash() and get_mirror_hash().
+        """
+        return min(self._hash, self._mirror_hash)
 
     def get_winning_positions(self, origin, fake_color=None):
         """Get winning positions that include some origin position.
@@ -592,22 +1174,166 @@ class Board(object):
             set: A set of 2-tuples in format (row, column) of the positions
                 that result in a win, or the empty set if no win found.
         """
-        HORIZONTAL = (0, 1)
-        VERTICAL = (1, 0)
-        UP_RIGHT = (1, 1)
-        DOWN_RIGHT = (1, -1)
+        color = fake_color if fake_color else self.get_color(origin)
+        if not color:
+            return set()
+
+        index = self._get_index(origin)
+        bitboard = self._bitboards[color.value] | (1 << index)
+
+        # Cheap whole-board check before looking for lines through origin
+        if not self._has_line(bitboard):
+            return set()
+
+        winning_bits = 0
+
+        for shift in self._shifts:
+            line = self._get_line(bitboard, index, shift)
+
+            # Check if this line is long enough to win
+            if _count_bits(line) >= self.num_to_win:
+                winning_bits |= line
+
+        return self._get_positions(winning_bits)
+
+    def is_winning_column(self, column, color):
+        """Determine if playing a color in a column would win.
+
+        This is a faster alternative to calling get_winning_positions with a
+        fake_color, for when the winning positions themselves are not needed.
+
+        Args:
+            column (int): The column to check.
+            color (Color): The color that would be played.
+        Returns:
+            bool: True if the play would win, False otherwise.
+        Raises:
+            ValueError: If column is full or out of bounds.
+        """
+        row = self.find_next_row(column)
+        index = column * self._column_bits + self.bottom_row - row
+        bitboard = self._bitboards[color.value] | (1 << index)
+
+        if not self._has_line(bitboard):
+            return False
+
+        for shift in self._shifts:
+            line = self._get_line(bitboard, index, shift)
+            if _count_bits(line) >= self.num_to_win:
+                return True
+
+        return False
+
+    def get_winning_columns(self, color):
+        """Find every column where playing a color would win.
+
+        Args:
+            color (Color): The color that would be played.
+        Returns:
+            list: The winning columns, in increasing order.
+        """
+        # Adding the bottom row to the occupied positions carries into the
+        # lowest empty position of each column (or the empty bit on top, if
+        # the column is full)
+        playable = (self._mask + self._bottom_mask) & self._board_mask
+        bits = playable & self._get_completions(self._bitboards[color.value])
+
+        columns = []
+        while bits:
+            low_bit = bits & -bits
+            columns.append((low_bit.bit_length() - 1) // self._column_bits)
+            bits ^= low_bit
+
+        return columns
+
+    def _get_completions(self, bitboard):
+        """
+        Get the positions that would complete a line of num_to_win in
+        bitboard, if set.
+        """
+        completions = 0
+
+        for shifts in self._completion_shifts:
+            # After this loop, forwards[i] has a bit set if the i positions
+            # after it (in the direction of shift) are set
+            forward = -1
+            forwards = []
+            for shift in shifts:
+                forwards.append(forward)
+                forward &= bitboard >> shift
+
+            # A position completes a line if the i positions before it and
+            # the num_to_win - 1 - i positions after it are set
+            completions |= forward
+            backward = -1
+            for shift, forward in zip(shifts, reversed(forwards)):
+                backward &= bitboard << shift
+                completions |= backward & forward
+
+        return completions
+
+    def get_num_open_lines(self, color):
+        """Count the lines where a color could still get num_to_win in a row.
+
+        A line is open for a color if none of its positions hold another
+        color. Lines are counted in all four directions.
+
+        Args:
+            color (Color): The color to count lines for.
+        Returns:
+            int: The number of open lines.
+        """
+        open_bits = self._board_mask & ~(self._mask
+                                         ^ self._bitboards[color.value])
+        num_open_lines = 0
+
+        for line_shifts in self._line_shifts:
+            starts = open_bits
+            for shift in line_shifts:
+                starts &= starts >> shift
+
+            num_open_lines += _count_bits(starts)
+
+        return num_open_lines
+
+    def _has_line(self, bitboard):
+        """
+        Determine if bitboard has num_to_win bits in a row in any direction,
+        anywhere in the board.
+        """
+        for line_shifts in self._line_shifts:
+            matches = bitboard
+            for shift in line_shifts:
+                matches &= matches >> shift
 
-        winning_positions = set()
+            if matches:
+                return True
 
-        for step in (HORIZONTAL, VERTICAL, UP_RIGHT, DOWN_RIGHT):
-            matches = self._get_matches_mirrored(
-                origin, step, fake_color=fake_color)
+        return False
 
-            # Check if these matches are enough to win
-            if len(matches) >= self.num_to_win:
-                winning_positions |= matches
+    def _get_line(self, bitboard, index, shift):
+        """
+        From the bit at index, find the set bits of bitboard that continue
+        outward in the direction of shift, as well as in the opposite
+        direction. Returns the bits of the line, including index.
+        """
+        line = 1 << index
+
+        bit = line
+        while True:
+            bit <<= shift
+            if not bit & bitboard:
+                break
+            line |= bit
+
+        bit = 1 << index
+        while True:
+            bit >>= shift
+            if not bit & bitboard:
+                break
+            line |= bit
 
-        return winning_positions
+        return line
 
     def _get_matches_mirrored(self, start, step, fake_color=None):
         """
@@ -630,15 +1356,39 @@ class Board(object):
         """
         color = fake_color if fake_color else self.get_color(start)
 
-        # Initialize set with start position
-        positions = {start}
+        index = self._get_index(start)
+        bitboard = self._bitboards[color.value] | (1 << index)
+
+        # Moving down a row is moving down a bit within the column
+        row_step, column_step = step
+        shift = column_step * self._column_bits - row_step
+
+        line = 1 << index
+        bit = line
+
+        while True:
+            bit = bit << shift if shift > 0 else bit >> -shift
+            if not bit & bitboard:
+                break
+            line |= bit
+
+        return self._get_positions(line)
 
-        current = tuple(map(operator.add, start, step))
+    def _get_index(self, position):
+        """Get the bit index of a position."""
+        row, column = position
+        return column * self._column_bits + self.bottom_row - row
+
+    def _get_positions(self, bits):
+        """Get the set of (row, column) positions of some set bits."""
+        positions = set()
 
-        while (self.is_in_bounds(current) and
-                self.get_color(current) == color):
-            positions.add(current)
-            current = tuple(map(operator.add, current, step))
+        while bits:
+            low_bit = bits & -bits
+            column, height = divmod(low_bit.bit_length() - 1,
+                                    self._column_bits)
+            positions.add((self.bottom_row - height, column))
+            bits ^= low_bit
 
         return positions
 
@@ -686,7 +1436,7 @@ class Board(object):
         if not self.is_column_in_bounds(column):
             raise ValueError('Column {} is out of bounds'.format(column))
 
-        return self.grid[self.top_row][column] is not None
+        return self._heights[column] == self.num_rows
 
     def is_full(self):
         """Determine if this board is entirely full.
@@ -694,11 +1444,7 @@ class Board(object):
         Returns:
             bool: True if this board is full, False otherwise.
         """
-        for i in range(self.num_columns):
-            if not self.is_column_full(i):
-                return False
-
-        return True
+        return self._num_filled == self.num_rows * self.num_columns
 
     def get_color(self, position):
         """Retrieve the color at a position in this board.
@@ -714,8 +1460,14 @@ class Board(object):
             raise ValueError('Position {} is out of bounds'
                              .format(position))
 
-        row, column = position
-        return self.grid[row][column]
+        bit = 1 << self._get_index(position)
+
+        if not self._mask & bit:
+            return None
+
+        for color in Color:
+            if self._bitboards[color.value] & bit:
+                return color
 
     def get_printable_grid(self, width=None, show_labels=False,
                            show_only=None):
@@ -756,3 +1508,71 @@ class Board(object):
             output += '\n'
 
         return output
+
+
+def _count_bits(bits):
+    return bin(bits).count('1')
+
+
+def _get_line_shifts(shift, length):
+    """Get the shifts that find lines of some length in a bitboard.
+
+    ANDing a bitboard with itself shifted by each of these (in order) leaves
+    set only the bits that start a line of `length` set bits in the direction
+    of shift. Doubling the line length at each step keeps this to about
+    log2(length) shifts.
+    """
+    line_shifts = []
+    covered = 1
+
+    while covered * 2 <= length:
+        line_shifts.append(covered * shift)
+        covered *= 2
+
+    if covered < length:
+        line_shifts.append((length - covered) * shift)
+
+    return line_shifts
+
+
+@functools.lru_cache(maxsize=ZOBRIST_CACHE_SIZE)
+def get_zobrist_keys(num_rows, num_columns):
+    """Get the Zobrist keys for boards of some dimensions.
+
+    Keys are generated from ZOBRIST_SEED, so every board with the same
+    dimensions (in any process) uses the same keys. Only the keys of the
+    ZOBRIST_CACHE_SIZE most recently used dimensions are kept.
+
+    Args:
+        num_rows (int): Number of rows in the board.
+        num_columns (int): Number of columns in the board.
+    Returns:
+        tuple: Two lists, each indexed by Color value and then by bit index
+            (as laid out by Board). The first holds the key of each position.
+            The second holds the key of each position's left-right
+            reflection.
+    """
+    rng = random.Random('{}:{}:{}'.format(
+        ZOBRIST_SEED, num_rows, num_columns))
+    column_bits = num_rows + 1
+    num_bits = num_columns * column_bits
+    num_keys = len(Color) * num_bits
+
+    # One call for all keys, split into 64-bit words in C, rather than one
+    # call per key. getrandbits fills its result from the low bits up, so
+    # the keys are the same as from num_keys calls to getrandbits(64).
+    words = memoryview(rng.getrandbits(64 * num_keys).to_bytes(
+        8 * num_keys, sys.byteorder)).cast('Q').tolist()
+
+    keys = [words[value * num_bits:(value + 1) * num_bits]
+            for value in range(len(Color))]
+
+    mirror_keys = []
+    for color_keys in keys:
+        mirror_color_keys = []
+        for column in reversed(range(num_columns)):
+            start = column * column_bits
+            mirror_color_keys.extend(color_keys[start:start + column_bits])
+        mirror_keys.append(mirror_color_keys)
+
+    return keys, mirror_keys
@@ -1,5 +1,10 @@
+import asyncio
 from enum import Enum
 from collections import deque
+import inspect
+import weakref
+
+from connectfour.instrumentation import PubSubStats
 
 
 class ModelAction(Enum):
@@ -11,38 +16,185 @@ class ModelAction(Enum):
     (
         player_added, player_removed, board_created, game_started,
         next_player, try_again, color_played, game_won, game_draw,
-    ) = range(9)
+        player_rejoined,
+    ) = range(10)
 
 
 class ViewAction(Enum):
     (
         add_player, remove_player, create_board, start_game, play,
-    ) = range(5)
+        rejoin_player,
+    ) = range(6)
 
 
 class PubSub(object):
-    def __init__(self):
-        # To store all subscribed callback functions, keyed on Action
+    def __init__(self, weak=False):
+        """Create a pubsub.
+
+        Args:
+            weak (Optional[bool]): Whether subscriptions should only hold
+                weak references to their callbacks, unless subscribe says
+                otherwise. With weak references, subscribing does not keep
+                views (or models) alive, and their subscriptions go away
+                once they are garbage collected.
+        """
+        self.weak = weak
+
+        # To store all subscribed callback functions. Keyed on Action class
+        # (e.g. ModelAction), each a list indexed by the Action's value
+        # (which are dense, from range()), of tuples of callbacks. Looking
+        # up a tuple by value is much faster than hashing an Action.
+        # Tuples are replaced rather than changed, so that subscriptions
+        # can change (e.g. when a weakly referenced callback is garbage
+        # collected) while being looped over.
         self.subscriptions = {}
 
         self.queue = deque()
 
+        # Callbacks to call each time do_queue empties the queue
+        self.drained_callbacks = ()
+
+        # How many calls to do_queue are in progress (callbacks may call
+        # do_queue too), so drained callbacks are only called by the first
+        self._queue_depth = 0
+
+        # Statistics being collected, if any (see enable_stats)
+        self.stats = None
+
     def do_queue(self):
-        while len(self.queue):
-            callback = self.queue.popleft()
-            callback()
+        """Call queued callbacks, in order, until the queue is empty.
+
+        Callbacks may publish more actions, which are called in turn. Once
+        the queue is empty, calls any callbacks subscribed with
+        subscribe_drained (unless the queue was empty to begin with).
+        """
+        queue = self.queue
+        if not queue:
+            return
+
+        self._queue_depth += 1
+        try:
+            while queue:
+                callback, args, kwargs = queue.popleft()
+                callback(*args, **kwargs)
+        finally:
+            self._queue_depth -= 1
+
+        if not self._queue_depth:
+            for callback in self.drained_callbacks:
+                callback()
+
+    def subscribe_drained(self, callback, weak=None):
+        """Subscribe to do_queue emptying the queue.
 
-    def subscribe(self, action, callback):
+        Views can use this to batch their responses to all the actions
+        handled in one go (e.g. to send them over a network as a single
+        message), and then flush the batch when called.
+
+        Args:
+            callback (function): Called with no arguments.
+            weak (Optional[bool]): Whether to only hold a weak reference to
+                callback (see subscribe). Defaults to this pubsub's weak.
+        """
+        callback = self._get_subscribed(None, callback, weak)
+        self.drained_callbacks += (callback,)
+
+    def unsubscribe_drained(self, callback):
+        """Unsubscribe from do_queue emptying the queue.
+
+        Args:
+            callback (function): A callback subscribed with
+                subscribe_drained.
+        Raises:
+            ValueError: If callback is not subscribed.
+        """
+        self.drained_callbacks = _get_without(
+            self.drained_callbacks, callback)
+
+    def subscribe(self, action, callback, weak=None):
         """Subscribe to a particular action.
 
         Args:
             action (Action): The action to subscribe to.
             callback (function): Will be called when action occurs.
+            weak (Optional[bool]): Whether to only hold a weak reference to
+                callback. If so, the subscription is removed once callback
+                (or for a bound method, its object) is garbage collected.
+                Note that a lambda or nested function would be collected
+                right away, unless referenced elsewhere. Defaults to this
+                pubsub's weak.
+        """
+        if action.__class__ not in self.subscriptions:
+            self.subscriptions[action.__class__] = [
+                () for a in action.__class__]
+
+        callbacks = self.subscriptions[action.__class__]
+        callbacks[action._value_] += (
+            self._get_subscribed(action, callback, weak),)
+
+    def unsubscribe(self, action, callback):
+        """Unsubscribe from a particular action.
+
+        Calls to callback that are already queued still happen.
+
+        Args:
+            action (Action): The action to unsubscribe from.
+            callback (function): A callback subscribed to action. If it was
+                subscribed more than once, one subscription is removed.
+        Raises:
+            ValueError: If callback is not subscribed to action.
         """
-        if action not in self.subscriptions:
-            self.subscriptions[action] = []
+        callbacks = self._get_callbacks(action)
 
-        self.subscriptions[action].append(callback)
+        try:
+            callbacks = _get_without(callbacks, callback)
+        except ValueError:
+            raise ValueError('{} is not subscribed to {}'.format(
+                callback, action))
+
+        self.subscriptions[action.__class__][action._value_] = callbacks
+
+    def _get_callbacks(self, action):
+        try:
+            return self.subscriptions[action.__class__][action._value_]
+        except KeyError:
+            return ()
+
+    def _get_subscribed(self, action, callback, weak):
+        """
+        Get what to store for a subscription of callback to action (None for
+        drained callbacks): callback itself, or a _WeakCallback.
+        """
+        if weak is None:
+            weak = self.weak
+
+        if not weak:
+            return callback
+
+        # Only weakly reference this pubsub too, so that subscriptions do
+        # not keep it alive
+        pubsub_ref = weakref.ref(self)
+
+        def remove_dead(ref):
+            pubsub = pubsub_ref()
+            if pubsub is not None:
+                pubsub._remove_dead(action, ref)
+
+        return _WeakCallback(callback, remove_dead)
+
+    def _remove_dead(self, action, ref):
+        """Remove the subscription of a callback that has been collected."""
+        def is_alive(callback):
+            return not (isinstance(callback, _WeakCallback) and
+                        callback.ref is ref)
+
+        if action is None:
+            self.drained_callbacks = tuple(
+                filter(is_alive, self.drained_callbacks))
+        else:
+            callbacks = self.subscriptions[action.__class__]
+            callbacks[action._value_] = tuple(
+                filter(is_alive, callbacks[action._value_]))
 
     def publish(self, action, trigger_queue=False, *args, **kwargs):
         """Publish that an action occurred.
@@ -51,17 +203,218 @@ class PubSub(object):
 
         Args:
             action (Action): The action that occurred.
+            trigger_queue (Optional[bool]): Whether to call all queued
+                callbacks before returning.
             *args: Will be passed to any subscribed callbacks.
             **kwargs: Will be passed to any subscribed callbacks.
         """
-        if action not in self.subscriptions:
+        try:
+            callbacks = self.subscriptions[action.__class__][action._value_]
+        except KeyError:
             return
 
-        for callback in self.subscriptions[action]:
-            def do_callback():
-                return callback(*args, **kwargs)
+        # Queue each callback with its arguments, rather than a closure per
+        # callback, so that publishing allocates as little as possible
+        append = self.queue.append
+        for callback in callbacks:
+            append((callback, args, kwargs))
+
+        if trigger_queue:
+            self.do_queue()
+
+    def enable_stats(self, stats=None):
+        """Start collecting statistics about actions and their callbacks.
+
+        Collects the number of times each action is published, the most
+        callbacks queued at once, and how long each subscribed callback
+        takes. When not enabled, publishing has no extra overhead.
+
+        Args:
+            stats (Optional[PubSubStats]): Where to collect statistics. Can
+                be shared between pubsubs. Defaults to a new PubSubStats.
+        Returns:
+            PubSubStats: Where statistics are collected.
+        """
+        if stats is None:
+            stats = PubSubStats()
+
+        self.stats = stats
+
+        # Replace publish for this pubsub only, so that publishing without
+        # statistics does not even need to check whether to collect them
+        self.publish = self._publish_with_stats
+        return stats
+
+    def disable_stats(self):
+        """Stop collecting statistics."""
+        self.stats = None
+        self.__dict__.pop('publish', None)
+
+    def _publish_with_stats(self, action, trigger_queue=False, *args,
+                            **kwargs):
+        """
+        Same as publish, but recording the publish, and queueing each callback
+        to be called through self.stats so that it is timed.
+        """
+        stats = self.stats
+
+        try:
+            callbacks = self.subscriptions[action.__class__][action._value_]
+        except KeyError:
+            stats.record_publish(action, len(self.queue))
+            return
 
-            self.queue.append(do_callback)
+        append = self.queue.append
+        for callback in callbacks:
+            append((stats.call, (action, callback, args, kwargs), {}))
+
+        stats.record_publish(action, len(self.queue))
 
         if trigger_queue:
             self.do_queue()
+
+
+class AsyncPubSub(PubSub):
+    """A PubSub for use with asyncio.
+
+    Publishing works the same as with PubSub (so the model can publish to
+    either), but the queue is processed by an asyncio task rather than
+    right away. Callbacks may be coroutine functions, which are awaited
+    before the next callback is called.
+
+    do_queue() and publish(trigger_queue=True) must be called from within
+    the running event loop.
+    """
+
+    def __init__(self, executor=None, ai_wait_time=0):
+        """Create this pubsub.
+
+        Args:
+            executor (Optional[concurrent.futures.Executor]): Where AI
+                players decide on their plays. Defaults to the event loop's
+                default executor (a thread pool).
+            ai_wait_time (Optional[float]): Seconds to wait before an AI
+                player plays.
+        """
+        super(AsyncPubSub, self).__init__()
+        self.executor = executor
+        self.ai_wait_time = ai_wait_time
+
+        # The task processing the queue, if any
+        self._task = None
+
+    def do_queue(self):
+        """Start processing the queue in a task, unless already doing so.
+
+        Returns:
+            asyncio.Task: The task processing the queue.
+        """
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(
+                self._process_queue())
+
+        return self._task
+
+    async def join(self):
+        """Wait until the queue is empty.
+
+        Raises:
+            Exception: Any exception raised by a callback.
+        """
+        while self.queue or (self._task is not None and
+                             not self._task.done()):
+            await self.do_queue()
+
+    async def _process_queue(self):
+        queue = self.queue
+        if not queue:
+            return
+
+        while queue:
+            callback, args, kwargs = queue.popleft()
+            result = callback(*args, **kwargs)
+
+            if inspect.isawaitable(result):
+                await result
+
+        for callback in self.drained_callbacks:
+            result = callback()
+
+            if inspect.isawaitable(result):
+                await result
+
+    def schedule_ai_play(self, ai_play):
+        """Make an AI play in a task, without blocking the event loop.
+
+        Can be passed to ConnectFourModel as its schedule_ai_play. The
+        player decides on a column in the executor, and the play is then
+        made in the event loop.
+
+        Args:
+            ai_play (AIPlay): The play to make.
+        Returns:
+            asyncio.Task: The task making the play.
+        """
+        return asyncio.get_running_loop().create_task(
+            self._do_ai_play(ai_play))
+
+    async def _do_ai_play(self, ai_play):
+        if self.ai_wait_time:
+            await asyncio.sleep(self.ai_wait_time)
+
+        if not ai_play.is_current():
+            return
+
+        column = await asyncio.get_running_loop().run_in_executor(
+            self.executor, ai_play.choose_column)
+
+        if ai_play.make_play(column):
+            self.do_queue()
+
+
+class _WeakCallback(object):
+    """A subscribed callback, held by a weak reference.
+
+    Calling it calls the callback, unless it has been garbage collected.
+    Compares equal to the callback, so that it can be unsubscribed.
+    """
+
+    def __init__(self, callback, on_collected):
+        """
+        on_collected is called with self.ref once the callback is garbage
+        collected.
+        """
+        if inspect.ismethod(callback):
+            self.ref = weakref.WeakMethod(callback, on_collected)
+        else:
+            self.ref = weakref.ref(callback, on_collected)
+
+    def __repr__(self):
+        return '{} {}'.format(self.__class__.__name__, self.ref())
+
+    def __eq__(self, other):
+        if isinstance(other, _WeakCallback):
+            return self.ref == other.ref
+
+        callback = self.ref()
+        return callback is not None and callback == other
+
+    __hash__ = None
+
+    def __call__(self, *args, **kwargs):
+        callback = self.ref()
+
+        if callback is not None:
+            return callback(*args, **kwargs)
+
+
+def _get_without(callbacks, callback):
+    """
+    Get a tuple of callbacks without the first that equals callback. Raises
+    ValueError if there is none.
+    """
+    for index, subscribed in enumerate(callbacks):
+        if subscribed == callback:
+            return callbacks[:index] + callbacks[index + 1:]
+
+    raise ValueError('{} is not subscribed'.format(callback))
@@ -0,0 +1,35 @@
+"""Helpers shared by the tests of the AI searches."""
+
+from connectfour.model import Board, Color
+
+TEST_ROWS = 6
+TEST_COLUMNS = 7
+TEST_TO_WIN = 4
+
+TWO_COLORS = (Color.black, Color.red)
+
+
+def create_board(columns, num_rows=TEST_ROWS, num_columns=TEST_COLUMNS,
+                 num_to_win=TEST_TO_WIN, colors=TWO_COLORS, players=None):
+    """Create a board with plays in some columns.
+
+    Args:
+        columns (list): The column of each play, in order.
+        num_rows (Optional[int]): Number of rows in the board.
+        num_columns (Optional[int]): Number of columns in the board.
+        num_to_win (Optional[int]): Number in a row needed to win.
+        colors (Optional[list]): Colors of the players, in playing order.
+            Defaults to black, then red.
+        players (Optional[list]): The index in colors of the player making
+            each play. Defaults to the players taking turns, the first
+            going first.
+    Returns:
+        Board: The board.
+    """
+    if players is None:
+        players = [index % len(colors) for index in range(len(columns))]
+
+    board = Board(num_rows, num_columns, num_to_win)
+    for player, column in zip(players, columns):
+        board.add_color(colors[player], column)
+    return board
@@ -0,0 +1,132 @@
+import random
+import unittest
+
+from connectfour.ai.batch import BatchBoard, np
+from connectfour.model import Board, Color
+
+TEST_ROWS = 4
+TEST_COLUMNS = 6
+TEST_TO_WIN = 4
+
+NUM_GAMES = 16
+
+
+@unittest.skipIf(np is None, 'numpy not installed')
+class TestBatchBoard_Basics(unittest.TestCase):
+
+    def setUp(self):
+        self.batch = BatchBoard(NUM_GAMES, TEST_ROWS, TEST_COLUMNS,
+                                TEST_TO_WIN)
+
+    def test_empty(self):
+        self.assertTrue(self.batch.get_legal_mask().all())
+        self.assertFalse(self.batch.is_full().any())
+        self.assertFalse(self.batch.has_line(0).any())
+
+    def test_drop_rows(self):
+        columns = np.arange(NUM_GAMES) % TEST_COLUMNS
+        rows = self.batch.drop(columns, 1)
+        self.assertTrue((rows == TEST_ROWS - 1).all())
+        rows = self.batch.drop(columns, 2)
+        self.assertTrue((rows == TEST_ROWS - 2).all())
+
+    def test_drop_inactive(self):
+        active = np.arange(NUM_GAMES) % 2 == 0
+        rows = self.batch.drop(np.zeros(NUM_GAMES, dtype=int), 1,
+                               active=active)
+        self.assertTrue((rows[active] == TEST_ROWS - 1).all())
+        self.assertTrue((rows[~active] == -1).all())
+        self.assertTrue((self.batch.heights[~active] == 0).all())
+
+    def test_drop_full_column(self):
+        columns = np.zeros(NUM_GAMES, dtype=int)
+        for i in range(TEST_ROWS):
+            self.batch.drop(columns, 1)
+        self.assertFalse(self.batch.get_legal_mask()[:, 0].any())
+        with self.assertRaises(ValueError):
+            self.batch.drop(columns, 1)
+
+    def test_drop_out_of_bounds(self):
+        with self.assertRaises(ValueError):
+            self.batch.drop(np.full(NUM_GAMES, TEST_COLUMNS), 1)
+
+    def test_has_line_per_game(self):
+        columns = np.zeros(NUM_GAMES, dtype=int)
+        values = np.arange(NUM_GAMES) % 2
+        for i in range(TEST_TO_WIN):
+            self.batch.drop(columns, values)
+        self.assertTrue((self.batch.has_line(values)).all())
+        self.assertFalse((self.batch.has_line(1 - values)).any())
+
+    def test_reset(self):
+        self.batch.drop(np.zeros(NUM_GAMES, dtype=int), 1)
+        self.batch.reset()
+        self.assertTrue((self.batch.grid == 0).all())
+        self.assertTrue((self.batch.heights == 0).all())
+
+    def test_play_random_games(self):
+        winners = self.batch.play_random_games(3, np.random.default_rng(0))
+        self.assertEqual(winners.shape, (NUM_GAMES,))
+        self.assertTrue(((winners >= -1) & (winners < 3)).all())
+        for game in range(NUM_GAMES):
+            if winners[game] >= 0:
+                self.assertTrue(self.batch.has_line(winners)[game])
+            else:
+                self.assertTrue(self.batch.is_full()[game])
+
+
+@unittest.skipIf(np is None, 'numpy not installed')
+class TestBatchBoard_MatchesBoard(unittest.TestCase):
+
+    def _check_random_games(self, num_rows, num_columns, num_to_win,
+                            num_players, seed):
+        rng = random.Random(seed)
+        batch = BatchBoard(NUM_GAMES, num_rows, num_columns, num_to_win)
+        boards = [Board(num_rows, num_columns, num_to_win)
+                  for game in range(NUM_GAMES)]
+        active = np.ones(NUM_GAMES, dtype=bool)
+        value = 0
+
+        while active.any():
+            columns = np.zeros(NUM_GAMES, dtype=int)
+            for game, board in enumerate(boards):
+                if active[game]:
+                    columns[game] = rng.choice(
+                        [c for c in range(num_columns)
+                         if not board.is_column_full(c)])
+
+            rows = batch.drop(columns, value, active=active)
+            has_line = batch.has_line(value)
+
+            for game, board in enumerate(boards):
+                if not active[game]:
+                    continue
+
+                column = int(columns[game])
+                row = board.add_color(Color(value), column)
+                self.assertEqual(row, rows[game])
+
+                is_win = bool(board.get_winning_positions((row, column)))
+                self.assertEqual(is_win, has_line[game])
+
+                if is_win or board.is_full():
+                    active[game] = False
+
+            self.assertEqual(list(batch.is_full()),
+                             [board.is_full() for board in boards])
+            value = (value + 1) % num_players
+
+        for game, board in enumerate(boards):
+            expected = [[color.value + 1 if color else 0 for color in row]
+                        for row in board.grid]
+            self.assertEqual(batch.grid[game].tolist(), expected)
+
+    def test_standard_board(self):
+        self._check_random_games(6, 7, 4, 2, seed=1)
+
+    def test_other_dimensions(self):
+        for seed, (num_rows, num_columns, num_to_win, num_players) in (
+                enumerate([(4, 6, 3, 3), (7, 3, 5, 2), (1, 5, 2, 2),
+                           (5, 5, 1, 4), (3, 3, 5, 2)])):
+            self._check_random_games(num_rows, num_columns, num_to_win,
+                                     num_players, seed)
@@ -1,6 +1,7 @@
 import unittest
 
-from connectfour.model import Board, Color
+from connectfour.model import (
+    ZOBRIST_CACHE_SIZE, Board, Color, get_zobrist_keys)
 
 TEST_ROWS = 4
 TEST_COLUMNS = 6
@@ -189,6 +190,27 @@ class TestBoard_Basics(unittest.TestCase):
         self.board.reset()
         self.assertTrue(_is_empty(self.board))
 
+    def test_reset_then_refill_board(self):
+        _fill_board_pink(self.board)
+        self.board.reset()
+        self.assertFalse(self.board.is_full())
+        self.assertFalse(self.board.is_column_full(self.left_column))
+        _fill_board_pink(self.board)
+        self.assertTrue(self.board.is_full())
+
+    def test_find_next_row(self):
+        self.assertEqual(self.board.find_next_row(self.left_column),
+                         self.bottom_row)
+        self.board.add_color(BLUE, self.left_column)
+        self.assertEqual(self.board.find_next_row(self.left_column),
+                         self.bottom_row - 1)
+
+    def test_find_next_row_when_full(self):
+        for i in range(self.board.num_rows):
+            self.board.add_color(BLUE, self.left_column)
+        with self.assertRaises(ValueError):
+            self.board.find_next_row(self.left_column)
+
 
 class TestBoard_MatchesAndWins_A(unittest.TestCase):
 
@@ -231,6 +253,254 @@ class TestBoard_MatchesAndWins_A(unittest.TestCase):
         self.assertEquals(w, {(2, 1), (2, 2), (2, 3), (2, 4)})
 
 
+class TestBoard_MatchesAndWins_Edges(unittest.TestCase):
+
+    def setUp(self):
+        self.board = Board(TEST_ROWS, TEST_COLUMNS, TEST_TO_WIN)
+
+    def test_no_win_wrapping_between_columns(self):
+        # Top of column 0 is adjacent in memory to bottom of column 1
+        for play in [(BLUE, 0), (BLUE, 0), (PINK, 0), (PINK, 0),
+                     (PINK, 1), (PINK, 1)]:
+            self.board.add_color(*play)
+        self.assertEqual(self.board.get_winning_positions((2, 1)), set())
+
+    def test_no_win_wrapping_diagonal(self):
+        for play in [(PINK, 0), (BLUE, 1), (PINK, 1), (PINK, 1), (PINK, 1)]:
+            self.board.add_color(*play)
+        self.assertEqual(self.board.get_winning_positions((3, 0)), set())
+
+    def test_vertical_win(self):
+        for i in range(TEST_TO_WIN):
+            row = self.board.add_color(GRAY, 2)
+        w = self.board.get_winning_positions((row, 2))
+        self.assertEqual(w, {(0, 2), (1, 2), (2, 2), (3, 2)})
+
+    def test_win_longer_than_needed(self):
+        for column in [0, 1, 3, 4, 2]:
+            self.board.add_color(BLUE, column)
+        w = self.board.get_winning_positions((3, 2))
+        self.assertEqual(w, {(3, 0), (3, 1), (3, 2), (3, 3), (3, 4)})
+
+    def test_is_winning_column(self):
+        for column in [0, 1, 2]:
+            self.board.add_color(BLUE, column)
+        self.assertTrue(self.board.is_winning_column(3, BLUE))
+        self.assertFalse(self.board.is_winning_column(3, PINK))
+        self.assertFalse(self.board.is_winning_column(4, BLUE))
+
+    def test_connect_one(self):
+        board = Board(TEST_ROWS, TEST_COLUMNS, 1)
+        self.assertTrue(board.is_winning_column(0, PINK))
+        board.add_color(PINK, 0)
+        self.assertEqual(board.get_winning_positions((3, 0)), {(3, 0)})
+
+
+class TestBoard_PlayAndUndo(unittest.TestCase):
+
+    def setUp(self):
+        self.board = Board(TEST_ROWS, TEST_COLUMNS, TEST_TO_WIN)
+
+        for play in PLAYS['BOARD-A']:
+            self.board.add_color(*play)
+
+    def test_play_returns_row(self):
+        self.assertEqual(self.board.play(1, BLUE), 2)
+        self.assertEqual(self.board.get_color((2, 1)), BLUE)
+
+    def test_undo_returns_column(self):
+        self.board.play(1, BLUE)
+        self.assertEqual(self.board.undo(), 1)
+        self.assertIsNone(self.board.get_color((2, 1)))
+        self.assertEqual(self.board.find_next_row(1), 2)
+
+    def test_undo_restores_board(self):
+        before = self.board.get_json()
+        self.board.play(1, BLUE)
+        self.board.play(1, PINK)
+        self.board.play(5, GRAY)
+        for i in range(3):
+            self.board.undo()
+        self.assertEqual(self.board.get_json(), before)
+
+    def test_undo_win(self):
+        self.board.play(1, PINK)
+        self.assertTrue(self.board.get_winning_positions((2, 1)))
+        self.board.undo()
+        self.assertTrue(self.board.is_winning_column(1, PINK))
+        self.assertFalse(self.board.is_winning_column(1, GRAY))
+
+    def test_undo_add_color(self):
+        num_moves = self.board.get_num_moves()
+        self.board.undo()
+        self.assertEqual(self.board.get_num_moves(), num_moves - 1)
+        self.assertIsNone(self.board.get_color((3, 5)))
+
+    def test_undo_full_board(self):
+        board = Board(TEST_ROWS, TEST_COLUMNS, TEST_TO_WIN)
+        _fill_board_pink(board)
+        board.undo()
+        self.assertFalse(board.is_full())
+
+    def test_undo_after_reset(self):
+        self.board.reset()
+        with self.assertRaises(ValueError):
+            self.board.undo()
+
+
+def _get_expected_grid(board):
+    return [[color.name if color else None for color in row]
+            for row in board.grid]
+
+
+class TestBoard_Json(unittest.TestCase):
+
+    def setUp(self):
+        self.board = Board(TEST_ROWS, TEST_COLUMNS, TEST_TO_WIN)
+
+    def test_empty(self):
+        json = self.board.get_json()
+        self.assertEqual(json['numMoves'], 0)
+        self.assertEqual(json['grid'], [[None] * TEST_COLUMNS] * TEST_ROWS)
+
+    def test_updated_between_calls(self):
+        for index, play in enumerate(PLAYS['BOARD-A']):
+            self.board.add_color(*play)
+            if index % 5 == 0:
+                self.board.get_json()
+
+        json = self.board.get_json()
+        self.assertEqual(json['grid'], _get_expected_grid(self.board))
+        self.assertEqual(json['numMoves'], len(PLAYS['BOARD-A']))
+
+    def test_earlier_result_unchanged(self):
+        before = self.board.get_json()
+        self.board.play(0, BLUE)
+        self.board.get_json()
+        self.assertEqual(before['grid'][self.board.bottom_row][0], None)
+
+    def test_earlier_result_unchanged_by_undo(self):
+        self.board.play(0, BLUE)
+        before = self.board.get_json()
+        self.board.undo()
+        self.board.get_json()
+        self.assertEqual(before['grid'][self.board.bottom_row][0], 'blue')
+
+    def test_result_reused_without_plays(self):
+        self.board.play(0, BLUE)
+        self.assertIs(self.board.get_json(), self.board.get_json())
+
+    def test_unchanged_rows_shared(self):
+        before = self.board.get_json()
+        self.board.play(0, BLUE)
+        after = self.board.get_json()
+
+        self.assertIsNot(after['grid'][self.board.bottom_row],
+                         before['grid'][self.board.bottom_row])
+        self.assertIs(after['grid'][self.board.top_row],
+                      before['grid'][self.board.top_row])
+
+    def test_undo(self):
+        for play in PLAYS['BOARD-A']:
+            self.board.add_color(*play)
+        self.board.get_json()
+
+        self.board.undo()
+        self.board.undo()
+        self.board.play(5, GRAY)
+        self.assertEqual(self.board.get_json()['grid'],
+                         _get_expected_grid(self.board))
+
+        for i in range(self.board.get_num_moves()):
+            self.board.undo()
+        self.assertEqual(self.board.get_json()['grid'],
+                         _get_expected_grid(self.board))
+
+    def test_reset(self):
+        self.board.add_color(PINK, 2)
+        self.board.get_json()
+        self.board.reset()
+        self.board.add_color(BLUE, 3)
+        self.assertEqual(self.board.get_json()['grid'],
+                         _get_expected_grid(self.board))
+
+
+class TestBoard_Hash(unittest.TestCase):
+
+    def setUp(self):
+        self.board = Board(TEST_ROWS, TEST_COLUMNS, TEST_TO_WIN)
+
+    def test_empty_hash(self):
+        self.assertEqual(self.board.get_hash(), 0)
+
+    def test_hash_changes_with_play(self):
+        self.board.add_color(BLUE, 0)
+        self.assertNotEqual(self.board.get_hash(), 0)
+
+    def test_hash_depends_on_color(self):
+        other = Board(TEST_ROWS, TEST_COLUMNS, TEST_TO_WIN)
+        self.board.add_color(BLUE, 0)
+        other.add_color(PINK, 0)
+        self.assertNotEqual(self.board.get_hash(), other.get_hash())
+
+    def test_hash_independent_of_play_order(self):
+        other = Board(TEST_ROWS, TEST_COLUMNS, TEST_TO_WIN)
+        for play in [(BLUE, 0), (PINK, 3), (BLUE, 3)]:
+            self.board.add_color(*play)
+        for play in [(PINK, 3), (BLUE, 0), (BLUE, 3)]:
+            other.add_color(*play)
+        self.assertEqual(self.board.get_hash(), other.get_hash())
+
+    def test_undo_restores_hash(self):
+        self.board.add_color(BLUE, 0)
+        before = self.board.get_hash()
+        self.board.play(2, PINK)
+        self.board.undo()
+        self.assertEqual(self.board.get_hash(), before)
+
+    def test_reset_clears_hash(self):
+        self.board.add_color(BLUE, 0)
+        self.board.reset()
+        self.assertEqual(self.board.get_hash(), 0)
+        self.assertEqual(self.board.get_mirror_hash(), 0)
+
+    def test_hash_same_across_boards(self):
+        other = Board(TEST_ROWS, TEST_COLUMNS, TEST_TO_WIN)
+        self.board.add_color(GRAY, 4)
+        other.add_color(GRAY, 4)
+        self.assertEqual(self.board.get_hash(), other.get_hash())
+
+    def test_mirror_hash(self):
+        other = Board(TEST_ROWS, TEST_COLUMNS, TEST_TO_WIN)
+        for play in [(BLUE, 0), (PINK, 1), (BLUE, 1)]:
+            self.board.add_color(*play)
+        for color, column in [(BLUE, 0), (PINK, 1), (BLUE, 1)]:
+            other.add_color(color, TEST_COLUMNS - 1 - column)
+        self.assertNotEqual(self.board.get_hash(), other.get_hash())
+        self.assertEqual(self.board.get_hash(), other.get_mirror_hash())
+        self.assertEqual(self.board.get_symmetric_hash(),
+                         other.get_symmetric_hash())
+
+    def test_symmetric_position(self):
+        self.board.add_color(BLUE, 0)
+        self.board.add_color(BLUE, self.board.right_column)
+        self.assertEqual(self.board.get_hash(), self.board.get_mirror_hash())
+
+    def test_hash_unchanged_between_versions(self):
+        # Opening books store hashes, so keys must not change
+        self.board.add_color(BLUE, 0)
+        self.board.add_color(PINK, 3)
+        self.assertEqual(self.board.get_hash(), 11975838294832257083)
+        self.assertEqual(self.board.get_mirror_hash(), 3936152504547781360)
+
+    def test_zobrist_keys_cache_bounded(self):
+        for num_rows in range(1, ZOBRIST_CACHE_SIZE + 4):
+            Board(num_rows, TEST_COLUMNS, TEST_TO_WIN)
+
+        self.assertEqual(get_zobrist_keys.cache_info().currsize,
+                         ZOBRIST_CACHE_SIZE)
+
+
 ###########
 # Helpers #
 ###########
@@ -0,0 +1,100 @@
+import functools
+import os
+import shutil
+import tempfile
+import unittest
+
+from connectfour.ai.book import (
+    OpeningBook, generate_book, get_book_key, write_book)
+from connectfour.model import Board, Color
+from connectfour.tests import helpers
+
+TEST_ROWS = 4
+TEST_COLUMNS = 5
+TEST_TO_WIN = 3
+
+BLACK = Color.black
+RED = Color.red
+
+create_board = functools.partial(
+    helpers.create_board, num_rows=TEST_ROWS, num_columns=TEST_COLUMNS,
+    num_to_win=TEST_TO_WIN)
+
+
+class TestBook_Keys(unittest.TestCase):
+
+    def test_key_ignores_colors(self):
+        a = create_board([1, 2, 2])
+        b = create_board([1, 2, 2], colors=(Color.pink, Color.gray))
+        self.assertEqual(get_book_key(a), get_book_key(b))
+
+    def test_key_shared_with_reflection(self):
+        a = create_board([0, 1, 1])
+        b = create_board([4, 3, 3])
+        self.assertEqual(get_book_key(a)[0], get_book_key(b)[0])
+        self.assertNotEqual(get_book_key(a)[1], get_book_key(b)[1])
+
+
+class TestBook_File(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'book.bin')
+
+        board = Board(TEST_ROWS, TEST_COLUMNS, TEST_TO_WIN)
+        self.records = list(generate_book(
+            board, (BLACK, RED), num_plies=2, max_depth=4, max_time=None))
+        write_book(self.path, board, self.records)
+        self.book = OpeningBook(self.path)
+
+    def tearDown(self):
+        self.book.close()
+        shutil.rmtree(self.directory)
+
+    def test_num_records(self):
+        self.assertEqual(len(self.book), len(self.records))
+
+    def test_reflections_stored_once(self):
+        # Empty board, 3 distinct first plays, and at most 15 after two
+        self.assertLessEqual(len(self.records), 1 + 3 + 15)
+
+    def test_lookup_every_position(self):
+        for first in range(TEST_COLUMNS):
+            for second in range(TEST_COLUMNS):
+                board = create_board([first, second])
+                key, is_mirrored = get_book_key(board)
+                column, score = self.book.lookup(board)
+                if is_mirrored:
+                    column = TEST_COLUMNS - 1 - column
+                self.assertIn((key, score, column), self.records)
+
+    def test_lookup_empty_board(self):
+        board = Board(TEST_ROWS, TEST_COLUMNS, TEST_TO_WIN)
+        column, score = self.book.lookup(board)
+        self.assertTrue(0 <= column < TEST_COLUMNS)
+
+    def test_lookup_reflected(self):
+        column, score = self.book.lookup(create_board([0, 1]))
+        reflected_column, reflected_score = self.book.lookup(
+            create_board([4, 3]))
+        self.assertEqual(reflected_column, TEST_COLUMNS - 1 - column)
+        self.assertEqual(reflected_score, score)
+
+    def test_lookup_other_colors(self):
+        self.assertEqual(
+            self.book.lookup(create_board([1, 2])),
+            self.book.lookup(create_board([1, 2],
+                                          colors=(Color.lime, Color.blue))))
+
+    def test_lookup_too_deep(self):
+        self.assertIsNone(self.book.lookup(create_board([0, 1, 2])))
+
+    def test_lookup_other_dimensions(self):
+        self.assertIsNone(self.book.lookup(Board(6, 7, 4)))
+
+    def test_not_a_book(self):
+        path = os.path.join(self.directory, 'other.bin')
+        with open(path, 'wb') as f:
+            f.write(b'not a book at all')
+        with self.assertRaises(ValueError):
+            OpeningBook(path)
@@ -0,0 +1,128 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+from connectfour.web.checkpoints import Checkpointer
+from connectfour.web.rooms import RoomManager
+
+
+class TestCheckpointer(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'rooms.sqlite3')
+        self.rooms = self.create_rooms()
+        self.checkpointer = Checkpointer(self.path)
+
+    def tearDown(self):
+        self.checkpointer.close()
+        shutil.rmtree(self.directory)
+
+    def create_rooms(self):
+        return RoomManager(lambda *args: None, lambda *args: None,
+                           lambda *args: None)
+
+    def add_room(self, sid):
+        self.rooms.handle('addUser', sid, {'username': sid})
+        self.rooms.handle('createBoard', sid, {
+            'numRows': 6, 'numColumns': 7, 'numToWin': 4})
+        self.rooms.handle('startGame', sid, {})
+        return self.rooms.sid_to_room[sid]
+
+    def get_saved_rooms(self):
+        """Wait for checkpoints to be written, then get the saved room ids."""
+        self.checkpointer.close()
+        self.checkpointer = Checkpointer(self.path)
+        return set(self.checkpointer.load())
+
+    def test_checkpoint_and_load(self):
+        room = self.add_room('a')
+        self.rooms.handle('play', 'a', {'column': 2})
+        self.assertEqual(
+            self.checkpointer.checkpoint(self.rooms.room_to_state), 1)
+
+        self.get_saved_rooms()
+        snapshots = self.checkpointer.load()
+        self.assertEqual(list(snapshots), [room])
+
+        rooms = self.create_rooms()
+        rooms.restore(snapshots)
+        self.assertEqual(rooms.room_to_state[room].model.get_snapshot(),
+                         self.rooms.room_to_state[room].model.get_snapshot())
+
+    def test_only_changed_rooms_saved(self):
+        self.add_room('a')
+        self.add_room('b')
+        self.assertEqual(
+            self.checkpointer.checkpoint(self.rooms.room_to_state), 2)
+        self.assertEqual(
+            self.checkpointer.checkpoint(self.rooms.room_to_state), 0)
+
+        self.rooms.handle('play', 'b', {'column': 0})
+        self.assertEqual(
+            self.checkpointer.checkpoint(self.rooms.room_to_state), 1)
+
+    def test_ignored_messages_not_changes(self):
+        self.add_room('a')
+        self.checkpointer.checkpoint(self.rooms.room_to_state)
+
+        self.rooms.handle('resync', 'a', {})
+        self.assertEqual(
+            self.checkpointer.checkpoint(self.rooms.room_to_state), 0)
+
+    def test_closed_rooms_deleted(self):
+        room = self.add_room('a')
+        other_room = self.add_room('b')
+        self.checkpointer.checkpoint(self.rooms.room_to_state)
+
+        self.rooms.sweep(float('inf'))
+        self.assertEqual(self.rooms.room_to_state, {})
+        self.checkpointer.checkpoint(self.rooms.room_to_state)
+        self.assertEqual(self.get_saved_rooms(), set())
+
+        # Only the new room is saved
+        self.add_room('c')
+        self.checkpointer.checkpoint(self.rooms.room_to_state)
+        self.assertNotIn(room, self.get_saved_rooms())
+        self.assertNotIn(other_room, self.get_saved_rooms())
+
+    def test_loaded_rooms_not_saved_until_changed(self):
+        room = self.add_room('a')
+        self.checkpointer.checkpoint(self.rooms.room_to_state)
+        self.get_saved_rooms()
+
+        self.rooms = self.create_rooms()
+        self.rooms.restore(self.checkpointer.load())
+        self.assertEqual(
+            self.checkpointer.checkpoint(self.rooms.room_to_state), 0)
+
+        self.rooms.handle('addUser', 'x', {
+            'username': 'a', 'room': room, 'pk': 'a',
+            'rejoinToken': self.rooms.room_to_state[room].rejoin_tokens['a']})
+        self.assertEqual(
+            self.checkpointer.checkpoint(self.rooms.room_to_state), 1)
+
+    def test_load_some_rooms(self):
+        rooms = set(self.add_room(sid) for sid in 'abcd')
+        self.checkpointer.checkpoint(self.rooms.room_to_state)
+        self.get_saved_rooms()
+
+        mine = set(list(rooms)[:2])
+        self.assertEqual(
+            set(self.checkpointer.load(lambda room: room in mine)), mine)
+
+    def test_snapshots_stored_as_json(self):
+        room = self.add_room('a')
+        self.checkpointer.checkpoint(self.rooms.room_to_state)
+        self.get_saved_rooms()
+
+        connection = sqlite3.connect(self.path)
+        rows = connection.execute(
+            'SELECT room, snapshot FROM rooms').fetchall()
+        connection.close()
+
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0][0], room)
+        self.assertTrue(rows[0][1].startswith('{'))
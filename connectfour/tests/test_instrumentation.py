@@ -0,0 +1,199 @@
+import asyncio
+import unittest
+
+from connectfour.instrumentation import (
+    PubSubStats, get_callback_name, get_rooms_prometheus_text)
+from connectfour.model import ConnectFourModel
+from connectfour.pubsub import AsyncPubSub, ModelAction, PubSub, ViewAction
+
+TEST_ROWS = 6
+TEST_COLUMNS = 7
+TEST_TO_WIN = 4
+
+
+class Recorder(object):
+
+    def __init__(self, pubsub):
+        self.calls = []
+        pubsub.subscribe(ModelAction.color_played, self.on_color_played)
+        pubsub.subscribe(ModelAction.next_player, self.on_next_player)
+
+    def on_color_played(self, color, position):
+        self.calls.append(position)
+
+    def on_next_player(self, player):
+        pass
+
+
+class TestPubSubStats(unittest.TestCase):
+
+    def setUp(self):
+        self.pubsub = PubSub()
+        self.stats = self.pubsub.enable_stats()
+        self.model = ConnectFourModel(self.pubsub)
+        self.recorder = Recorder(self.pubsub)
+
+        self.pubsub.publish(ViewAction.add_player, name='a')
+        self.pubsub.publish(ViewAction.add_player, name='b')
+        self.pubsub.publish(
+            ViewAction.create_board, num_rows=TEST_ROWS,
+            num_columns=TEST_COLUMNS, num_to_win=TEST_TO_WIN)
+        self.pubsub.publish(ViewAction.start_game, trigger_queue=True)
+
+        for column in range(3):
+            self.pubsub.publish(ViewAction.play, trigger_queue=True,
+                                column=column)
+
+    def test_callbacks_still_called(self):
+        self.assertEqual(self.recorder.calls, [(5, 0), (5, 1), (5, 2)])
+
+    def test_publish_counts(self):
+        actions = self.stats.get_dict()['actions']
+        self.assertEqual(actions['ViewAction.play']['publishes'], 3)
+        self.assertEqual(actions['ModelAction.color_played']['publishes'], 3)
+        self.assertEqual(actions['ModelAction.next_player']['publishes'], 4)
+
+        # Published, but nothing subscribed
+        self.assertEqual(actions['ModelAction.game_started']['publishes'], 1)
+
+    def test_max_queue_depth(self):
+        stats = self.stats.get_dict()
+        self.assertEqual(
+            stats['actions']['ViewAction.create_board']['max_queue_depth'],
+            3)
+        self.assertEqual(stats['max_queue_depth'], 4)
+
+    def test_latencies(self):
+        subscribers = self.stats.get_dict()['actions'][
+            'ModelAction.color_played']['subscribers']
+        self.assertEqual(list(subscribers),
+                         ['Recorder.on_color_played'])
+
+        latency = subscribers['Recorder.on_color_played']
+        self.assertEqual(latency['calls'], 3)
+        self.assertGreater(latency['total_seconds'], 0)
+        self.assertLessEqual(latency['p50'], latency['p99'])
+        self.assertLessEqual(latency['p99'], latency['max_seconds'])
+
+        play = self.stats.get_dict()['actions']['ViewAction.play']
+        self.assertEqual(
+            play['subscribers']['ConnectFourModel._play']['calls'], 3)
+
+    def test_prometheus_text(self):
+        lines = self.stats.get_prometheus_text().splitlines()
+        self.assertIn('# TYPE connectfour_pubsub_publishes_total counter',
+                      lines)
+        self.assertIn('connectfour_pubsub_publishes_total'
+                      '{action="ViewAction.play"} 3', lines)
+        self.assertIn('connectfour_pubsub_max_queue_depth'
+                      '{action="ViewAction.create_board"} 3', lines)
+        self.assertIn('connectfour_pubsub_callback_seconds_count'
+                      '{action="ModelAction.color_played",'
+                      'subscriber="Recorder.on_color_played"} 3', lines)
+
+        quantiles = [line for line in lines
+                     if line.startswith('connectfour_pubsub_callback_seconds{'
+                                        'action="ModelAction.color_played"')]
+        self.assertEqual(len(quantiles), 3)
+        self.assertIn('quantile="0.99"', quantiles[-1])
+
+    def test_disable(self):
+        self.pubsub.disable_stats()
+        self.pubsub.publish(ViewAction.play, trigger_queue=True, column=3)
+        self.assertEqual(len(self.recorder.calls), 4)
+        self.assertEqual(
+            self.stats.get_dict()['actions']['ViewAction.play']['publishes'],
+            3)
+        self.assertNotIn('publish', self.pubsub.__dict__)
+
+    def test_reset(self):
+        self.stats.reset()
+        self.assertEqual(self.stats.get_dict(),
+                         {'max_queue_depth': 0, 'actions': {}})
+
+
+class TestPubSubStats_Sampling(unittest.TestCase):
+
+    def test_sample_size(self):
+        stats = PubSubStats(sample_size=10)
+        for i in range(1000):
+            stats.record_latency(ModelAction.game_draw, len, i / 1000)
+
+        latency = stats._actions['ModelAction.game_draw'].subscribers['len']
+        self.assertEqual(len(latency.samples), 10)
+        self.assertEqual(latency.num_calls, 1000)
+        self.assertEqual(latency.max_seconds, 0.999)
+
+    def test_quantiles(self):
+        stats = PubSubStats()
+        for i in range(1, 101):
+            stats.record_latency(ModelAction.game_draw, len, i)
+
+        latency = stats.get_dict()['actions']['ModelAction.game_draw'][
+            'subscribers']['len']
+        self.assertEqual(latency['p50'], 50)
+        self.assertEqual(latency['p90'], 90)
+        self.assertEqual(latency['p99'], 99)
+        self.assertEqual(latency['mean_seconds'], 50.5)
+
+    def test_label_escaping(self):
+        stats = PubSubStats()
+
+        def callback():
+            pass
+
+        callback.__qualname__ = 'a"b\\c'
+        stats.record_latency(ModelAction.game_draw, callback, 1)
+        self.assertIn('subscriber="a\\"b\\\\c"', stats.get_prometheus_text())
+
+    def test_weak_callback_name(self):
+        pubsub = PubSub(weak=True)
+        recorder = Recorder(pubsub)
+        callback = pubsub._get_callbacks(ModelAction.color_played)[0]
+        self.assertEqual(get_callback_name(callback),
+                         'Recorder.on_color_played')
+        del recorder
+
+
+class TestPubSubStats_Async(unittest.IsolatedAsyncioTestCase):
+
+    async def test_coroutine_latency(self):
+        pubsub = AsyncPubSub()
+        stats = pubsub.enable_stats()
+
+        async def on_game_draw():
+            await asyncio.sleep(0.01)
+
+        pubsub.subscribe(ModelAction.game_draw, on_game_draw)
+        pubsub.publish(ModelAction.game_draw, trigger_queue=True)
+        await pubsub.join()
+
+        subscribers = stats.get_dict()['actions']['ModelAction.game_draw'][
+            'subscribers']
+        latency = list(subscribers.values())[0]
+        self.assertGreaterEqual(latency['total_seconds'], 0.01)
+
+
+class TestGetRoomsPrometheusText(unittest.TestCase):
+
+    def test_samples(self):
+        text = get_rooms_prometheus_text({
+            'rooms': 3,
+            'clients': 5,
+            'idle_evictions': 2,
+            'capacity_evictions': 1,
+        })
+        lines = text.splitlines()
+
+        self.assertIn('connectfour_rooms_open 3', lines)
+        self.assertIn('connectfour_rooms_clients 5', lines)
+        self.assertIn(
+            'connectfour_rooms_evicted_total{reason="idle"} 2', lines)
+        self.assertIn(
+            'connectfour_rooms_evicted_total{reason="capacity"} 1', lines)
+        self.assertIn('# TYPE connectfour_rooms_evicted_total counter', lines)
+
+    def test_no_metrics_yet(self):
+        # e.g. before any shard has reported
+        self.assertIn('connectfour_rooms_open 0',
+                      get_rooms_prometheus_text({}).splitlines())
@@ -0,0 +1,66 @@
+import random
+import unittest
+
+from connectfour.ai.mcts import MonteCarloSearch
+from connectfour.model import Board, Color
+from connectfour.tests.helpers import (
+    TEST_COLUMNS, TEST_ROWS, TEST_TO_WIN, create_board)
+
+COLORS = [Color.black, Color.red, Color.blue]
+
+
+class TestMonteCarloSearch(unittest.TestCase):
+
+    def setUp(self):
+        self.search = MonteCarloSearch(max_playouts=2000,
+                                       rng=random.Random(0))
+
+    def test_needs_a_limit(self):
+        with self.assertRaises(ValueError):
+            MonteCarloSearch(max_playouts=None, max_time=None)
+
+    def test_finds_win(self):
+        board = create_board([0, 0, 0], colors=COLORS,
+                             players=[1, 1, 1])
+        self.assertEqual(self.search.find_best_column(board, COLORS, 1), 0)
+
+    def test_blocks_next_player(self):
+        board = create_board([0, 0, 0], colors=COLORS,
+                             players=[1, 1, 1])
+        self.assertEqual(self.search.find_best_column(board, COLORS, 0), 0)
+
+    def test_two_players(self):
+        board = create_board([2, 3, 4], colors=COLORS,
+                             players=[0, 0, 0])
+        self.assertIn(self.search.find_best_column(board, COLORS[:2], 1),
+                      (1, 5))
+
+    def test_board_not_modified(self):
+        board = create_board([3, 3, 4], colors=COLORS)
+        before = board.get_json()
+        self.search.find_best_column(board, COLORS, 0)
+        self.assertEqual(board.get_json(), before)
+        self.assertEqual(board.get_num_moves(), 3)
+
+    def test_full_board(self):
+        board = create_board([0, 0, 1, 1], num_rows=2, num_columns=2,
+                             num_to_win=3, colors=COLORS)
+        self.assertIsNone(self.search.find_best_column(board, COLORS, 1))
+
+    def test_playout_limit(self):
+        board = Board(TEST_ROWS, TEST_COLUMNS, TEST_TO_WIN)
+        search = MonteCarloSearch(max_playouts=100, batch_size=10)
+        search.find_best_column(board, COLORS, 0)
+        self.assertEqual(search.num_playouts, 100)
+
+    def test_time_limit(self):
+        board = Board(TEST_ROWS, TEST_COLUMNS, TEST_TO_WIN)
+        search = MonteCarloSearch(max_playouts=None, max_time=0.05)
+        self.assertIsNotNone(search.find_best_column(board, COLORS, 0))
+        self.assertGreater(search.num_playouts, 0)
+
+    def test_no_time(self):
+        board = Board(TEST_ROWS, TEST_COLUMNS, TEST_TO_WIN)
+        search = MonteCarloSearch(max_playouts=None, max_time=0)
+        self.assertIn(search.find_best_column(board, COLORS, 0),
+                      range(TEST_COLUMNS))
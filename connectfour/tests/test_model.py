@@ -1,8 +1,12 @@
+import json
+import time
 import unittest
 import string
 
-from connectfour.pubsub import PubSub
-from connectfour.model import Color, ConnectFourModel
+from connectfour.pubsub import ModelAction, PubSub
+from connectfour.model import (
+    AI_EASY, AI_EXPERT, AI_MEDIUM, HARD_AI_MOVE_TIME, Color,
+    ConnectFourModel)
 
 TEST_ROWS = 6
 TEST_COLUMNS = 7
@@ -98,6 +102,196 @@ class TestModel_BeforeFirstGameStarted(unittest.TestCase):
         self.assertEqual(self.model.used_colors, {P1_COLOR, P0_COLOR})
 
 
+class TestModel_PlayersByPk(unittest.TestCase):
+
+    def setUp(self):
+        self.model = ConnectFourModel(PubSub())
+        self.model._add_player(P0_NAME, P0_COLOR, pk='sid-0')
+        self.model._add_player(P1_NAME, P1_COLOR, pk='sid-1')
+        self.model._add_player(P2_NAME, P2_COLOR)
+
+    def test_get_player_by_pk(self):
+        self.assertIs(self.model.get_player_by_pk('sid-0'),
+                      self.model.players[0])
+        self.assertIs(self.model.get_player_by_pk('sid-1'),
+                      self.model.players[1])
+
+    def test_unknown_pk(self):
+        self.assertIsNone(self.model.get_player_by_pk('sid-2'))
+        self.assertIsNone(self.model.get_player_by_pk(None))
+
+    def test_duplicate_pk(self):
+        with self.assertRaises(ValueError):
+            self.model._add_player('Dave', pk='sid-1')
+        self.assertEqual(self.model.get_num_players(), 3)
+
+    def test_remove_player(self):
+        player = self.model.get_player_by_pk('sid-0')
+        self.model._remove_player(player)
+        self.assertIsNone(self.model.get_player_by_pk('sid-0'))
+
+        self.model._add_player('Dave', pk='sid-0')
+        self.assertEqual(self.model.get_player_by_pk('sid-0').name, 'Dave')
+
+    def test_remove_player_without_pk(self):
+        self.model._remove_player(self.model.players[2])
+        self.assertEqual(self.model.get_num_players(), 2)
+        self.assertIsNotNone(self.model.get_player_by_pk('sid-1'))
+
+
+class TestModel_RejoinPlayer(unittest.TestCase):
+
+    def setUp(self):
+        self.model = create_two_player_model()
+        self.model.players[0].pk = 'sid-0'
+        self.model._players_by_pk['sid-0'] = self.model.players[0]
+        self.model._start_game()
+
+    def test_rejoin_during_game(self):
+        player = self.model.players[0]
+        self.model._rejoin_player(player, 'sid-9')
+
+        self.assertEqual(player.pk, 'sid-9')
+        self.assertIs(self.model.get_player_by_pk('sid-9'), player)
+        self.assertIsNone(self.model.get_player_by_pk('sid-0'))
+
+    def test_rejoin_with_used_pk(self):
+        with self.assertRaises(ValueError):
+            self.model._rejoin_player(self.model.players[1], 'sid-0')
+
+    def test_rejoin_missing_player(self):
+        other_model = create_two_player_model()
+        with self.assertRaises(ValueError):
+            self.model._rejoin_player(other_model.players[0], 'sid-9')
+
+
+class TestModel_RemovePlayerDuringGame(unittest.TestCase):
+
+    def setUp(self):
+        self.model = create_two_player_model()
+        self.model._add_player(P2_NAME, P2_COLOR)
+        self.model._start_game()
+
+        self.next_players = []
+        self.model.pubsub.subscribe(
+            ModelAction.next_player,
+            lambda player: self.next_players.append(player))
+
+    def test_remove_current_player(self):
+        alice, bob, carol = self.model.players
+        self.model._remove_player(alice)
+        self.model.pubsub.do_queue()
+
+        self.assertTrue(self.model.game_in_progress)
+        self.assertIs(self.model.get_current_player(), bob)
+        self.assertEqual(self.next_players, [bob])
+
+    def test_remove_other_player(self):
+        alice, bob, carol = self.model.players
+        self.model._play(0)
+        self.model.pubsub.do_queue()
+        self.next_players = []
+
+        self.model._remove_player(alice)
+        self.model.pubsub.do_queue()
+        self.assertIs(self.model.get_current_player(), bob)
+        self.assertEqual(self.next_players, [])
+
+        # Skipped from then on
+        self.model._play(0)
+        self.model._play(0)
+        self.model.pubsub.do_queue()
+        self.assertEqual(self.next_players, [carol, bob])
+
+    def test_next_game_after_removing_first_player(self):
+        alice, bob, carol = self.model.players
+        self.model._remove_player(alice)
+        self.model._process_draw()
+        self.model._start_game()
+        self.assertIs(self.model.get_current_player(), bob)
+
+    def test_last_player_left_wins(self):
+        alice, bob, carol = self.model.players
+        won = []
+        self.model.pubsub.subscribe(
+            ModelAction.game_won,
+            lambda winner, winning_positions: won.append(winner))
+
+        self.model._remove_player(alice)
+        self.model._remove_player(carol)
+        self.model.pubsub.do_queue()
+
+        self.assertFalse(self.model.game_in_progress)
+        self.assertEqual(won, [bob])
+        self.assertEqual(bob.num_wins, 1)
+
+    def test_remove_all_players(self):
+        for player in list(self.model.players):
+            self.model._remove_player(player)
+
+        self.assertFalse(self.model.game_in_progress)
+
+
+class TestModel_Snapshot(unittest.TestCase):
+
+    def setUp(self):
+        self.model = create_two_player_model()
+        self.model.schedule_ai_play = lambda ai_play: None
+        self.model._add_player(P2_NAME, P2_COLOR, is_ai=True, pk='ai')
+        self.model.players[2].difficulty = AI_MEDIUM
+        self.model._start_game()
+        self.model._play(PLAYS['2P-1W'][0])
+
+    def restore(self, snapshot, scheduled=None):
+        # Through JSON, as when checkpointed
+        model = ConnectFourModel(
+            PubSub(), schedule_ai_play=(scheduled.append
+                                        if scheduled is not None else None))
+        model.restore_snapshot(json.loads(json.dumps(snapshot)))
+        return model
+
+    def test_restore(self):
+        self.model.players[0].num_wins = 2
+        self.model.players[1].num_games = 3
+        model = self.restore(self.model.get_snapshot())
+
+        self.assertEqual(model.board.get_moves(),
+                         self.model.board.get_moves())
+        self.assertEqual(model.board.get_hash(), self.model.board.get_hash())
+        self.assertEqual(model.get_json_players(),
+                         self.model.get_json_players())
+        self.assertEqual(model.players[2].difficulty, AI_MEDIUM)
+        self.assertIs(model.get_player_by_pk('ai'), model.players[2])
+        self.assertTrue(model.game_in_progress)
+        self.assertEqual(model.get_current_player().name,
+                         self.model.get_current_player().name)
+
+    def test_restored_game_continues(self):
+        scheduled = []
+        model = self.restore(self.model.get_snapshot(), scheduled)
+        model._play(3)
+        self.assertEqual(model.board.get_num_moves(), 2)
+        self.assertEqual(len(scheduled), 1)
+        self.assertEqual(model.used_colors, {P0_COLOR, P1_COLOR, P2_COLOR})
+
+    def test_restored_ai_turn_scheduled(self):
+        self.model._play(PLAYS['2P-1W'][1])
+        self.assertTrue(self.model.get_current_player().is_ai)
+
+        scheduled = []
+        model = self.restore(self.model.get_snapshot(), scheduled)
+        self.assertEqual(len(scheduled), 1)
+
+        scheduled.pop()()
+        self.assertEqual(model.board.get_num_moves(), 3)
+
+    def test_restore_without_board(self):
+        model = self.restore(ConnectFourModel(PubSub()).get_snapshot())
+        self.assertIsNone(model.board)
+        self.assertEqual(model.players, [])
+        self.assertFalse(model.game_in_progress)
+
+
 class TestModel_FirstGameStarted(unittest.TestCase):
 
     def setUp(self):
@@ -170,3 +364,90 @@ class TestModel_SecondGameStarted(unittest.TestCase):
 
     def test_first_player_rotates(self):
         self.assertEqual(self.model.get_current_player().name, P1_NAME)
+
+
+class TestModel_AIPlayers(unittest.TestCase):
+
+    def test_ai_game_plays_to_end(self):
+        model = ConnectFourModel(PubSub())
+        model._add_player(P0_NAME, P0_COLOR, is_ai=True)
+        model._add_player(P1_NAME, P1_COLOR, is_ai=True)
+        for player in model.players:
+            player.difficulty = AI_EASY
+        model._create_board(TEST_ROWS, TEST_COLUMNS, TEST_TO_WIN)
+        model._start_game()
+
+        self.assertFalse(model.game_in_progress)
+        self.assertEqual(model.get_player(0).num_games, 1)
+
+    def test_expert_finds_win(self):
+        model = create_two_player_model()
+        model._start_game()
+        for column in PLAYS['2P-1W'][:-1]:
+            model._play(column)
+
+        player = model.get_current_player()
+        player.difficulty = AI_EXPERT
+        column = player.choose_column(model)
+        self.assertTrue(model.board.is_winning_column(column, player.color))
+
+    def test_hard_ai_quick_with_many_players(self):
+        model = ConnectFourModel(PubSub())
+        model._add_player(P0_NAME, P0_COLOR)
+        model._add_player(P1_NAME, P1_COLOR)
+        model._add_player(P2_NAME, P2_COLOR, is_ai=True)
+        model._create_board(TEST_ROWS, TEST_COLUMNS, TEST_TO_WIN)
+        model._start_game()
+
+        start = time.monotonic()
+        column = model.get_player(2).choose_column(model)
+        self.assertLess(time.monotonic() - start, HARD_AI_MOVE_TIME * 5)
+        self.assertIn(column, range(TEST_COLUMNS))
+
+    def test_hard_ai_without_time(self):
+        model = ConnectFourModel(PubSub(), ai_move_time=0)
+        model._add_player(P0_NAME, P0_COLOR)
+        model._add_player(P1_NAME, P1_COLOR)
+        model._add_player(P2_NAME, P2_COLOR, is_ai=True)
+        model._create_board(TEST_ROWS, TEST_COLUMNS, TEST_TO_WIN)
+        model._start_game()
+
+        column = model.get_player(2).choose_column(model)
+        self.assertIn(column, range(TEST_COLUMNS))
+
+
+class TestModel_ScheduledAIPlays(unittest.TestCase):
+
+    def setUp(self):
+        self.scheduled = []
+        self.model = ConnectFourModel(
+            PubSub(), schedule_ai_play=self.scheduled.append)
+        self.model._add_player(P0_NAME, P0_COLOR)
+        self.model._add_player(P1_NAME, P1_COLOR, is_ai=True)
+        self.model._create_board(TEST_ROWS, TEST_COLUMNS, TEST_TO_WIN)
+        self.model._start_game()
+        self.model._play(PLAYS['2P-1W'][0])
+
+    def test_ai_play_waits_for_schedule(self):
+        self.assertEqual(len(self.scheduled), 1)
+        self.assertEqual(self.model.board.get_num_moves(), 1)
+        self.assertEqual(self.model.get_current_player().name, P1_NAME)
+
+    def test_scheduled_ai_play(self):
+        self.scheduled.pop()()
+        self.assertEqual(self.model.board.get_num_moves(), 2)
+        self.assertEqual(self.model.get_current_player().name, P0_NAME)
+
+    def test_stale_ai_play_ignored(self):
+        ai_play = self.scheduled.pop()
+        ai_play()
+        ai_play()
+        self.assertEqual(self.model.board.get_num_moves(), 2)
+
+    def test_choose_column_then_make_play(self):
+        ai_play = self.scheduled.pop()
+        column = ai_play.choose_column()
+        self.assertEqual(self.model.board.get_num_moves(), 1)
+        self.assertTrue(ai_play.make_play(column))
+        self.assertFalse(ai_play.make_play(column))
+        self.assertEqual(self.model.board.get_num_moves(), 2)
@@ -0,0 +1,77 @@
+import pickle
+import time
+import unittest
+
+from connectfour.ai.parallel import ParallelSearch, shutdown_executors
+from connectfour.ai.search import NegamaxSearch
+from connectfour.model import Color
+from connectfour.tests.helpers import TEST_COLUMNS, create_board
+
+NUM_WORKERS = 2
+
+BLACK = Color.black
+RED = Color.red
+
+
+class TestBoard_Pickle(unittest.TestCase):
+
+    def test_pickle_round_trip(self):
+        board = create_board([3, 3, 2, 6, 6])
+        copy = pickle.loads(pickle.dumps(board))
+        self.assertEqual(copy.get_json(), board.get_json())
+        self.assertEqual(copy.get_hash(), board.get_hash())
+        self.assertEqual(copy.get_num_moves(), board.get_num_moves())
+
+    def test_pickle_keeps_undo(self):
+        board = create_board([3, 3, 2])
+        copy = pickle.loads(pickle.dumps(board))
+        self.assertEqual(copy.undo(), 2)
+
+
+class TestParallelSearch(unittest.TestCase):
+
+    def test_same_as_in_process(self):
+        board = create_board([3, 3, 2])
+        for depth in (3, 5):
+            search = NegamaxSearch(max_depth=depth, max_nodes=None)
+            parallel = ParallelSearch(
+                num_workers=NUM_WORKERS, max_depth=depth, max_nodes=None)
+            self.assertEqual(search.search(board, RED, BLACK),
+                             parallel.search(board, RED, BLACK))
+
+    def test_finds_win(self):
+        board = create_board([0, 6, 0, 6, 0, 5])
+        parallel = ParallelSearch(num_workers=NUM_WORKERS, max_depth=4)
+        self.assertEqual(parallel.find_best_column(board, BLACK, RED), 0)
+
+    def test_blocks_win(self):
+        board = create_board([0, 6, 0, 6, 0])
+        parallel = ParallelSearch(num_workers=NUM_WORKERS, max_depth=4)
+        self.assertEqual(parallel.find_best_column(board, RED, BLACK), 0)
+
+    def test_with_time_limit(self):
+        board = create_board([3, 3, 2])
+        parallel = ParallelSearch(
+            num_workers=NUM_WORKERS, max_depth=42, max_nodes=None,
+            max_time=0.1)
+        self.assertIsNotNone(parallel.find_best_column(board, RED, BLACK))
+
+    def test_small_board_in_process(self):
+        board = create_board([0, 1], num_rows=3, num_columns=3, num_to_win=3)
+        parallel = ParallelSearch(num_workers=NUM_WORKERS, max_depth=9)
+        search = NegamaxSearch(max_depth=9)
+        self.assertEqual(search.search(board, BLACK, RED),
+                         parallel.search(board, BLACK, RED))
+
+    def test_returns_by_deadline(self):
+        # A fresh pool, so its workers have to start up first
+        shutdown_executors()
+        board = create_board([3, 3, 2])
+        parallel = ParallelSearch(
+            num_workers=NUM_WORKERS, max_depth=42, max_nodes=None,
+            max_time=0.01)
+
+        start = time.monotonic()
+        column = parallel.find_best_column(board, RED, BLACK)
+        self.assertLess(time.monotonic() - start, 0.5)
+        self.assertIn(column, range(TEST_COLUMNS))
@@ -0,0 +1,347 @@
+import asyncio
+import gc
+import unittest
+import weakref
+
+from connectfour.model import AI_EASY, ConnectFourModel
+from connectfour.pubsub import AsyncPubSub, ModelAction, PubSub, ViewAction
+
+
+class TestPubSub_Publish(unittest.TestCase):
+
+    def setUp(self):
+        self.pubsub = PubSub()
+        self.calls = []
+
+    def create_callback(self, name):
+        def callback(*args, **kwargs):
+            self.calls.append((name, args, kwargs))
+
+        return callback
+
+    def test_publish_without_subscribers(self):
+        self.pubsub.publish(ModelAction.game_started, trigger_queue=True)
+        self.assertEqual(len(self.pubsub.queue), 0)
+
+    def test_publish_queues_until_triggered(self):
+        self.pubsub.subscribe(ModelAction.game_draw, self.create_callback(0))
+        self.pubsub.publish(ModelAction.game_draw)
+        self.assertEqual(self.calls, [])
+
+        self.pubsub.do_queue()
+        self.assertEqual(self.calls, [(0, (), {})])
+
+    def test_each_subscriber_called(self):
+        for name in range(3):
+            self.pubsub.subscribe(ModelAction.next_player,
+                                  self.create_callback(name))
+
+        self.pubsub.publish(ModelAction.next_player, trigger_queue=True,
+                            player='p')
+        self.assertEqual(self.calls, [(name, (), {'player': 'p'})
+                                      for name in range(3)])
+
+    def test_arguments_passed(self):
+        self.pubsub.subscribe(ViewAction.play, self.create_callback(0))
+        self.pubsub.publish(ViewAction.play, True, 1, 2, column=3)
+        self.assertEqual(self.calls, [(0, (1, 2), {'column': 3})])
+
+    def test_nested_publish_order(self):
+        def publish_next(**kwargs):
+            self.calls.append(('first', (), kwargs))
+            self.pubsub.publish(ModelAction.next_player, player='p')
+
+        self.pubsub.subscribe(ModelAction.color_played, publish_next)
+        self.pubsub.subscribe(ModelAction.color_played,
+                              self.create_callback('second'))
+        self.pubsub.subscribe(ModelAction.next_player,
+                              self.create_callback('third'))
+
+        self.pubsub.publish(ModelAction.color_played, trigger_queue=True)
+        self.assertEqual([call[0] for call in self.calls],
+                         ['first', 'second', 'third'])
+
+
+class TestPubSub_Subscriptions(unittest.TestCase):
+
+    def setUp(self):
+        self.pubsub = PubSub()
+        self.calls = []
+
+    def callback(self, **kwargs):
+        self.calls.append(kwargs)
+
+    def test_actions_kept_apart(self):
+        self.pubsub.subscribe(ModelAction.player_added, self.callback)
+        self.pubsub.publish(ViewAction.add_player, trigger_queue=True)
+        self.pubsub.publish(ModelAction.player_removed, trigger_queue=True)
+        self.assertEqual(self.calls, [])
+
+        self.pubsub.publish(ModelAction.player_added, trigger_queue=True)
+        self.assertEqual(len(self.calls), 1)
+
+    def test_every_action(self):
+        for action_class in (ModelAction, ViewAction):
+            for action in action_class:
+                pubsub = PubSub()
+                pubsub.subscribe(action, self.callback)
+                pubsub.publish(action, trigger_queue=True, published=action)
+
+        self.assertEqual([call['published'] for call in self.calls],
+                         list(ModelAction) + list(ViewAction))
+
+    def test_unsubscribe(self):
+        self.pubsub.subscribe(ModelAction.game_won, self.callback)
+        self.pubsub.unsubscribe(ModelAction.game_won, self.callback)
+        self.pubsub.publish(ModelAction.game_won, trigger_queue=True)
+        self.assertEqual(self.calls, [])
+
+    def test_unsubscribe_one_of_two(self):
+        self.pubsub.subscribe(ModelAction.game_won, self.callback)
+        self.pubsub.subscribe(ModelAction.game_won, self.callback)
+        self.pubsub.unsubscribe(ModelAction.game_won, self.callback)
+        self.pubsub.publish(ModelAction.game_won, trigger_queue=True)
+        self.assertEqual(len(self.calls), 1)
+
+    def test_unsubscribe_keeps_queued_calls(self):
+        self.pubsub.subscribe(ModelAction.game_won, self.callback)
+        self.pubsub.publish(ModelAction.game_won)
+        self.pubsub.unsubscribe(ModelAction.game_won, self.callback)
+        self.pubsub.do_queue()
+        self.assertEqual(len(self.calls), 1)
+
+    def test_unsubscribe_not_subscribed(self):
+        with self.assertRaises(ValueError):
+            self.pubsub.unsubscribe(ModelAction.game_won, self.callback)
+
+        self.pubsub.subscribe(ModelAction.game_draw, self.callback)
+        with self.assertRaises(ValueError):
+            self.pubsub.unsubscribe(ModelAction.game_won, self.callback)
+
+
+class TestPubSub_Drained(unittest.TestCase):
+
+    def setUp(self):
+        self.pubsub = PubSub()
+        self.batch = []
+        self.batches = []
+        self.pubsub.subscribe(ModelAction.color_played, self.batch.append)
+        self.pubsub.subscribe(ModelAction.next_player, self.batch.append)
+        self.pubsub.subscribe_drained(self.flush)
+
+    def flush(self):
+        self.batches.append(list(self.batch))
+        del self.batch[:]
+
+    def test_one_batch_per_drain(self):
+        self.pubsub.publish(ModelAction.color_played, False, 'played')
+        self.pubsub.publish(ModelAction.next_player, True, 'next')
+        self.pubsub.publish(ModelAction.color_played, True, 'again')
+        self.assertEqual(self.batches, [['played', 'next'], ['again']])
+
+    def test_empty_drain(self):
+        self.pubsub.do_queue()
+        self.pubsub.publish(ModelAction.game_won, trigger_queue=True)
+        self.assertEqual(self.batches, [])
+
+    def test_nested_do_queue(self):
+        def publish_next(name):
+            self.batch.append(name)
+            self.pubsub.publish(ModelAction.next_player, True, 'next')
+
+        self.pubsub.subscribe(ModelAction.game_started, publish_next)
+        self.pubsub.publish(ModelAction.game_started, True, 'started')
+        self.assertEqual(self.batches, [['started', 'next']])
+
+    def test_unsubscribe_drained(self):
+        self.pubsub.unsubscribe_drained(self.flush)
+        self.pubsub.publish(ModelAction.color_played, True, 'played')
+        self.assertEqual(self.batches, [])
+
+        with self.assertRaises(ValueError):
+            self.pubsub.unsubscribe_drained(self.flush)
+
+
+class Subscriber(object):
+
+    def __init__(self, pubsub, weak=None):
+        self.calls = []
+        pubsub.subscribe(ModelAction.color_played, self.on_color_played,
+                         weak=weak)
+        pubsub.subscribe_drained(self.on_drained, weak=weak)
+
+    def on_color_played(self, **kwargs):
+        self.calls.append(kwargs)
+
+    def on_drained(self):
+        self.calls.append('drained')
+
+
+class TestPubSub_Weak(unittest.TestCase):
+
+    def setUp(self):
+        self.pubsub = PubSub(weak=True)
+
+    def get_num_subscriptions(self):
+        return (len(self.pubsub._get_callbacks(ModelAction.color_played))
+                + len(self.pubsub.drained_callbacks))
+
+    def test_live_subscriber_called(self):
+        subscriber = Subscriber(self.pubsub)
+        self.pubsub.publish(ModelAction.color_played, True, position=(0, 0))
+        self.assertEqual(subscriber.calls, [{'position': (0, 0)}, 'drained'])
+
+    def test_dead_subscriber_removed(self):
+        Subscriber(self.pubsub)
+        self.assertEqual(self.get_num_subscriptions(), 0)
+        self.pubsub.publish(ModelAction.color_played, trigger_queue=True)
+
+    def test_strong_subscription_in_weak_pubsub(self):
+        calls = []
+        self.pubsub.subscribe(ModelAction.game_draw,
+                              lambda: calls.append('draw'), weak=False)
+        self.pubsub.publish(ModelAction.game_draw, trigger_queue=True)
+        self.assertEqual(calls, ['draw'])
+
+    def test_weak_subscription_in_strong_pubsub(self):
+        pubsub = PubSub()
+        Subscriber(pubsub, weak=True)
+        self.assertEqual(
+            len(pubsub._get_callbacks(ModelAction.color_played)), 0)
+
+    def test_collected_while_queued(self):
+        subscriber = Subscriber(self.pubsub)
+        self.pubsub.publish(ModelAction.color_played, position=(0, 0))
+        del subscriber
+        self.pubsub.do_queue()
+        self.assertEqual(self.get_num_subscriptions(), 0)
+
+    def test_unsubscribe(self):
+        subscriber = Subscriber(self.pubsub)
+        self.pubsub.unsubscribe(ModelAction.color_played,
+                                subscriber.on_color_played)
+        self.pubsub.unsubscribe_drained(subscriber.on_drained)
+        self.assertEqual(self.get_num_subscriptions(), 0)
+
+        with self.assertRaises(ValueError):
+            self.pubsub.unsubscribe(ModelAction.color_played,
+                                    subscriber.on_color_played)
+
+    def test_pubsub_collected(self):
+        # Subscribers do not keep the pubsub alive, and can be collected
+        # after it without error
+        subscriber = Subscriber(self.pubsub)
+        pubsub_ref = weakref.ref(self.pubsub)
+        del self.pubsub
+        gc.collect()
+        self.assertIsNone(pubsub_ref())
+
+        subscriber_ref = weakref.ref(subscriber)
+        del subscriber
+        gc.collect()
+        self.assertIsNone(subscriber_ref())
+
+    def test_models_not_kept_alive(self):
+        gc.collect()
+        num_objects = len(gc.get_objects())
+
+        for i in range(100000):
+            ConnectFourModel(self.pubsub)
+            Subscriber(self.pubsub)
+
+        gc.collect()
+        self.assertEqual(self.get_num_subscriptions(), 0)
+        self.assertEqual(
+            len(self.pubsub._get_callbacks(ViewAction.add_player)), 0)
+        self.assertLess(len(gc.get_objects()) - num_objects, 100)
+
+
+class TestAsyncPubSub(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.pubsub = AsyncPubSub()
+        self.calls = []
+
+    async def test_queue_processed_in_task(self):
+        self.pubsub.subscribe(ModelAction.game_draw, self.calls.append)
+        self.pubsub.publish(ModelAction.game_draw, True, 'a')
+        self.assertEqual(self.calls, [])
+
+        await self.pubsub.join()
+        self.assertEqual(self.calls, ['a'])
+
+    async def test_coroutine_callbacks_in_order(self):
+        async def slow_callback(name):
+            await asyncio.sleep(0.01)
+            self.calls.append(name)
+
+        self.pubsub.subscribe(ModelAction.game_draw, slow_callback)
+        self.pubsub.subscribe(ModelAction.game_draw, self.calls.append)
+        self.pubsub.publish(ModelAction.game_draw, True, 'a')
+        self.pubsub.publish(ModelAction.game_draw, True, 'b')
+        await self.pubsub.join()
+        self.assertEqual(self.calls, ['a', 'a', 'b', 'b'])
+
+    async def test_drained(self):
+        batches = []
+
+        async def flush():
+            batches.append(list(self.calls))
+
+        self.pubsub.subscribe(ModelAction.color_played, self.calls.append)
+        self.pubsub.subscribe_drained(flush)
+        self.pubsub.publish(ModelAction.color_played, False, 'a')
+        self.pubsub.publish(ModelAction.color_played, True, 'b')
+        await self.pubsub.join()
+        await self.pubsub.join()
+        self.assertEqual(batches, [['a', 'b']])
+
+    async def test_join_raises_callback_errors(self):
+        def fail():
+            raise RuntimeError('failed')
+
+        self.pubsub.subscribe(ModelAction.game_draw, fail)
+        self.pubsub.publish(ModelAction.game_draw, trigger_queue=True)
+
+        with self.assertRaises(RuntimeError):
+            await self.pubsub.join()
+
+    async def test_ai_game(self):
+        model = ConnectFourModel(
+            self.pubsub, ai_move_time=0.01,
+            schedule_ai_play=self.pubsub.schedule_ai_play)
+        game_over = asyncio.Event()
+
+        async def on_game_over(**kwargs):
+            game_over.set()
+
+        self.pubsub.subscribe(ModelAction.game_won, on_game_over)
+        self.pubsub.subscribe(ModelAction.game_draw, on_game_over)
+        self.pubsub.subscribe(ModelAction.color_played,
+                              lambda **kwargs: self.calls.append(kwargs))
+
+        for name in ('a', 'b'):
+            self.pubsub.publish(ViewAction.add_player, name=name, is_ai=True)
+        self.pubsub.publish(ViewAction.create_board, num_rows=4,
+                            num_columns=5, num_to_win=3)
+        self.pubsub.publish(ViewAction.start_game, trigger_queue=True)
+
+        await asyncio.wait_for(game_over.wait(), timeout=10)
+        await self.pubsub.join()
+        self.assertFalse(model.game_in_progress)
+        self.assertEqual(len(self.calls), model.board.get_num_moves())
+
+    async def test_stale_ai_play_ignored(self):
+        model = ConnectFourModel(
+            self.pubsub, schedule_ai_play=self.calls.append)
+        model._add_player('a', is_ai=True)
+        model._add_player('b', is_ai=True)
+        model._create_board(4, 5, 3)
+        for player in model.players:
+            player.difficulty = AI_EASY
+        model._start_game()
+
+        ai_play = self.calls.pop()
+        ai_play.make_play(0)
+        await self.pubsub._do_ai_play(ai_play)
+        self.assertEqual(model.board.get_num_moves(), 1)
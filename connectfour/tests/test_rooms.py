@@ -0,0 +1,611 @@
+import unittest
+from collections import deque
+
+from connectfour.pubsub import ViewAction
+from connectfour.web.rooms import (
+    AI_WAIT_TIME, MAX_COLUMNS, MAX_ROWS, PROTOCOL_VERSION, REJOIN_TIMEOUT,
+    ROOM_ID_LENGTH, RoomManager, get_new_room_id)
+
+ROOM_TTL = 10
+
+
+class TestRoomManager(unittest.TestCase):
+
+    def setUp(self):
+        self.emitted = []
+        self.joined = []
+        self.scheduled = []
+        self.rooms = RoomManager(
+            lambda *args: self.emitted.append(args),
+            lambda *args: self.joined.append(args),
+            lambda *args: self.scheduled.append(args))
+
+    def get_events(self, room):
+        """Get the names of events emitted to a room, then forget them."""
+        names = [event[0]
+                 for name, data, to in self.emitted
+                 if name == 'events' and to == room
+                 for event in data['events']]
+        self.emitted = []
+        return names
+
+    def create_game(self, start=True, add_ai=False):
+        self.rooms.handle('addUser', 'a', {'username': 'Alice'})
+        room = self.rooms.sid_to_room['a']
+        self.rooms.handle('addUser', 'b', {'username': 'Bob', 'room': room})
+
+        if add_ai:
+            self.rooms.room_to_state[room].pubsub.publish(
+                ViewAction.add_player, trigger_queue=True, name='AI',
+                is_ai=True)
+
+        self.rooms.handle('createBoard', 'a', {
+            'numRows': 6, 'numColumns': 7, 'numToWin': 4})
+
+        if start:
+            self.rooms.handle('startGame', 'a', {})
+
+        self.emitted = []
+        return room
+
+    def test_add_user_creates_room(self):
+        self.rooms.handle('addUser', 'a', {'username': 'Alice'})
+        room = self.rooms.sid_to_room['a']
+
+        self.assertEqual(len(room), ROOM_ID_LENGTH)
+        self.assertIn(room, self.rooms.room_to_state)
+        self.assertEqual(self.joined, [('a', room)])
+
+        name, data, to = self.emitted[0]
+        self.assertEqual((name, to), ('roomJoined', 'a'))
+        self.assertEqual(data['protocol'], PROTOCOL_VERSION)
+        self.assertEqual(self.get_events(room), ['playerAdded'])
+
+    def test_add_user_to_missing_room(self):
+        self.rooms.handle('addUser', 'a', {'username': 'A', 'room': 'NONE'})
+        self.assertEqual(self.emitted, [
+            ('roomDoesNotExist', {'room': 'NONE'}, 'a')])
+        self.assertEqual(self.rooms.room_to_state, {})
+        self.assertEqual(self.joined, [])
+
+    def test_add_user_creating_room(self):
+        self.rooms.handle('addUser', 'a', {
+            'username': 'A', 'room': 'ROOM', 'createRoom': True})
+        self.assertEqual(self.rooms.sid_to_room, {'a': 'ROOM'})
+        self.assertEqual(self.joined, [('a', 'ROOM')])
+
+    def test_create_board_too_large(self):
+        self.rooms.handle('addUser', 'a', {'username': 'Alice'})
+        room_state = self.rooms.room_to_state[self.rooms.sid_to_room['a']]
+
+        for num_rows, num_columns in ((MAX_ROWS + 1, 7),
+                                      (6, MAX_COLUMNS + 1)):
+            with self.assertRaises(ValueError):
+                self.rooms.handle('createBoard', 'a', {
+                    'numRows': num_rows, 'numColumns': num_columns,
+                    'numToWin': 4})
+        self.assertIsNone(room_state.model.board)
+
+        self.rooms.handle('createBoard', 'a', {
+            'numRows': MAX_ROWS, 'numColumns': MAX_COLUMNS, 'numToWin': 4})
+        self.assertEqual(room_state.model.get_num_rows(), MAX_ROWS)
+
+    def test_play(self):
+        room = self.create_game()
+        model = self.rooms.room_to_state[room].model
+        sid = model.get_current_player().pk
+
+        self.rooms.handle('play', sid, {'column': 3})
+        self.assertEqual(self.get_events(room), ['colorPlayed', 'nextPlayer'])
+        self.assertEqual(model.board.get_num_moves(), 1)
+
+    def test_play_out_of_turn_ignored(self):
+        room = self.create_game()
+        model = self.rooms.room_to_state[room].model
+        other = 'b' if model.get_current_player().pk == 'a' else 'a'
+
+        self.rooms.handle('play', other, {'column': 3})
+        self.assertEqual(self.emitted, [])
+        self.assertEqual(model.board.get_num_moves(), 0)
+
+    def test_commands_without_room_ignored(self):
+        for command in ('createBoard', 'startGame', 'play', 'resync',
+                        'disconnect'):
+            self.rooms.handle(command, 'a', {})
+
+        self.assertEqual(self.emitted, [])
+
+    def test_unknown_command(self):
+        with self.assertRaises(ValueError):
+            self.rooms.handle('cheat', 'a', {})
+
+    def test_resync(self):
+        room = self.create_game()
+        self.rooms.handle('resync', 'b', {})
+
+        name, data, to = self.emitted[0]
+        self.assertEqual((name, to), ('roomSnapshot', 'b'))
+        self.assertEqual(data['board']['numMoves'], 0)
+        self.assertTrue(data['gameInProgress'])
+        self.assertEqual(data['seq'],
+                         self.rooms.room_to_state[room].seq)
+
+    def test_last_disconnect_deletes_room(self):
+        room = self.create_game(start=False)
+
+        self.rooms.handle('disconnect', 'a', {})
+        self.assertIn(room, self.rooms.room_to_state)
+        self.assertEqual(self.get_events(room), ['playerRemoved'])
+
+        room_state = self.rooms.room_to_state[room]
+        self.rooms.handle('disconnect', 'b', {})
+        self.assertNotIn(room, self.rooms.room_to_state)
+        self.assertEqual(self.rooms.sid_to_room, {})
+
+        # So that AI plays already scheduled are skipped
+        self.assertTrue(room_state.closed)
+
+    def test_client_of_closed_room_forgotten(self):
+        room = self.create_game()
+
+        # Players cannot be added during a game, but the client is still
+        # in the room
+        with self.assertRaises(RuntimeError):
+            self.rooms.handle('addUser', 'c', {'username': 'C',
+                                               'room': room})
+
+        self.rooms.sweep(float('inf'))
+        self.assertEqual(self.rooms.sid_to_room, {'c': room})
+
+        self.rooms.handle('play', 'c', {'column': 0})
+        self.assertEqual(self.rooms.sid_to_room, {})
+        self.rooms.handle('disconnect', 'c', {})
+
+    def test_disconnect_during_game_keeps_player(self):
+        room = self.create_game()
+        self.rooms.handle('disconnect', 'a', {})
+        self.rooms.handle('disconnect', 'b', {})
+
+        self.assertEqual(self.rooms.sid_to_room, {})
+        self.assertEqual(
+            len(self.rooms.room_to_state[room].model.players), 2)
+        self.assertEqual(self.get_events(room), [])
+
+    def test_disconnected_player_removed_after_timeout(self):
+        room = self.create_game(start=False)
+        self.rooms.handle('addUser', 'c', {'username': 'Carol',
+                                           'room': room})
+        self.rooms.handle('startGame', 'a', {})
+        self.emitted = []
+
+        model = self.rooms.room_to_state[room].model
+        sid = model.get_current_player().pk
+        self.rooms.handle('disconnect', sid, {})
+
+        delay, function = self.scheduled[-1]
+        self.assertEqual(delay, REJOIN_TIMEOUT)
+
+        function()
+        self.assertEqual(self.get_events(room),
+                         ['playerRemoved', 'nextPlayer'])
+        self.assertIsNone(model.get_player_by_pk(sid))
+        self.assertTrue(model.game_in_progress)
+        self.assertNotEqual(model.get_current_player().pk, sid)
+
+        # The player left wins, rather than playing alone
+        sid = model.get_current_player().pk
+        self.rooms.handle('disconnect', sid, {})
+        self.scheduled[-1][1]()
+        self.assertEqual(self.get_events(room),
+                         ['playerRemoved', 'gameWon'])
+        self.assertFalse(model.game_in_progress)
+        self.assertEqual(model.players[0].num_wins, 1)
+
+    def test_rejoined_player_kept_after_timeout(self):
+        room = self.create_game()
+        room_state = self.rooms.room_to_state[room]
+        model = room_state.model
+        token = room_state.rejoin_tokens['a']
+        self.rooms.handle('disconnect', 'a', {})
+        self.rooms.handle('addUser', 'a2', {
+            'username': 'Alice', 'room': room, 'pk': 'a',
+            'rejoinToken': token})
+
+        self.scheduled[-1][1]()
+        self.assertEqual(model.get_player_by_pk('a2').name, 'Alice')
+        self.assertEqual(len(model.players), 2)
+
+    def test_disconnected_player_removed_when_game_ends(self):
+        room = self.create_game()
+        room_state = self.rooms.room_to_state[room]
+        self.rooms.handle('disconnect', 'b', {})
+
+        # The first player wins in column 0
+        for column in (0, 1, 0, 1, 0, 1, 0):
+            room_state.pubsub.publish(
+                ViewAction.play, trigger_queue=True, column=column)
+
+        self.assertEqual(self.get_events(room)[-2:],
+                         ['gameWon', 'playerRemoved'])
+        self.assertEqual([player.pk for player in room_state.model.players],
+                         ['a'])
+
+    def test_rejoin_token_sent_to_client(self):
+        self.rooms.handle('addUser', 'a', {'username': 'Alice'})
+        name, data, to = self.emitted[0]
+        self.assertEqual((name, to), ('roomJoined', 'a'))
+
+        room_state = self.rooms.room_to_state[data['room']]
+        self.assertEqual(room_state.rejoin_tokens, {'a': data['rejoinToken']})
+
+        # But not in events sent to the room
+        self.assertNotIn(data['rejoinToken'], repr(self.emitted[1:]))
+
+    def test_rejoin_without_token(self):
+        room = self.create_game()
+        model = self.rooms.room_to_state[room].model
+        self.rooms.handle('disconnect', 'a', {})
+
+        for token in (None, 'wrong', 1, '\u00e9'):
+            # Treated as a new player, who can not join during a game
+            with self.assertRaises(RuntimeError):
+                self.rooms.handle('addUser', 'c', {
+                    'username': 'Eve', 'room': room, 'pk': 'a',
+                    'rejoinToken': token})
+            self.rooms.handle('disconnect', 'c', {})
+
+        self.assertEqual(model.get_player_by_pk('a').name, 'Alice')
+
+    def test_reconnect_before_disconnect(self):
+        # As when the old connection's disconnect is only noticed later
+        room = self.create_game()
+        model = self.rooms.room_to_state[room].model
+        token = self.rooms.room_to_state[room].rejoin_tokens['a']
+        self.rooms.handle('addUser', 'a2', {
+            'username': 'Alice', 'room': room, 'pk': 'a',
+            'rejoinToken': token})
+
+        self.assertEqual([player.pk for player in model.players],
+                         ['a2', 'b'])
+        self.assertNotIn('a', self.rooms.sid_to_room)
+
+        # Leaves the rejoined player alone
+        self.rooms.handle('disconnect', 'a', {})
+        self.assertEqual(self.rooms.sid_to_room, {'a2': room, 'b': room})
+        self.assertEqual(self.scheduled, [])
+
+    def test_rejoin_token_replaced(self):
+        room = self.create_game()
+        room_state = self.rooms.room_to_state[room]
+        token = room_state.rejoin_tokens['a']
+        self.rooms.handle('disconnect', 'a', {})
+        self.rooms.handle('addUser', 'a2', {
+            'username': 'Alice', 'room': room, 'pk': 'a',
+            'rejoinToken': token})
+
+        name, data, to = self.emitted[-1]
+        self.assertEqual((name, to), ('roomJoined', 'a2'))
+        self.assertNotEqual(data['rejoinToken'], token)
+        self.assertEqual(room_state.rejoin_tokens,
+                         {'a2': data['rejoinToken'],
+                          'b': room_state.rejoin_tokens['b']})
+
+    def test_ai_play_scheduled(self):
+        room = self.create_game(add_ai=True)
+        model = self.rooms.room_to_state[room].model
+
+        # Play until it is the AI's turn
+        while not model.get_current_player().is_ai:
+            sid = model.get_current_player().pk
+            self.rooms.handle('play', sid, {'column': 0})
+
+        num_moves = model.board.get_num_moves()
+        delay, function = self.scheduled[-1]
+        self.assertEqual(delay, AI_WAIT_TIME)
+
+        self.emitted = []
+        function()
+        self.assertEqual(model.board.get_num_moves(), num_moves + 1)
+        self.assertIn('colorPlayed', self.get_events(room))
+
+
+class TestRoomManager_EventLog(unittest.TestCase):
+
+    def setUp(self):
+        self.emitted = []
+        self.rooms = RoomManager(
+            lambda *args: self.emitted.append(args),
+            lambda *args: None, lambda *args: None)
+        self.rooms.handle('addUser', 'a', {'username': 'Alice'})
+        self.room = self.rooms.sid_to_room['a']
+        self.state = self.rooms.room_to_state[self.room]
+        self.token = self.state.rejoin_tokens['a']
+        self.rooms.handle('createBoard', 'a', {
+            'numRows': 6, 'numColumns': 7, 'numToWin': 4})
+        self.rooms.handle('startGame', 'a', {})
+        self.emitted = []
+
+    def play(self, num_plays):
+        for i in range(num_plays):
+            self.rooms.handle('play', 'a', {'column': i % 3})
+
+    def test_events_numbered(self):
+        seq = self.state.seq
+        self.play(2)
+
+        self.assertEqual([data['seq'] for name, data, to in self.emitted],
+                         [seq + 2, seq + 4])
+        self.assertEqual(self.state.seq, seq + 4)
+
+    def test_resync_sends_missed_events(self):
+        seq = self.state.seq
+        self.play(3)
+        self.emitted = []
+
+        self.rooms.handle('resync', 'a', {
+            'logId': self.state.log_id, 'lastSeq': seq + 2})
+        name, data, to = self.emitted[0]
+
+        self.assertEqual((name, to), ('events', 'a'))
+        self.assertEqual(data['seq'], seq + 6)
+        self.assertEqual([event[0] for event in data['events']],
+                         ['colorPlayed', 'nextPlayer'] * 2)
+        self.assertEqual(data['events'][0][1]['position'], (5, 1))
+
+    def test_resync_when_up_to_date(self):
+        self.rooms.handle('resync', 'a', {
+            'logId': self.state.log_id, 'lastSeq': self.state.seq})
+        self.assertEqual(self.emitted, [
+            ('events', {'events': [], 'seq': self.state.seq}, 'a')])
+
+    def test_resync_too_far_behind(self):
+        self.state.event_log = deque(maxlen=4)
+        seq = self.state.seq
+        self.play(3)
+
+        self.rooms.handle('resync', 'a', {
+            'logId': self.state.log_id, 'lastSeq': seq + 1})
+        name, data, to = self.emitted[-1]
+        self.assertEqual(name, 'roomSnapshot')
+        self.assertEqual(data['board']['numMoves'], 3)
+        self.assertEqual(data['seq'], seq + 6)
+
+        self.rooms.handle('resync', 'a', {
+            'logId': self.state.log_id, 'lastSeq': seq + 2})
+        self.assertEqual(self.emitted[-1][0], 'events')
+
+    def test_resync_with_other_log(self):
+        for log_id, seq in ((None, 0), ('OTHER', self.state.seq),
+                            (self.state.log_id, self.state.seq + 1),
+                            (self.state.log_id, None)):
+            self.rooms.handle('resync', 'a', {
+                'logId': log_id, 'lastSeq': seq})
+            self.assertEqual(self.emitted.pop()[0], 'roomSnapshot')
+
+    def test_rejoin_sends_missed_events(self):
+        seq = self.state.seq
+        self.play(1)
+        self.emitted = []
+
+        self.rooms.handle('disconnect', 'a', {})
+        self.rooms.handle('addUser', 'a2', {
+            'username': 'Alice', 'room': self.room, 'pk': 'a',
+            'rejoinToken': self.token, 'logId': self.state.log_id,
+            'lastSeq': seq})
+
+        name, data, to = self.emitted[-2]
+        self.assertEqual((name, to), ('roomJoined', 'a2'))
+        self.assertNotIn('board', data)
+
+        name, data, to = self.emitted[-1]
+        self.assertEqual((name, to), ('events', 'a2'))
+        self.assertEqual([event[0] for event in data['events']],
+                         ['colorPlayed', 'nextPlayer', 'playerRejoined'])
+
+    def test_rejoin_before_disconnect_sends_missed_events(self):
+        seq = self.state.seq
+        self.play(1)
+        self.emitted = []
+
+        # The old connection's disconnect has not been handled yet
+        self.rooms.handle('addUser', 'a2', {
+            'username': 'Alice', 'room': self.room, 'pk': 'a',
+            'rejoinToken': self.token, 'logId': self.state.log_id,
+            'lastSeq': seq})
+
+        name, data, to = self.emitted[-1]
+        self.assertEqual((name, to), ('events', 'a2'))
+        self.assertEqual([event[0] for event in data['events']],
+                         ['colorPlayed', 'nextPlayer', 'playerRejoined'])
+        self.assertEqual(data['seq'], self.state.seq)
+
+    def test_rejoin_without_seq_sends_room(self):
+        self.rooms.handle('disconnect', 'a', {})
+        self.rooms.handle('addUser', 'a2', {
+            'username': 'Alice', 'room': self.room, 'pk': 'a',
+            'rejoinToken': self.token})
+
+        name, data, to = self.emitted[-1]
+        self.assertEqual((name, to), ('roomJoined', 'a2'))
+        self.assertEqual(data['logId'], self.state.log_id)
+        self.assertEqual(data['seq'], self.state.seq)
+        self.assertTrue(data['gameInProgress'])
+
+
+class TestRoomManager_Restore(unittest.TestCase):
+
+    def setUp(self):
+        self.emitted = []
+        self.old_rooms = RoomManager(
+            lambda *args: None, lambda *args: None, lambda *args: None)
+        self.old_rooms.handle('addUser', 'a', {'username': 'Alice'})
+        self.room = self.old_rooms.sid_to_room['a']
+        self.old_rooms.handle('addUser', 'b', {
+            'username': 'Bob', 'room': self.room})
+        self.old_rooms.handle('createBoard', 'a', {
+            'numRows': 6, 'numColumns': 7, 'numToWin': 4})
+        self.old_rooms.handle('startGame', 'a', {})
+        old_state = self.old_rooms.room_to_state[self.room]
+        self.old_rooms.handle(
+            'play', old_state.model.get_current_player().pk, {'column': 3})
+        self.tokens = old_state.rejoin_tokens
+
+        # As if restarted
+        self.scheduled = []
+        self.rooms = RoomManager(
+            lambda *args: self.emitted.append(args),
+            lambda *args: None, lambda *args: self.scheduled.append(args))
+        self.rooms.restore({self.room: old_state.get_snapshot()})
+        self.model = self.rooms.room_to_state[self.room].model
+
+    def test_restored(self):
+        self.assertEqual(self.model.board.get_num_moves(), 1)
+        self.assertEqual([player.pk for player in self.model.players],
+                         ['a', 'b'])
+        self.assertEqual(self.rooms.sid_to_room, {})
+
+    def test_rejoin(self):
+        current_pk = self.model.get_current_player().pk
+        self.rooms.handle('addUser', 'new', {
+            'username': 'x', 'room': self.room, 'pk': current_pk,
+            'rejoinToken': self.tokens[current_pk]})
+
+        name, data, to = self.emitted.pop()
+        self.assertEqual((name, to), ('roomJoined', 'new'))
+        self.assertTrue(data['gameInProgress'])
+        self.assertEqual(data['nextPlayer']['pk'], 'new')
+        self.assertEqual(data['board']['numMoves'], 1)
+
+        name, data, to = self.emitted[0]
+        self.assertEqual([event[0] for event in data['events']],
+                         ['playerRejoined'])
+        self.assertEqual(data['events'][0][1]['oldPk'], current_pk)
+
+        self.rooms.handle('play', 'new', {'column': 3})
+        self.assertEqual(self.model.board.get_num_moves(), 2)
+
+    def test_players_not_rejoined_removed(self):
+        self.assertEqual(len(self.scheduled), 2)
+        self.rooms.handle('addUser', 'a2', {
+            'username': 'x', 'room': self.room, 'pk': 'a',
+            'rejoinToken': self.tokens['a']})
+
+        for delay, function in self.scheduled:
+            self.assertEqual(delay, REJOIN_TIMEOUT)
+            function()
+
+        self.assertEqual([player.pk for player in self.model.players],
+                         ['a2'])
+
+    def test_rejoin_as_connected_player(self):
+        self.rooms.handle('addUser', 'a2', {
+            'username': 'x', 'room': self.room, 'pk': 'a',
+            'rejoinToken': self.tokens['a']})
+
+        # With the token, the player is taken back from a client that
+        # still seems connected
+        token = self.rooms.room_to_state[self.room].rejoin_tokens['a2']
+        self.rooms.handle('addUser', 'a3', {
+            'username': 'x', 'room': self.room, 'pk': 'a2',
+            'rejoinToken': token})
+        self.assertEqual(self.model.get_player_by_pk('a3').name, 'Alice')
+        self.assertIsNone(self.model.get_player_by_pk('a2'))
+        self.assertEqual(self.rooms.sid_to_room, {'a3': self.room})
+
+    def test_new_room_id_not_restored_id(self):
+        self.rooms.handle('addUser', 'c', {
+            'username': 'C', 'room': self.room, 'createRoom': True})
+        self.assertNotEqual(self.rooms.sid_to_room['c'], self.room)
+        self.assertEqual(len(self.rooms.room_to_state), 2)
+
+
+class TestRoomManager_Eviction(unittest.TestCase):
+
+    def setUp(self):
+        self.emitted = []
+        self.scheduled = []
+        self.rooms = RoomManager(
+            lambda *args: self.emitted.append(args),
+            lambda *args: None,
+            lambda *args: self.scheduled.append(args),
+            room_ttl=ROOM_TTL, max_rooms=3)
+
+    def add_room(self, sid):
+        self.rooms.handle('addUser', sid, {'username': sid})
+        return self.rooms.sid_to_room[sid]
+
+    def test_sweep_closes_idle_rooms(self):
+        room = self.add_room('a')
+        state = self.rooms.room_to_state[room]
+        self.emitted = []
+
+        self.assertEqual(self.rooms.sweep(state.last_active + ROOM_TTL), 0)
+        self.assertEqual(
+            self.rooms.sweep(state.last_active + ROOM_TTL + 1), 1)
+
+        self.assertEqual(self.rooms.room_to_state, {})
+        self.assertEqual(self.rooms.sid_to_room, {})
+        self.assertEqual(self.emitted, [('roomClosed', {'room': room}, room)])
+
+    def test_sweep_keeps_active_rooms(self):
+        idle_room = self.add_room('a')
+        active_room = self.add_room('b')
+        idle_state = self.rooms.room_to_state[idle_room]
+        active_state = self.rooms.room_to_state[active_room]
+        idle_state.last_active -= ROOM_TTL
+
+        self.rooms.handle('resync', 'b', {})
+        self.rooms.sweep(active_state.last_active + ROOM_TTL / 2)
+        self.assertEqual(list(self.rooms.room_to_state), [active_room])
+
+    def test_sweep_without_ttl(self):
+        self.rooms.room_ttl = None
+        self.add_room('a')
+        self.assertEqual(self.rooms.sweep(float('inf')), 0)
+
+    def test_least_recently_active_room_evicted(self):
+        rooms = [self.add_room(sid) for sid in 'abc']
+
+        # 'a' is now more recently active than 'b'
+        self.rooms.handle('resync', 'a', {})
+        self.add_room('d')
+
+        self.assertNotIn(rooms[1], self.rooms.room_to_state)
+        self.assertNotIn('b', self.rooms.sid_to_room)
+        self.assertEqual(len(self.rooms.room_to_state), 3)
+        self.assertEqual(self.rooms.get_metrics(), {
+            'rooms': 3,
+            'clients': 3,
+            'idle_evictions': 0,
+            'capacity_evictions': 1,
+        })
+
+    def test_closed_room_skips_ai_play(self):
+        room = self.add_room('a')
+        state = self.rooms.room_to_state[room]
+        state.pubsub.publish(
+            ViewAction.add_player, trigger_queue=True, name='AI', is_ai=True)
+        self.rooms.handle('createBoard', 'a', {
+            'numRows': 6, 'numColumns': 7, 'numToWin': 4})
+        self.rooms.handle('startGame', 'a', {})
+
+        if not state.model.get_current_player().is_ai:
+            self.rooms.handle('play', 'a', {'column': 0})
+
+        num_moves = state.model.board.get_num_moves()
+        self.rooms.sweep(state.last_active + ROOM_TTL + 1)
+        self.scheduled[-1][1]()
+        self.assertEqual(state.model.board.get_num_moves(), num_moves)
+        self.assertEqual(self.rooms.get_metrics()['idle_evictions'], 1)
+
+
+class TestGetNewRoomId(unittest.TestCase):
+
+    def test_not_taken(self):
+        taken = set()
+
+        for i in range(100):
+            room = get_new_room_id(taken)
+            self.assertNotIn(room, taken)
+            self.assertEqual(len(room), ROOM_ID_LENGTH)
+            taken.add(room)
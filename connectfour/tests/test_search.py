@@ -0,0 +1,99 @@
+import time
+import unittest
+
+from connectfour.ai.search import NegamaxSearch, WIN_SCORE, get_column_order
+from connectfour.model import Board, Color
+from connectfour.tests.helpers import (
+    TEST_COLUMNS, TEST_ROWS, TEST_TO_WIN, create_board)
+
+BLACK = Color.black
+RED = Color.red
+
+
+class TestSearch_Basics(unittest.TestCase):
+
+    def setUp(self):
+        self.search = NegamaxSearch(max_depth=4)
+
+    def test_column_order_center_first(self):
+        board = Board(TEST_ROWS, TEST_COLUMNS, TEST_TO_WIN)
+        self.assertEqual(get_column_order(board), [3, 2, 4, 1, 5, 0, 6])
+
+    def test_empty_board_plays_center(self):
+        board = Board(TEST_ROWS, TEST_COLUMNS, TEST_TO_WIN)
+        self.assertEqual(self.search.find_best_column(board, BLACK, RED), 3)
+
+    def test_finds_win(self):
+        board = create_board([0, 6, 0, 6, 0, 5])
+        column, score = self.search.search(board, BLACK, RED)
+        self.assertEqual(column, 0)
+        self.assertEqual(score, WIN_SCORE - 7)
+
+    def test_blocks_win(self):
+        board = create_board([0, 6, 0, 6, 0])
+        self.assertEqual(self.search.find_best_column(board, RED, BLACK), 0)
+
+    def test_blocks_win_over_its_own_threat(self):
+        board = create_board([3, 6, 3, 6, 3, 5])
+        self.assertEqual(self.search.find_best_column(board, BLACK, RED), 3)
+
+    def test_sees_forced_win(self):
+        # Black can make two threats at once on the bottom row
+        board = create_board([2, 2, 3, 3])
+        column, score = self.search.search(board, BLACK, RED)
+        self.assertIn(column, (1, 4))
+        self.assertGreater(score, WIN_SCORE - TEST_ROWS * TEST_COLUMNS)
+
+    def test_board_not_modified(self):
+        board = create_board([3, 3, 2])
+        before = board.get_json()
+        self.search.search(board, RED, BLACK)
+        self.assertEqual(board.get_json(), before)
+        self.assertEqual(board.get_num_moves(), 3)
+
+    def test_full_board(self):
+        board = create_board([0, 0, 1, 1], num_rows=2, num_columns=2)
+        self.assertEqual(self.search.search(board, BLACK, RED), (None, 0))
+
+    def test_node_budget(self):
+        search = NegamaxSearch(max_depth=20, max_nodes=100)
+        board = Board(TEST_ROWS, TEST_COLUMNS, TEST_TO_WIN)
+        search.search(board, BLACK, RED)
+        self.assertLess(search.num_nodes, 200)
+
+
+class TestSearch_IterativeDeepening(unittest.TestCase):
+
+    def test_returns_column_with_no_time(self):
+        search = NegamaxSearch(max_depth=20, max_nodes=None, max_time=0)
+        board = create_board([3, 3, 2])
+        self.assertIsNotNone(search.find_best_column(board, RED, BLACK))
+        self.assertEqual(search.depth_reached, 1)
+
+    def test_stops_at_deadline(self):
+        search = NegamaxSearch(max_depth=40, max_nodes=None, max_time=0.05)
+        board = Board(TEST_ROWS, TEST_COLUMNS, TEST_TO_WIN)
+        start = time.monotonic()
+        search.find_best_column(board, BLACK, RED)
+        self.assertLess(time.monotonic() - start, 0.5)
+        self.assertLess(search.depth_reached, 40)
+
+    def test_stops_at_max_depth(self):
+        search = NegamaxSearch(max_depth=3, max_nodes=None, max_time=10)
+        board = Board(TEST_ROWS, TEST_COLUMNS, TEST_TO_WIN)
+        search.find_best_column(board, BLACK, RED)
+        self.assertEqual(search.depth_reached, 3)
+
+    def test_stops_when_decided(self):
+        search = NegamaxSearch(max_depth=40, max_nodes=None, max_time=10)
+        board = create_board([2, 2, 3, 3])
+        self.assertIn(search.find_best_column(board, BLACK, RED), (1, 4))
+        self.assertLess(search.depth_reached, 40)
+
+    def test_same_as_fixed_depth(self):
+        board = create_board([3, 3, 2])
+        fixed = NegamaxSearch(max_depth=4, max_nodes=None)
+        iterative = NegamaxSearch(max_depth=4, max_nodes=None, max_time=10)
+        self.assertEqual(
+            fixed.search(board, RED, BLACK),
+            iterative.iterative_search(board, RED, BLACK, 10))
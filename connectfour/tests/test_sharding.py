@@ -0,0 +1,162 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from connectfour.web.sharding import ConsistentHashRing, ShardRouter
+
+# Seconds to wait for shard processes to reply
+TIMEOUT = 30
+
+
+class TestConsistentHashRing(unittest.TestCase):
+
+    def setUp(self):
+        self.rooms = ['R{}'.format(i) for i in range(2000)]
+
+    def test_same_shard_each_time(self):
+        ring = ConsistentHashRing(4)
+        other_ring = ConsistentHashRing(4)
+
+        for room in self.rooms:
+            self.assertEqual(ring.get_shard(room), other_ring.get_shard(room))
+
+    def test_all_shards_used_evenly(self):
+        ring = ConsistentHashRing(4)
+        counts = [0] * 4
+
+        for room in self.rooms:
+            counts[ring.get_shard(room)] += 1
+
+        for count in counts:
+            self.assertGreater(count, len(self.rooms) / 4 / 2)
+
+    def test_adding_shard_moves_few_rooms(self):
+        ring = ConsistentHashRing(4)
+        bigger_ring = ConsistentHashRing(5)
+        num_moved = 0
+
+        for room in self.rooms:
+            shard = bigger_ring.get_shard(room)
+
+            if shard != ring.get_shard(room):
+                # Rooms only move to the new shard
+                self.assertEqual(shard, 4)
+                num_moved += 1
+
+        self.assertLess(num_moved, len(self.rooms) / 3)
+
+    def test_no_shards(self):
+        with self.assertRaises(ValueError):
+            ConsistentHashRing(0)
+
+
+class TestShardRouter(unittest.TestCase):
+
+    def setUp(self):
+        self.emitted = []
+        self.joined = []
+        self.directory = tempfile.mkdtemp()
+        self.router = self.create_router()
+
+    def tearDown(self):
+        self.router.stop()
+        shutil.rmtree(self.directory)
+
+    def create_router(self):
+        router = ShardRouter(
+            2, lambda *args: self.emitted.append(args),
+            lambda *args: self.joined.append(args),
+            checkpoint_path=os.path.join(self.directory, 'rooms.sqlite3'))
+        router.start()
+        return router
+
+    def wait_for(self, name, to):
+        """Relay messages from shards until one is emitted, returning its
+        data."""
+        deadline = time.monotonic() + TIMEOUT
+
+        while time.monotonic() < deadline:
+            self.router.poll()
+
+            for message in self.emitted:
+                if message[0] == name and message[2] == to:
+                    self.emitted.remove(message)
+                    return message[1]
+
+            time.sleep(0.01)
+
+        self.fail('{} was not emitted to {}'.format(name, to))
+
+    def test_game_across_shards(self):
+        rooms = []
+
+        # Enough rooms that both shards are used
+        for i in range(8):
+            sid = 'a{}'.format(i)
+            self.router.handle('addUser', sid, {'username': sid})
+            rooms.append(self.wait_for('roomJoined', sid)['room'])
+
+        shards = set(self.router.ring.get_shard(room) for room in rooms)
+        self.assertEqual(shards, {0, 1})
+        self.assertEqual(len(set(rooms)), len(rooms))
+        self.assertEqual(sorted(self.joined), sorted(
+            ('a{}'.format(i), room) for i, room in enumerate(rooms)))
+
+        # One player alone in a room plays until they win
+        self.router.handle('createBoard', 'a0', {
+            'numRows': 6, 'numColumns': 7, 'numToWin': 4})
+        self.router.handle('startGame', 'a0', {})
+
+        for i in range(4):
+            self.router.handle('play', 'a0', {'column': 0})
+
+        events = []
+        while 'gameWon' not in events:
+            data = self.wait_for('events', rooms[0])
+            events += [event[0] for event in data['events']]
+
+        self.assertEqual(events.count('colorPlayed'), 4)
+
+    def test_join_existing_room(self):
+        self.router.handle('addUser', 'a', {'username': 'A'})
+        room = self.wait_for('roomJoined', 'a')['room']
+
+        self.router.handle('addUser', 'b', {'username': 'B', 'room': room})
+        data = self.wait_for('roomJoined', 'b')
+        self.assertEqual(data['room'], room)
+        self.assertEqual([player['pk'] for player in data['players']], ['a'])
+
+    def test_rooms_restored_after_restart(self):
+        self.router.handle('addUser', 'a', {'username': 'A'})
+        data = self.wait_for('roomJoined', 'a')
+        room = data['room']
+        self.router.handle('createBoard', 'a', {
+            'numRows': 6, 'numColumns': 7, 'numToWin': 4})
+        self.router.handle('startGame', 'a', {})
+        self.router.handle('play', 'a', {'column': 0})
+        self.wait_for('events', room)
+
+        # Shards checkpoint when stopped
+        self.router.stop()
+        self.router = self.create_router()
+
+        self.router.handle('addUser', 'a2', {
+            'username': 'A', 'room': room, 'pk': 'a',
+            'rejoinToken': data['rejoinToken']})
+        data = self.wait_for('roomJoined', 'a2')
+        self.assertEqual(data['board']['numMoves'], 1)
+        self.assertEqual(data['nextPlayer']['pk'], 'a2')
+
+    def test_join_missing_room(self):
+        self.router.handle('addUser', 'a', {'username': 'A', 'room': 'NONE'})
+        self.assertEqual(self.wait_for('roomDoesNotExist', 'a'),
+                         {'room': 'NONE'})
+
+    def test_commands_without_room_dropped(self):
+        self.router.handle('play', 'a', {'column': 0})
+        self.router.handle('disconnect', 'a', {})
+
+        for inbox in self.router.inboxes:
+            self.assertTrue(inbox.empty())
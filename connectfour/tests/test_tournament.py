@@ -0,0 +1,192 @@
+import csv
+import json
+import os
+import random
+import tempfile
+import unittest
+
+from connectfour.model import AI_EASY, AI_MEDIUM, AI_EXPERT, AI_TABLE
+from connectfour.tournament import (
+    Entrant, ResultWriter, Standings, get_elo_ratings, get_schedule,
+    get_wilson_interval, play_game, run_tournament)
+
+TEST_ROWS = 4
+TEST_COLUMNS = 5
+TEST_TO_WIN = 3
+
+
+class TestTournament_Entrant(unittest.TestCase):
+
+    def test_from_spec(self):
+        entrant = Entrant.from_spec('expert:0.25')
+        self.assertEqual(entrant.difficulty, AI_EXPERT)
+        self.assertEqual(entrant.move_time, 0.25)
+        self.assertEqual(entrant.name, 'expert:0.25')
+
+    def test_from_spec_default_time(self):
+        entrant = Entrant.from_spec('easy')
+        self.assertEqual(entrant.difficulty, AI_EASY)
+
+    def test_unknown_difficulty(self):
+        with self.assertRaises(ValueError):
+            Entrant.from_spec('impossible')
+
+    def test_bad_move_time(self):
+        with self.assertRaises(ValueError):
+            Entrant.from_spec('easy:soon')
+
+
+class TestTournament_Games(unittest.TestCase):
+
+    def setUp(self):
+        self.easy = Entrant(AI_EASY)
+        self.medium = Entrant(AI_MEDIUM)
+        self.expert = Entrant(AI_EXPERT, move_time=0.01)
+
+    def test_play_game(self):
+        winner, num_moves = play_game(
+            [self.easy, self.medium], TEST_ROWS, TEST_COLUMNS, TEST_TO_WIN,
+            seed=0)
+        self.assertIn(winner, (0, 1, None))
+        self.assertGreaterEqual(num_moves, TEST_TO_WIN * 2 - 1)
+        self.assertLessEqual(num_moves, TEST_ROWS * TEST_COLUMNS)
+
+    def test_play_game_repeatable(self):
+        results = [play_game([self.easy, self.easy], seed=5)
+                   for i in range(2)]
+        self.assertEqual(results[0], results[1])
+
+    def test_play_game_leaves_global_state(self):
+        state = random.getstate()
+        num_stores = AI_TABLE.num_stores
+        play_game([self.expert, self.easy], TEST_ROWS, TEST_COLUMNS,
+                  TEST_TO_WIN, seed=2)
+        self.assertEqual(random.getstate(), state)
+        self.assertEqual(AI_TABLE.num_stores, num_stores)
+
+    def test_expert_beats_easy(self):
+        for entrants, expert_index in (([self.expert, self.easy], 0),
+                                       ([self.easy, self.expert], 1)):
+            winner, num_moves = play_game(
+                entrants, TEST_ROWS, TEST_COLUMNS, TEST_TO_WIN, seed=1)
+            self.assertEqual(winner, expert_index)
+
+    def test_schedule_alternates_first(self):
+        schedule = get_schedule([self.easy, self.medium, self.expert], 4)
+        self.assertEqual(len(schedule), 12)
+        pairs = schedule[:4]
+        self.assertEqual([pair[0] for pair in pairs],
+                         [self.easy, self.medium, self.easy, self.medium])
+
+    def test_run_tournament(self):
+        results = list(run_tournament(
+            [self.easy, self.medium], 6, num_rows=TEST_ROWS,
+            num_columns=TEST_COLUMNS, num_to_win=TEST_TO_WIN, seed=0))
+        self.assertEqual([r['game'] for r in results], list(range(6)))
+        for result in results:
+            self.assertIn(result['winner'],
+                          (self.easy.name, self.medium.name, None))
+
+    def test_run_tournament_workers(self):
+        entrants = [self.easy, self.medium]
+        in_process = list(run_tournament(entrants, 4, seed=3))
+        in_pool = list(run_tournament(entrants, 4, num_workers=2, seed=3))
+        in_pool.sort(key=lambda r: r['game'])
+
+        for expected, result in zip(in_process, in_pool):
+            self.assertEqual(expected['winner'], result['winner'])
+            self.assertEqual(expected['num_moves'], result['num_moves'])
+
+    def test_duplicate_names(self):
+        with self.assertRaises(ValueError):
+            list(run_tournament([self.easy, Entrant(AI_EASY)], 2))
+
+
+def create_result(game, first, second, winner):
+    return {'game': game, 'first': first, 'second': second,
+            'winner': winner, 'num_moves': 7, 'seconds': 0.001}
+
+
+class TestTournament_Results(unittest.TestCase):
+
+    def setUp(self):
+        self.standings = Standings(['a', 'b', 'c'])
+
+    def test_points(self):
+        self.standings.add_result(create_result(0, 'a', 'b', 'a'))
+        self.standings.add_result(create_result(1, 'b', 'a', None))
+        self.standings.add_result(create_result(2, 'a', 'c', 'c'))
+        self.assertEqual(self.standings.get_points('a'), 1.5)
+        self.assertEqual(self.standings.get_points('a', 'b'), 1.5)
+        self.assertEqual(self.standings.get_points('b'), 0.5)
+        self.assertEqual(self.standings.get_num_games('a'), 3)
+        self.assertEqual(self.standings.get_num_games('c', 'a'), 1)
+        self.assertEqual(self.standings.num_moves, 21)
+
+    def test_wilson_interval(self):
+        low, high = get_wilson_interval(50, 100)
+        self.assertAlmostEqual(low, 0.4038, places=3)
+        self.assertAlmostEqual(high, 0.5962, places=3)
+
+    def test_wilson_interval_extremes(self):
+        self.assertEqual(get_wilson_interval(0, 0), (0.0, 1.0))
+        low, high = get_wilson_interval(10, 10)
+        self.assertGreater(low, 0.6)
+        self.assertEqual(high, 1.0)
+
+    def test_elo_ordering(self):
+        for game in range(10):
+            self.standings.add_result(create_result(game, 'a', 'b', 'a'))
+            self.standings.add_result(create_result(game, 'b', 'c', 'b'))
+            self.standings.add_result(create_result(game, 'a', 'c', 'a'))
+
+        ratings = self.standings.get_elo_ratings()
+        self.assertGreater(ratings['a'], ratings['b'])
+        self.assertGreater(ratings['b'], ratings['c'])
+        self.assertAlmostEqual(sum(ratings.values()), 0, places=6)
+
+    def test_elo_even_match(self):
+        points = {('a', 'b'): 30, ('b', 'a'): 30}
+        games = {('a', 'b'): 60, ('b', 'a'): 60}
+        ratings = get_elo_ratings(['a', 'b'], points, games)
+        self.assertAlmostEqual(ratings['a'], 0, places=6)
+        self.assertAlmostEqual(ratings['b'], 0, places=6)
+
+    def test_elo_matches_expected_score(self):
+        # Scoring 75% (with the extra draw) is worth about 191 points
+        points = {('a', 'b'): 74.5, ('b', 'a'): 24.5}
+        games = {('a', 'b'): 99, ('b', 'a'): 99}
+        ratings = get_elo_ratings(['a', 'b'], points, games)
+        self.assertAlmostEqual(ratings['a'] - ratings['b'], 190.85, places=1)
+
+
+class TestTournament_ResultWriter(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.results = [create_result(0, 'a', 'b', 'a'),
+                        create_result(1, 'b', 'a', None)]
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_jsonl(self):
+        path = os.path.join(self.directory.name, 'results.jsonl')
+        with ResultWriter(path) as writer:
+            for result in self.results:
+                writer.write(result)
+
+        with open(path) as f:
+            self.assertEqual([json.loads(line) for line in f], self.results)
+
+    def test_csv(self):
+        path = os.path.join(self.directory.name, 'results.csv')
+        with ResultWriter(path) as writer:
+            for result in self.results:
+                writer.write(result)
+
+        with open(path, newline='') as f:
+            rows = list(csv.DictReader(f))
+
+        self.assertEqual([row['winner'] for row in rows], ['a', ''])
+        self.assertEqual(rows[1]['first'], 'b')
@@ -0,0 +1,124 @@
+import unittest
+
+from connectfour.ai.search import (
+    SEARCH_KEY_CACHE_SIZE, NegamaxSearch, _get_search_key,
+    _get_search_key_for)
+from connectfour.ai.transposition import Bound, TranspositionTable
+from connectfour.model import Board, Color
+
+NUM_BUCKETS = 8
+
+KEY = 12345
+OTHER_KEY = KEY + NUM_BUCKETS  # Same bucket as KEY
+THIRD_KEY = KEY + 2 * NUM_BUCKETS  # Same bucket as KEY
+
+
+class TestTranspositionTable_Basics(unittest.TestCase):
+
+    def setUp(self):
+        self.table = TranspositionTable(NUM_BUCKETS)
+
+    def test_miss(self):
+        self.assertIsNone(self.table.lookup(KEY))
+        self.assertEqual(self.table.num_misses, 1)
+
+    def test_hit(self):
+        self.table.store(KEY, 3, Bound.exact, 10, 2)
+        self.assertEqual(self.table.lookup(KEY), (KEY, 3, Bound.exact, 10, 2))
+        self.assertEqual(self.table.num_hits, 1)
+
+    def test_same_bucket_different_key(self):
+        self.table.store(KEY, 3, Bound.exact, 10, 2)
+        self.assertIsNone(self.table.lookup(OTHER_KEY))
+
+    def test_deeper_entry_kept(self):
+        self.table.store(KEY, 5, Bound.exact, 10, 2)
+        self.table.store(OTHER_KEY, 1, Bound.exact, 20, 3)
+        self.table.store(THIRD_KEY, 2, Bound.exact, 30, 4)
+
+        self.assertIsNotNone(self.table.lookup(KEY))
+        self.assertIsNone(self.table.lookup(OTHER_KEY))
+        self.assertIsNotNone(self.table.lookup(THIRD_KEY))
+
+    def test_deeper_entry_replaces(self):
+        self.table.store(KEY, 1, Bound.exact, 10, 2)
+        self.table.store(OTHER_KEY, 5, Bound.exact, 20, 3)
+        self.assertEqual(self.table.lookup(OTHER_KEY)[1], 5)
+        self.assertIsNone(self.table.lookup(KEY))
+        self.assertEqual(self.table.num_replacements, 1)
+
+    def test_same_key_updates(self):
+        self.table.store(KEY, 5, Bound.lower, 10, 2)
+        self.table.store(KEY, 1, Bound.exact, 20, 3)
+        self.assertEqual(self.table.lookup(KEY), (KEY, 1, Bound.exact, 20, 3))
+
+    def test_capacity(self):
+        for key in range(10 * NUM_BUCKETS):
+            self.table.store(key, key % 3, Bound.exact, 0, 0)
+        stats = self.table.get_stats()
+        self.assertEqual(stats['entries'], 2 * NUM_BUCKETS)
+        self.assertEqual(stats['capacity'], 2 * NUM_BUCKETS)
+
+    def test_clear(self):
+        self.table.store(KEY, 3, Bound.exact, 10, 2)
+        self.table.clear()
+        self.assertIsNone(self.table.lookup(KEY))
+        self.assertEqual(self.table.get_stats()['entries'], 0)
+
+
+class TestTranspositionTable_Search(unittest.TestCase):
+
+    def setUp(self):
+        self.board = Board(6, 7, 4)
+        for index, column in enumerate([3, 3, 2]):
+            self.board.add_color(Color(index % 2), column)
+
+    def _search(self, table):
+        search = NegamaxSearch(max_depth=6, max_nodes=10 ** 6, table=table)
+        result = search.search(self.board, Color.red, Color.black)
+        return result, search.num_nodes
+
+    def test_same_result_as_without_table(self):
+        without_table, _ = self._search(None)
+        with_table, _ = self._search(TranspositionTable())
+        self.assertEqual(without_table, with_table)
+
+    def test_fewer_nodes_with_table(self):
+        _, nodes_without_table = self._search(None)
+        _, nodes_with_table = self._search(TranspositionTable())
+        self.assertLess(nodes_with_table, nodes_without_table)
+
+    def test_repeat_search_hits(self):
+        table = TranspositionTable()
+        first, _ = self._search(table)
+        second, num_nodes = self._search(table)
+        self.assertEqual(first, second)
+        self.assertEqual(num_nodes, 0)
+        self.assertGreater(table.num_hits, 0)
+
+    def test_table_shared_across_board_sizes(self):
+        # Empty boards hash to 0 at every size
+        table = TranspositionTable()
+        NegamaxSearch(max_depth=2, table=table).search(
+            Board(20, 20, 4), Color.red, Color.black)
+
+        column, _ = NegamaxSearch(max_depth=2, table=table).search(
+            Board(6, 7, 4), Color.red, Color.black)
+        self.assertEqual(column, 3)
+
+    def test_entry_for_unplayable_column_ignored(self):
+        # As if another position's key collided with this one's
+        table = TranspositionTable()
+        key = self.board.get_hash() ^ _get_search_key(Color.red, self.board)
+        table.store(key, 10, Bound.exact, 0, 99)
+
+        column, _ = NegamaxSearch(max_depth=2, table=table).search(
+            self.board, Color.red, Color.black)
+        self.assertIn(column, range(self.board.num_columns))
+
+    def test_search_keys_cache_bounded(self):
+        for num_rows in range(1, SEARCH_KEY_CACHE_SIZE + 4):
+            _get_search_key(Color.red, Board(num_rows, 7, 4))
+
+        self.assertEqual(_get_search_key_for.cache_info().currsize,
+                         SEARCH_KEY_CACHE_SIZE)
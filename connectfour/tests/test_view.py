@@ -0,0 +1,23 @@
+import unittest
+
+try:
+    from connectfour.web import view
+except ImportError:
+    view = None
+
+
+@unittest.skipIf(view is None, 'flask_socketio not installed')
+class TestView(unittest.TestCase):
+
+    def test_join_outside_request(self):
+        # As when relaying a shard's join
+        view._join('a', 'ROOM')
+        self.assertIn('a', view.socketio.server.manager.get_participants(
+            '/', 'ROOM'))
+
+    def test_join_in_request(self):
+        with view.app.test_request_context('/'):
+            view._join('b', 'ROOM')
+
+        self.assertIn('b', view.socketio.server.manager.get_participants(
+            '/', 'ROOM'))
@@ -0,0 +1,436 @@
+"""Round-robin tournaments between AI players, without any view.
+
+Games are played on a ConnectFourModel whose pubsub has no subscribers, so
+publishing events costs next to nothing, and whose AI plays are made right
+away by a loop (rather than by a timer in a view's event loop). Games can be
+split across a process pool, and each result is yielded as soon as its game
+finishes.
+"""
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import csv
+import itertools
+import json
+import math
+import random
+import time
+
+from connectfour.ai.transposition import TranspositionTable
+from connectfour.model import (
+    AI_EASY, AI_MEDIUM, AI_HARD, AI_EXPERT, DEFAULT_AI_MOVE_TIME,
+    DEFAULT_ROWS, DEFAULT_COLUMNS, DEFAULT_TO_WIN, ConnectFourModel)
+from connectfour.pubsub import PubSub
+
+AI_DIFFICULTIES = (AI_EASY, AI_MEDIUM, AI_HARD, AI_EXPERT)
+
+# Fields of each game's result, in the order they are written to CSV
+RESULT_FIELDS = ('game', 'first', 'second', 'winner', 'num_moves', 'seconds')
+
+# z-score for 95% confidence intervals
+DEFAULT_Z = 1.96
+
+# Rounds of the iterative Elo fit. Ratings change by far less than a point
+# well before this.
+ELO_ITERATIONS = 1000
+
+
+class Entrant(object):
+    """An AI configuration taking part in a tournament."""
+
+    def __init__(self, difficulty, move_time=DEFAULT_AI_MOVE_TIME,
+                 name=None):
+        """Create an entrant.
+
+        Args:
+            difficulty (str): One of AI_DIFFICULTIES.
+            move_time (Optional[float]): Seconds this AI may spend deciding
+                on each play.
+            name (Optional[str]): Name to report results under. Must be
+                unique within a tournament. Defaults to the difficulty and
+                move time.
+        Raises:
+            ValueError: If difficulty is not known.
+        """
+        if difficulty not in AI_DIFFICULTIES:
+            raise ValueError('Unknown AI difficulty {}'.format(difficulty))
+
+        self.difficulty = difficulty
+        self.move_time = move_time
+        self.name = name or '{}:{:g}'.format(difficulty, move_time)
+
+    def __repr__(self):
+        return '{} name={} difficulty={} move_time={}'.format(
+            self.__class__.__name__, self.name, self.difficulty,
+            self.move_time)
+
+    @classmethod
+    def from_spec(cls, spec):
+        """Create an entrant from a string like 'expert' or 'expert:0.1'.
+
+        Args:
+            spec (str): A difficulty, optionally followed by a colon and
+                the move time in seconds.
+        Returns:
+            Entrant: The entrant.
+        Raises:
+            ValueError: If the difficulty or move time is not valid.
+        """
+        difficulty, _, move_time = spec.partition(':')
+
+        if not move_time:
+            return cls(difficulty)
+
+        try:
+            move_time = float(move_time)
+        except ValueError:
+            raise ValueError('Move time must be a number')
+
+        return cls(difficulty, move_time)
+
+
+def play_game(entrants, num_rows=DEFAULT_ROWS, num_columns=DEFAULT_COLUMNS,
+              num_to_win=DEFAULT_TO_WIN, seed=None):
+    """Play one game between AI players, without any view.
+
+    Args:
+        entrants (list): The Entrants, in playing order.
+        num_rows (Optional[int]): Number of rows in the board.
+        num_columns (Optional[int]): Number of columns in the board.
+        num_to_win (Optional[int]): Number in a row needed to win.
+        seed (Optional): Seed for the AIs' random choices.
+    Returns:
+        tuple: The index in entrants of the winner (or None for a draw),
+            and the number of plays made.
+    """
+    # Plays are queued here and made by the loop below, instead of each
+    # play making the next one (which would recurse once per play)
+    pending = []
+    model = ConnectFourModel(PubSub(), schedule_ai_play=pending.append,
+                             rng=random.Random(seed))
+
+    # Each entrant searches with its own table, so that one entrant's
+    # searches do not speed up (or otherwise change) another's
+    tables = [TranspositionTable() for entrant in entrants]
+
+    for entrant in entrants:
+        model._add_player(entrant.name, is_ai=True)
+        model.players[-1].difficulty = entrant.difficulty
+
+    model._create_board(num_rows, num_columns, num_to_win)
+    model._start_game()
+
+    while pending:
+        index = model.current_player_index
+        model.ai_move_time = entrants[index].move_time
+        model.ai_table = tables[index]
+        pending.pop()()
+
+    winners = [index for index, player in enumerate(model.players)
+               if player.num_wins]
+    winner = winners[0] if winners else None
+
+    return winner, model.board.get_num_moves()
+
+
+def get_schedule(entrants, games_per_pair):
+    """Get the games of a round-robin tournament.
+
+    Every pair of entrants plays games_per_pair games, taking turns going
+    first.
+
+    Args:
+        entrants (list): The Entrants.
+        games_per_pair (int): Number of games each pair plays.
+    Returns:
+        list: For each game, a 2-tuple of the Entrants in playing order.
+    """
+    schedule = []
+
+    for pair in itertools.combinations(entrants, 2):
+        for game in range(games_per_pair):
+            schedule.append(pair if game % 2 == 0 else pair[::-1])
+
+    return schedule
+
+
+def run_tournament(entrants, games_per_pair, num_workers=1,
+                   num_rows=DEFAULT_ROWS, num_columns=DEFAULT_COLUMNS,
+                   num_to_win=DEFAULT_TO_WIN, seed=None):
+    """Play a round-robin tournament, yielding each game's result.
+
+    Results are yielded in the order games finish, which (with more than
+    one worker) is not the order they were scheduled in.
+
+    Args:
+        entrants (list): The Entrants. Names must be unique.
+        games_per_pair (int): Number of games each pair plays.
+        num_workers (Optional[int]): Number of processes to play games in.
+            With 1, games are played in-process.
+        num_rows (Optional[int]): Number of rows in the board.
+        num_columns (Optional[int]): Number of columns in the board.
+        num_to_win (Optional[int]): Number in a row needed to win.
+        seed (Optional[int]): If given, game i is played with seed + i, so
+            that tournaments of random AIs can be repeated.
+    Yields:
+        dict: The result of a game, with keys RESULT_FIELDS. winner is the
+            winning entrant's name, or None for a draw.
+    Raises:
+        ValueError: If entrant names are not unique.
+    """
+    if len(set(e.name for e in entrants)) != len(entrants):
+        raise ValueError('Entrant names must be unique')
+
+    schedule = get_schedule(entrants, games_per_pair)
+    dimensions = (num_rows, num_columns, num_to_win)
+
+    def get_seed(index):
+        return None if seed is None else seed + index
+
+    if num_workers <= 1:
+        for index, pair in enumerate(schedule):
+            yield _play_scheduled_game(index, pair, dimensions,
+                                       get_seed(index))
+        return
+
+    with ProcessPoolExecutor(num_workers) as executor:
+        futures = [executor.submit(_play_scheduled_game, index, pair,
+                                   dimensions, get_seed(index))
+                   for index, pair in enumerate(schedule)]
+
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def _play_scheduled_game(index, pair, dimensions, seed):
+    """Play a game from a schedule. Returns its result dict."""
+    start = time.monotonic()
+    winner, num_moves = play_game(pair, *dimensions, seed=seed)
+
+    return {
+        'game': index,
+        'first': pair[0].name,
+        'second': pair[1].name,
+        'winner': None if winner is None else pair[winner].name,
+        'num_moves': num_moves,
+        'seconds': round(time.monotonic() - start, 6),
+    }
+
+
+###########
+# Results #
+###########
+
+class ResultWriter(object):
+    """Writes game results to a file as they come in.
+
+    Writes CSV if the path ends in '.csv', and JSON Lines otherwise. Each
+    result is flushed right away, so a tournament can be followed (or
+    salvaged) while it runs.
+    """
+
+    def __init__(self, path):
+        """Open a file to write results to.
+
+        Args:
+            path (str): Where to write results. Overwritten if it exists.
+        """
+        self.path = path
+        self.file = open(path, 'w', newline='')
+
+        if path.lower().endswith('.csv'):
+            self._csv = csv.DictWriter(self.file, RESULT_FIELDS)
+            self._csv.writeheader()
+        else:
+            self._csv = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def write(self, result):
+        """Write one game's result.
+
+        Args:
+            result (dict): A result yielded by run_tournament.
+        """
+        if self._csv:
+            self._csv.writerow(result)
+        else:
+            self.file.write(json.dumps(result) + '\n')
+
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class Standings(object):
+    """Running totals of a tournament's results."""
+
+    def __init__(self, names):
+        """Create empty standings.
+
+        Args:
+            names (list): The names of all entrants.
+        """
+        self.names = list(names)
+        self.num_games = 0
+        self.num_moves = 0
+
+        # Points (1 per win, 1/2 per draw) and games, keyed on
+        # (name, opponent name)
+        self._points = {}
+        self._games = {}
+
+    def add_result(self, result):
+        """Count one game's result.
+
+        Args:
+            result (dict): A result yielded by run_tournament.
+        """
+        first, second = result['first'], result['second']
+
+        if result['winner'] is None:
+            first_points = 0.5
+        else:
+            first_points = 1.0 if result['winner'] == first else 0.0
+
+        for name, opponent, points in ((first, second, first_points),
+                                       (second, first, 1 - first_points)):
+            key = (name, opponent)
+            self._points[key] = self._points.get(key, 0) + points
+            self._games[key] = self._games.get(key, 0) + 1
+
+        self.num_games += 1
+        self.num_moves += result['num_moves']
+
+    def get_points(self, name, opponent=None):
+        """Get the points an entrant scored, 1 per win and 1/2 per draw.
+
+        Args:
+            name (str): The entrant's name.
+            opponent (Optional[str]): If given, only count games against
+                this opponent.
+        Returns:
+            float: The points.
+        """
+        return self._sum(self._points, name, opponent)
+
+    def get_num_games(self, name, opponent=None):
+        """Get the number of games an entrant played.
+
+        Args:
+            name (str): The entrant's name.
+            opponent (Optional[str]): If given, only count games against
+                this opponent.
+        Returns:
+            int: The number of games.
+        """
+        return self._sum(self._games, name, opponent)
+
+    def get_score_interval(self, name, opponent=None, z=DEFAULT_Z):
+        """Get a confidence interval for an entrant's expected score.
+
+        Args:
+            name (str): The entrant's name.
+            opponent (Optional[str]): If given, only count games against
+                this opponent.
+            z (Optional[float]): z-score of the confidence level.
+        Returns:
+            tuple: The low and high ends of the interval, as fractions of
+                the points available.
+        """
+        return get_wilson_interval(self.get_points(name, opponent),
+                                   self.get_num_games(name, opponent), z)
+
+    def get_elo_ratings(self):
+        """Estimate Elo ratings from all results so far.
+
+        Returns:
+            dict: Each entrant's rating, keyed on name. Ratings average 0.
+        """
+        return get_elo_ratings(self.names, self._points, self._games)
+
+    def _sum(self, totals, name, opponent):
+        if opponent is not None:
+            return totals.get((name, opponent), 0)
+
+        return sum(totals.get((name, other), 0) for other in self.names)
+
+
+def get_wilson_interval(points, num_games, z=DEFAULT_Z):
+    """Get the Wilson score interval for a win rate.
+
+    Args:
+        points (float): Games won (draws can count as half).
+        num_games (int): Games played.
+        z (Optional[float]): z-score of the confidence level.
+    Returns:
+        tuple: The low and high ends of the interval, between 0 and 1.
+            (0, 1) if no games were played.
+    """
+    if not num_games:
+        return 0.0, 1.0
+
+    rate = points / num_games
+    denominator = 1 + z * z / num_games
+    center = (rate + z * z / (2 * num_games)) / denominator
+    margin = (z * math.sqrt(rate * (1 - rate) / num_games
+                            + z * z / (4 * num_games * num_games))
+              / denominator)
+
+    return max(0.0, center - margin), min(1.0, center + margin)
+
+
+def get_elo_ratings(names, points, games):
+    """Estimate Elo ratings from head-to-head results.
+
+    Fits a Bradley-Terry model (of which Elo is a rescaling) with the
+    minorization-maximization algorithm. Every pair that played is also
+    credited with one extra drawn game, so that entrants who won or lost
+    every game still get finite ratings.
+
+    Args:
+        names (list): The names of all entrants.
+        points (dict): Points (1 per win, 1/2 per draw) keyed on
+            (name, opponent name).
+        games (dict): Number of games keyed on (name, opponent name).
+    Returns:
+        dict: Each entrant's rating, keyed on name. Ratings average 0.
+    """
+    strengths = {name: 1.0 for name in names}
+
+    def get_points(name, opponent):
+        return points.get((name, opponent), 0) + 0.5
+
+    def get_games(name, opponent):
+        return games.get((name, opponent), 0) + 1
+
+    opponents = {name: [other for other in names
+                        if other != name and games.get((name, other))]
+                 for name in names}
+
+    for iteration in range(ELO_ITERATIONS):
+        new_strengths = {}
+
+        for name in names:
+            if not opponents[name]:
+                new_strengths[name] = strengths[name]
+                continue
+
+            total_points = sum(get_points(name, other)
+                               for other in opponents[name])
+            denominator = sum(get_games(name, other)
+                              / (strengths[name] + strengths[other])
+                              for other in opponents[name])
+            new_strengths[name] = total_points / denominator
+
+        # Normalize by the geometric mean, so that ratings average 0
+        log_mean = (sum(math.log(s) for s in new_strengths.values())
+                    / len(names))
+        strengths = {name: s / math.exp(log_mean)
+                     for name, s in new_strengths.items()}
+
+    return {name: 400 * math.log10(strengths[name]) for name in names}
@@ -0,0 +1,150 @@
+"""Saving rooms to SQLite, so that games survive a restart of the server.
+
+Checkpoints are incremental: only rooms that changed since the last
+checkpoint are saved, and rooms that were closed are deleted. Snapshots are
+taken in the caller's thread (since models are not thread-safe), but are
+encoded and written in a background thread, so that the event loop is not
+held up by the disk.
+
+Rooms are saved as one row each, with the room id and its snapshot (see
+RoomState.get_snapshot) as JSON.
+"""
+
+import json
+import logging
+import queue
+import sqlite3
+import threading
+
+# Seconds between checkpoints
+CHECKPOINT_INTERVAL = 5
+
+# Seconds to wait for another process (e.g. another shard) to finish writing
+SQLITE_TIMEOUT = 30
+
+logger = logging.getLogger(__name__)
+
+
+class Checkpointer(object):
+    """Save rooms' snapshots to an SQLite database, in a background thread.
+
+    Several processes may checkpoint to the same database, as long as no
+    room is in more than one of them.
+    """
+
+    def __init__(self, path):
+        """Open (or create) a database, and start the writing thread.
+
+        Args:
+            path (str): Path of the SQLite database file.
+        """
+        self.path = path
+
+        # To map room ids to RoomState.num_changes when last saved
+        self._saved = {}
+
+        # Batches of (room_to_snapshot, rooms to delete) to write, then None
+        # to stop
+        self._batches = queue.Queue()
+
+        with self._connect() as connection:
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS rooms '
+                '(room TEXT PRIMARY KEY, snapshot TEXT NOT NULL)')
+        connection.close()
+
+        self._thread = threading.Thread(target=self._write_batches,
+                                        daemon=True)
+        self._thread.start()
+
+    def __repr__(self):
+        return '{} path={} num_rooms={}'.format(
+            self.__class__.__name__, self.path, len(self._saved))
+
+    def load(self, is_mine=None):
+        """Get all saved snapshots.
+
+        Loaded rooms count as saved, so once restored (as RoomStates with
+        no changes yet), they are not saved again until they change.
+
+        Args:
+            is_mine (Optional[function]): Called with each room id. If
+                given, only rooms it returns True for are loaded (e.g. those
+                owned by a shard).
+        Returns:
+            dict: Keyed on room id, each a snapshot.
+        """
+        connection = self._connect()
+        try:
+            rows = connection.execute(
+                'SELECT room, snapshot FROM rooms').fetchall()
+        finally:
+            connection.close()
+
+        room_to_snapshot = {}
+
+        for room, snapshot in rows:
+            if is_mine is None or is_mine(room):
+                room_to_snapshot[room] = json.loads(snapshot)
+                self._saved[room] = 0
+
+        return room_to_snapshot
+
+    def checkpoint(self, room_to_state):
+        """Save rooms that changed since the last checkpoint (or since
+        loading), and delete rooms that have been closed.
+
+        Args:
+            room_to_state (dict): All open rooms, keyed on room id, each a
+                RoomState.
+        Returns:
+            int: The number of rooms saved or deleted.
+        """
+        saved = self._saved
+        room_to_snapshot = {}
+
+        for room, room_state in room_to_state.items():
+            if saved.get(room) != room_state.num_changes:
+                room_to_snapshot[room] = room_state.get_snapshot()
+                saved[room] = room_state.num_changes
+
+        closed_rooms = [room for room in saved if room not in room_to_state]
+        for room in closed_rooms:
+            del saved[room]
+
+        if room_to_snapshot or closed_rooms:
+            self._batches.put((room_to_snapshot, closed_rooms))
+
+        return len(room_to_snapshot) + len(closed_rooms)
+
+    def close(self):
+        """Wait for all checkpoints to be written, then stop the thread."""
+        self._batches.put(None)
+        self._thread.join()
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=SQLITE_TIMEOUT)
+
+    def _write_batches(self):
+        connection = self._connect()
+
+        while True:
+            batch = self._batches.get()
+            if batch is None:
+                break
+
+            room_to_snapshot, closed_rooms = batch
+
+            try:
+                with connection:
+                    connection.executemany(
+                        'INSERT OR REPLACE INTO rooms VALUES (?, ?)',
+                        [(room, json.dumps(snapshot, separators=(',', ':')))
+                         for room, snapshot in room_to_snapshot.items()])
+                    connection.executemany(
+                        'DELETE FROM rooms WHERE room = ?',
+                        [(room,) for room in closed_rooms])
+            except sqlite3.Error:
+                logger.exception('Error writing checkpoint to %s', self.path)
+
+        connection.close()
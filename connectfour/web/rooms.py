@@ -0,0 +1,770 @@
+"""Rooms of the web game, and the commands that clients send to them.
+
+Nothing here depends on Flask or Socket.IO: sending messages to clients,
+adding clients to rooms, and scheduling delayed work are done through
+functions passed in. That way rooms can be run in the server process, or in
+shard processes (see connectfour.web.sharding).
+"""
+
+import hmac
+import itertools
+import random
+import secrets
+import string
+import time
+from collections import OrderedDict, deque
+
+from connectfour.model import ConnectFourModel
+from connectfour.pubsub import ModelAction, ViewAction, PubSub
+
+ROOM_ID_LENGTH = 4
+
+# Version of the messages sent to clients. In version 3, each 'events'
+# message has the seq of its last event, counted per room. Clients that miss
+# events (or reconnect) send the last seq they saw, and are sent just the
+# events since, or the whole room if those are no longer kept. In version 4,
+# 'roomJoined' has a rejoinToken, which clients must send to take their
+# player back.
+PROTOCOL_VERSION = 4
+
+# Events kept per room, for clients that missed some
+EVENT_LOG_SIZE = 256
+
+# Random bytes in each player's rejoin token
+REJOIN_TOKEN_BYTES = 16
+
+# Length of ids that tell one room's event log apart from another's (e.g.
+# from before a restart), so that seqs from one are not used with the other
+LOG_ID_LENGTH = 8
+
+# Largest boards that clients may create (as in the CLI), since a board's
+# hash keys take time and memory in proportion to its size
+MAX_ROWS = 100
+MAX_COLUMNS = 100
+
+# Seconds that an AI player may spend deciding on each play, kept short so
+# that AI turns do not hold up the server
+AI_MOVE_TIME = 0.05
+
+# Number of processes that an AI player may split its search across
+AI_WORKERS = 1
+
+# Seconds to wait before an AI player plays, so that plays are visible
+AI_WAIT_TIME = 0.5
+
+# Seconds without a message from any of a room's clients before the room is
+# closed by RoomManager.sweep (e.g. if its clients crashed, or their
+# disconnects were lost)
+ROOM_TTL = 60 * 60
+
+# Most rooms to keep open at once. Opening another closes the room that has
+# gone longest without a message.
+MAX_ROOMS = 10000
+
+# Seconds between calls to RoomManager.sweep
+SWEEP_INTERVAL = 60
+
+# Seconds that a player whose client disconnected during a game (or whose
+# room was restored) is kept for the client to rejoin, before the player is
+# removed and the game goes on without it
+REJOIN_TIMEOUT = 60
+
+
+class RoomState(object):
+    """Room-specific state, including model and model event handlers."""
+
+    def __init__(self, room, emit, schedule, pubsub_stats=None,
+                 is_connected=None):
+        """Create a room.
+
+        Args:
+            room (str): The room id.
+            emit (function): Sends a message, called with the message name,
+                its data, and who to send it to (a room id, or a client's
+                session id).
+            schedule (function): Calls a function (the second argument)
+                after some seconds (the first argument), without blocking.
+            pubsub_stats (Optional[PubSubStats]): Where to collect
+                statistics about this room's pubsub, if anywhere.
+            is_connected (Optional[function]): Called with a player's pk,
+                returns whether its client is still connected. If given,
+                players whose clients are gone are removed when a game
+                ends.
+        """
+        self.room = room
+        self.emit = emit
+        self.schedule = schedule
+        self.is_connected = is_connected
+
+        # time.monotonic() of the last message from one of the room's
+        # clients
+        self.last_active = time.monotonic()
+
+        # Whether the room has been closed, after which AI plays already
+        # scheduled are skipped
+        self.closed = False
+
+        # Incremented whenever the model may have changed, so that
+        # checkpoints only need to save rooms that changed since the last
+        self.num_changes = 0
+
+        # Weak, so that a room's state is freed as soon as the room is
+        # deleted, rather than kept alive by its own subscriptions
+        self.pubsub = PubSub(weak=True)
+        if pubsub_stats is not None:
+            self.pubsub.enable_stats(pubsub_stats)
+
+        self.model = ConnectFourModel(
+            self.pubsub, ai_move_time=AI_MOVE_TIME, ai_workers=AI_WORKERS,
+            schedule_ai_play=self.schedule_ai_play)
+
+        # Events to send to the room, as [name, data] pairs. Events are
+        # collected while the pubsub queue is processed, then sent together
+        # in one 'events' message.
+        self.events = []
+
+        # The latest events, up to and including the one numbered seq, kept
+        # for clients that missed some
+        self.event_log = deque(maxlen=EVENT_LOG_SIZE)
+        self.seq = 0
+        self.log_id = _get_random_string(LOG_ID_LENGTH)
+
+        # To map players' pks to the secret tokens that their clients must
+        # send to take them back (see RoomManager.add_user). Unlike pks,
+        # tokens are only ever sent to the client they belong to.
+        self.rejoin_tokens = {}
+
+        self._create_subscriptions()
+
+    def __repr__(self):
+        return '{} room={} model={}'.format(
+            self.__class__.__name__, self.room, self.model)
+
+    def _create_subscriptions(self):
+        responses = {
+            ModelAction.board_created: self.on_board_created,
+            ModelAction.player_added: self.on_player_added,
+            ModelAction.player_removed: self.on_player_removed,
+            ModelAction.game_started: self.on_game_started,
+            ModelAction.next_player: self.on_next_player,
+            ModelAction.try_again: self.on_try_again,
+            ModelAction.color_played: self.on_color_played,
+            ModelAction.game_won: self.on_game_won,
+            ModelAction.game_draw: self.on_game_draw,
+            ModelAction.player_rejoined: self.on_player_rejoined,
+        }
+
+        for action, response in responses.items():
+            self.pubsub.subscribe(action, response)
+
+        self.pubsub.subscribe_drained(self.count_change)
+        self.pubsub.subscribe_drained(self.flush_events)
+
+    def count_change(self):
+        self.num_changes += 1
+
+    def add_event(self, name, data):
+        event = [name, data]
+        self.events.append(event)
+        self.event_log.append(event)
+        self.seq += 1
+
+    def flush_events(self):
+        """Send all collected events to the room, in one message."""
+        if not self.events:
+            return
+
+        self.emit('events', {
+            'events': self.events,
+            'seq': self.seq,
+        }, self.room)
+        self.events = []
+
+    def get_events_since(self, log_id, seq):
+        """Get the events a client missed, if they are still kept.
+
+        Args:
+            log_id (str): The log_id the client was sent.
+            seq (int): The seq of the last event the client saw.
+        Returns:
+            list: The events after seq, as [name, data] pairs, or None if
+                they are not all kept (or the client's seq is from another
+                log).
+        """
+        if log_id != self.log_id or not isinstance(seq, int):
+            return None
+
+        num_missed = self.seq - seq
+        if not 0 <= num_missed <= len(self.event_log):
+            return None
+
+        return list(itertools.islice(
+            self.event_log, len(self.event_log) - num_missed, None))
+
+    def issue_rejoin_token(self, pk):
+        """Make a new rejoin token for a player's client, replacing any
+        that it had.
+
+        Args:
+            pk (str): The player's pk.
+        Returns:
+            str: The token.
+        """
+        token = secrets.token_urlsafe(REJOIN_TOKEN_BYTES)
+        self.rejoin_tokens[pk] = token
+        return token
+
+    def check_rejoin_token(self, pk, token):
+        """Determine if a client sent a player's rejoin token.
+
+        Args:
+            pk (str): The player's pk.
+            token: What the client sent.
+        Returns:
+            bool: True if token is the player's.
+        """
+        expected = self.rejoin_tokens.get(pk)
+        if expected is None or not isinstance(token, str):
+            return False
+
+        return hmac.compare_digest(expected.encode(), token.encode())
+
+    def get_snapshot(self):
+        """Get the room's state to restore it from after a restart.
+
+        Returns:
+            dict: The model's snapshot (see ConnectFourModel.get_snapshot),
+                with the players' 'rejoinTokens'.
+        """
+        snapshot = self.model.get_snapshot()
+        snapshot['rejoinTokens'] = dict(self.rejoin_tokens)
+        return snapshot
+
+    def restore_snapshot(self, snapshot):
+        """Replace the room's state with a snapshot's.
+
+        Args:
+            snapshot (dict): As returned by get_snapshot.
+        """
+        self.model.restore_snapshot(snapshot)
+        self.rejoin_tokens = dict(snapshot.get('rejoinTokens', {}))
+
+    def get_json(self):
+        """Get everything a client needs to show the room, e.g. when it
+        joins, or missed too many events.
+
+        Returns:
+            dict: The players, board, whether a game is in progress and
+                whose turn it is, and the seq and log_id of the event log.
+        """
+        model = self.model
+        next_player = (model.get_current_player()
+                       if model.game_in_progress else None)
+
+        return {
+            'players': model.get_json_players(),
+            'board': model.get_json_board(),
+            'gameInProgress': model.game_in_progress,
+            'nextPlayer': next_player.get_json() if next_player else None,
+            'seq': self.seq,
+            'logId': self.log_id,
+        }
+
+    def schedule_ai_play(self, ai_play):
+        """Make an AI play after a delay, so that plays are visible."""
+        def do_ai_play():
+            if self.closed:
+                return
+
+            ai_play()
+            self.pubsub.do_queue()
+
+        self.schedule(AI_WAIT_TIME, do_ai_play)
+
+    def close(self):
+        """Tell the room's clients that the room is closed, and stop any
+        further AI plays."""
+        self.closed = True
+        self.emit('roomClosed', {
+            'room': self.room,
+        }, self.room)
+
+    def remove_disconnected_players(self):
+        """Remove players (other than AI players) whose clients are gone,
+        e.g. once the game they were kept for is over."""
+        if self.is_connected is None:
+            return
+
+        for player in list(self.model.players):
+            if player.pk is not None and not self.is_connected(player.pk):
+                self.pubsub.publish(ViewAction.remove_player, player=player)
+
+    def on_player_added(self, player):
+        self.add_event('playerAdded', {
+            'player': player.get_json(),
+        })
+
+    def on_player_removed(self, player):
+        self.rejoin_tokens.pop(player.pk, None)
+        self.add_event('playerRemoved', {
+            'player': player.get_json(),
+        })
+
+    def on_player_rejoined(self, player, old_pk):
+        self.rejoin_tokens.pop(old_pk, None)
+        self.add_event('playerRejoined', {
+            'player': player.get_json(),
+            'oldPk': old_pk,
+        })
+
+    def on_board_created(self, board):
+        # Clients create the empty grid themselves
+        self.add_event('boardCreated', {
+            'numRows': board.num_rows,
+            'numColumns': board.num_columns,
+            'numToWin': board.num_to_win,
+        })
+
+    def on_game_started(self):
+        self.add_event('gameStarted', {})
+
+    def on_next_player(self, player):
+        self.add_event('nextPlayer', {
+            'player': player.get_json(),
+        })
+
+    def on_try_again(self, player, reason):
+        self.add_event('tryAgain', {
+            'player': player.get_json(),
+            'reason': reason.name,
+        })
+
+    def on_color_played(self, color, position):
+        self.add_event('colorPlayed', {
+            'color': color.name,
+            'position': position,
+        })
+
+    def on_game_won(self, winner, winning_positions):
+        self.add_event('gameWon', {
+            'winner': winner.get_json(),
+            'players': self.model.get_json_players(),
+            'winningPositions': list(sorted(winning_positions)),
+        })
+        self.remove_disconnected_players()
+
+    def on_game_draw(self):
+        self.add_event('gameDraw', {
+            'players': self.model.get_json_players(),
+        })
+        self.remove_disconnected_players()
+
+
+class RoomManager(object):
+    """All rooms in one process, and the clients in them.
+
+    Clients' messages are passed to handle(), with the client's session id.
+    """
+
+    def __init__(self, emit, join, schedule, pubsub_stats=None,
+                 room_ttl=ROOM_TTL, max_rooms=MAX_ROOMS, owns_room=None):
+        """Create a manager with no rooms.
+
+        Args:
+            emit (function): Sends a message (see RoomState).
+            join (function): Adds a client to a room (so that messages
+                emitted to the room reach the client), called with the
+                client's session id and the room id.
+            schedule (function): Calls a function later (see RoomState).
+            pubsub_stats (Optional[PubSubStats]): Where to collect
+                statistics about all rooms' pubsubs, if anywhere.
+            room_ttl (Optional[float]): Seconds a room may go without a
+                message before sweep() closes it. None to never close idle
+                rooms.
+            max_rooms (Optional[int]): Most rooms to keep open. None for no
+                limit.
+            owns_room (Optional[function]): Called with a room id, returns
+                whether rooms with that id belong here (e.g. in a shard).
+                New room ids are chosen to satisfy it.
+        """
+        self.emit = emit
+        self.join = join
+        self.schedule = schedule
+        self.pubsub_stats = pubsub_stats
+        self.room_ttl = room_ttl
+        self.max_rooms = max_rooms
+        self.owns_room = owns_room
+
+        # To map client session ids to room ids
+        self.sid_to_room = {}
+
+        # To map room ids to RoomStates, least recently active first
+        self.room_to_state = OrderedDict()
+
+        # Rooms closed by sweep(), and to make room for others
+        self.num_idle_evictions = 0
+        self.num_capacity_evictions = 0
+
+        self._handlers = {
+            'addUser': self.add_user,
+            'disconnect': self.disconnect,
+            'createBoard': self.create_board,
+            'startGame': self.start_game,
+            'play': self.play,
+            'resync': self.resync,
+        }
+
+    def __repr__(self):
+        return '{} num_rooms={} num_clients={}'.format(
+            self.__class__.__name__, len(self.room_to_state),
+            len(self.sid_to_room))
+
+    def handle(self, command, sid, data):
+        """Handle a message from a client.
+
+        Args:
+            command (str): The message name, e.g. 'play'.
+            sid (str): The client's session id.
+            data (dict): The message data.
+        Raises:
+            ValueError: If command is not known.
+        """
+        if command not in self._handlers:
+            raise ValueError('Unknown command {}'.format(command))
+
+        room = self.sid_to_room.get(sid)
+        if room is not None:
+            self._touch(room)
+
+        self._handlers[command](sid, data)
+
+    def sweep(self, now=None):
+        """Close rooms that have gone longer than room_ttl without a
+        message.
+
+        Args:
+            now (Optional[float]): The current time.monotonic(), which
+                tests may pass to simulate time passing.
+        Returns:
+            int: The number of rooms closed.
+        """
+        if self.room_ttl is None:
+            return 0
+
+        if now is None:
+            now = time.monotonic()
+
+        num_closed = 0
+
+        # Rooms are in order of activity, so stop at the first active one
+        while self.room_to_state:
+            room, room_state = next(iter(self.room_to_state.items()))
+            if now - room_state.last_active <= self.room_ttl:
+                break
+
+            self._close_room(room)
+            num_closed += 1
+
+        self.num_idle_evictions += num_closed
+        return num_closed
+
+    def restore(self, room_to_snapshot):
+        """Open rooms from snapshots, e.g. after a restart.
+
+        The rooms have no clients until they rejoin (see add_user), and
+        players that are not rejoined within REJOIN_TIMEOUT are removed.
+
+        Args:
+            room_to_snapshot (dict): Keyed on room id, each a snapshot from
+                RoomState.get_snapshot.
+        """
+        for room, snapshot in room_to_snapshot.items():
+            room_state = self._create_room(room)
+            room_state.restore_snapshot(snapshot)
+
+            for player in room_state.model.players:
+                if player.pk is not None:
+                    self._remove_unless_rejoined(room_state, player)
+
+    def get_metrics(self):
+        """Get counts of rooms and clients.
+
+        Returns:
+            dict: With 'rooms' (open now), 'clients' (in open rooms),
+                'idle_evictions' and 'capacity_evictions' (rooms closed by
+                sweep() and to make room for others, since starting).
+        """
+        return {
+            'rooms': len(self.room_to_state),
+            'clients': len(self.sid_to_room),
+            'idle_evictions': self.num_idle_evictions,
+            'capacity_evictions': self.num_capacity_evictions,
+        }
+
+    def add_user(self, sid, data):
+        """Add a client as a player, in a new room or an existing one.
+
+        data has the player's 'username', and optionally the 'room' to join.
+        If 'createRoom' is also true, the room is created with that id
+        rather than joined; otherwise, without a 'room', a room is created
+        with a new id.
+
+        Each client is sent a secret 'rejoinToken' in 'roomJoined'. A client
+        that lost its connection (or whose room was restored after a
+        restart) can take its player back by also sending the player's old
+        'pk' and the 'rejoinToken' it was last sent. Otherwise it is added as
+        a new player. The token is trusted even while the old pk's client
+        still seems connected, since a dropped connection is often only
+        noticed (and disconnected) after the client is back. If it also
+        sends the 'logId' and 'lastSeq' it saw, it is sent only the events
+        it missed (if still kept), rather than the whole room.
+        """
+        name = data['username']
+        room = data.get('room')
+        old_pk = data.get('pk')
+
+        # A room to create may already exist (e.g. restored, but not yet
+        # rejoined), in which case it gets another id
+        if room is None or (data.get('createRoom') and
+                            room in self.room_to_state):
+            room = get_new_room_id(self.room_to_state, self.owns_room)
+            self._create_room(room)
+
+        elif data.get('createRoom'):
+            self._create_room(room)
+
+        elif room not in self.room_to_state:
+            self.emit('roomDoesNotExist', {
+                'room': room,
+            }, sid)
+            return
+
+        room_state = self.room_to_state[room]
+        model = room_state.model
+
+        player = None
+        if (old_pk is not None and
+                room_state.check_rejoin_token(old_pk,
+                                              data.get('rejoinToken'))):
+            player = model.get_player_by_pk(old_pk)
+
+        # Forget the old client, so that its disconnect (whenever it comes)
+        # leaves the player alone
+        if player is not None and self.sid_to_room.get(old_pk) == room:
+            del self.sid_to_room[old_pk]
+
+        # Before joining, since the rejoining client is sent the same news
+        # along with the rest of what it missed
+        missed_events = None
+        if player is not None:
+            room_state.pubsub.publish(
+                ViewAction.rejoin_player, trigger_queue=True, player=player,
+                pk=sid)
+            missed_events = room_state.get_events_since(
+                data.get('logId'), data.get('lastSeq'))
+
+        self.join(sid, room)
+        self.sid_to_room[sid] = room
+        self._touch(room)
+
+        # Only sent to this client, unlike the pk
+        room_joined = {
+            'protocol': PROTOCOL_VERSION,
+            'pk': sid,
+            'room': room,
+            'rejoinToken': room_state.issue_rejoin_token(sid),
+        }
+
+        if missed_events is None:
+            room_joined.update(room_state.get_json())
+
+        self.emit('roomJoined', room_joined, sid)
+
+        if missed_events is not None:
+            self._send_missed_events(sid, room_state, missed_events)
+
+        if player is None:
+            room_state.pubsub.publish(
+                ViewAction.add_player, trigger_queue=True, name=name, pk=sid)
+
+    def disconnect(self, sid, data=None):
+        """Remove a client's player, and its room if it was the last.
+
+        During a game, the player is kept instead, so that the client can
+        take it back when it reconnects (see add_user). It is removed if the
+        client does not rejoin within REJOIN_TIMEOUT, or once the game is
+        over.
+        """
+        room = self.sid_to_room.pop(sid, None)
+        room_state = self.room_to_state.get(room)
+        if room_state is None:
+            return
+
+        model = room_state.model
+        player = model.get_player_by_pk(sid)
+
+        if player is None:
+            # A client that joined without becoming a player
+            room_state.rejoin_tokens.pop(sid, None)
+        elif model.game_in_progress:
+            self._remove_unless_rejoined(room_state, player)
+        else:
+            room_state.pubsub.publish(
+                ViewAction.remove_player, trigger_queue=True, player=player)
+
+        if not model.players:
+            self._close_room(room)
+
+    def create_board(self, sid, data):
+        """Create a board in a client's room.
+
+        Raises:
+            ValueError: If the board would have more than MAX_ROWS rows or
+                MAX_COLUMNS columns.
+        """
+        room_state = self._get_room_state(sid)
+        if room_state is None:
+            return
+
+        num_rows = int(data['numRows'])
+        num_columns = int(data['numColumns'])
+        if num_rows > MAX_ROWS or num_columns > MAX_COLUMNS:
+            raise ValueError('Board must be at most {}x{}'.format(
+                MAX_ROWS, MAX_COLUMNS))
+
+        room_state.pubsub.publish(
+            ViewAction.create_board, trigger_queue=True,
+            num_rows=num_rows, num_columns=num_columns,
+            num_to_win=int(data['numToWin']))
+
+    def start_game(self, sid, data):
+        # TODO: add error checking
+        room_state = self._get_room_state(sid)
+        if room_state is None:
+            return
+
+        room_state.pubsub.publish(ViewAction.start_game, trigger_queue=True)
+
+    def play(self, sid, data):
+        room_state = self._get_room_state(sid)
+        if room_state is None:
+            return
+
+        model = room_state.model
+
+        # Ignore plays from anyone but the current player
+        if (not model.game_in_progress or
+                model.get_player_by_pk(sid) is not model.get_current_player()):
+            return
+
+        room_state.pubsub.publish(ViewAction.play, trigger_queue=True,
+                                  column=int(data['column']))
+
+    def resync(self, sid, data):
+        """Send a client that missed events the events since the 'lastSeq'
+        it saw (with the 'logId' it was sent), or the whole room if those
+        are no longer kept."""
+        room_state = self._get_room_state(sid)
+        if room_state is None:
+            return
+
+        missed_events = room_state.get_events_since(
+            data.get('logId'), data.get('lastSeq'))
+
+        if missed_events is None:
+            self.emit('roomSnapshot', room_state.get_json(), sid)
+        else:
+            self._send_missed_events(sid, room_state, missed_events)
+
+    def _send_missed_events(self, sid, room_state, events):
+        self.emit('events', {
+            'events': events,
+            'seq': room_state.seq,
+        }, sid)
+
+    def _touch(self, room):
+        """Mark a room as just active."""
+        room_state = self.room_to_state.get(room)
+        if room_state is not None:
+            room_state.last_active = time.monotonic()
+            self.room_to_state.move_to_end(room)
+
+    def _remove_unless_rejoined(self, room_state, player):
+        """Remove a player without a client after REJOIN_TIMEOUT, unless a
+        client has taken it back by then."""
+        pk = player.pk
+
+        def remove():
+            # Rejoining gives the player a new pk
+            if (self.room_to_state.get(room_state.room) is not room_state or
+                    room_state.model.get_player_by_pk(pk) is not player or
+                    pk in self.sid_to_room):
+                return
+
+            room_state.pubsub.publish(
+                ViewAction.remove_player, trigger_queue=True, player=player)
+
+            if not room_state.model.players:
+                self._close_room(room_state.room)
+
+        self.schedule(REJOIN_TIMEOUT, remove)
+
+    def _close_room(self, room):
+        """Close a room, forgetting it and its clients."""
+        room_state = self.room_to_state.pop(room)
+        room_state.close()
+
+        for player in room_state.model.players:
+            if self.sid_to_room.get(player.pk) == room:
+                del self.sid_to_room[player.pk]
+
+    def _get_room_state(self, sid):
+        room = self.sid_to_room.get(sid)
+        if room is None:
+            return None
+
+        room_state = self.room_to_state.get(room)
+
+        # The room was closed without forgetting this client (e.g. one that
+        # joined but could not be added as a player)
+        if room_state is None:
+            del self.sid_to_room[sid]
+
+        return room_state
+
+    def _create_room(self, room):
+        if (self.max_rooms is not None and
+                len(self.room_to_state) >= self.max_rooms):
+            self._close_room(next(iter(self.room_to_state)))
+            self.num_capacity_evictions += 1
+
+        room_state = self.room_to_state[room] = RoomState(
+            room, self.emit, self.schedule, pubsub_stats=self.pubsub_stats,
+            is_connected=self.sid_to_room.__contains__)
+        return room_state
+
+
+def get_new_room_id(taken, is_allowed=None):
+    """Get a random room id.
+
+    Args:
+        taken: Room ids that are already in use (any container).
+        is_allowed (Optional[function]): Called with a room id, returns
+            whether it may be used.
+    Returns:
+        str: A room id not in taken.
+    """
+    while True:
+        room = _get_random_string(ROOM_ID_LENGTH)
+
+        if room not in taken and (is_allowed is None or is_allowed(room)):
+            return room
+
+
+###########
+# Helpers #
+###########
+
+def _get_random_string(length):
+    return ''.join(random.choice(string.ascii_uppercase)
+                   for _ in range(length))
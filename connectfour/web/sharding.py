@@ -0,0 +1,322 @@
+"""Running rooms in several processes, so the server can use several cores.
+
+Each shard is a process with its own RoomManager, owning the rooms whose ids
+hash to it (see ConsistentHashRing). The server's process only routes
+clients' messages to shards, and relays what shards send back to clients.
+
+Messages go through multiprocessing queues, so no outside services are
+needed. Each shard has an inbox of (command, sid, data) messages, and all
+shards share one outbox of:
+
+    ('emit', event, data, to): Send a message to a room or client.
+    ('join', sid, room): Add a client to a room.
+    ('metrics', shard, metrics): The shard's RoomManager.get_metrics(),
+        sent after each sweep for idle rooms.
+"""
+
+import bisect
+import hashlib
+import heapq
+import itertools
+import logging
+import multiprocessing
+import queue
+import time
+
+from connectfour.web.checkpoints import CHECKPOINT_INTERVAL, Checkpointer
+from connectfour.web.rooms import (
+    MAX_ROOMS, ROOM_TTL, SWEEP_INTERVAL, RoomManager, get_new_room_id)
+
+# Points on the ring per shard. More points spread rooms more evenly.
+DEFAULT_REPLICAS = 100
+
+logger = logging.getLogger(__name__)
+
+
+class ConsistentHashRing(object):
+    """Map room ids to shards, by consistent hashing.
+
+    Each shard is hashed to many points on a ring, and a room belongs to the
+    shard at the first point at or after the room's own hash. Adding a shard
+    only moves the rooms between its points and the points before them,
+    rather than nearly every room as with hash(room) % num_shards.
+    """
+
+    def __init__(self, num_shards, replicas=DEFAULT_REPLICAS):
+        """Create a ring.
+
+        Args:
+            num_shards (int): Number of shards, numbered from 0.
+            replicas (Optional[int]): Points on the ring per shard.
+        Raises:
+            ValueError: If num_shards or replicas is not positive.
+        """
+        if num_shards < 1:
+            raise ValueError('Need at least one shard')
+
+        if replicas < 1:
+            raise ValueError('Need at least one point per shard')
+
+        self.num_shards = num_shards
+        self.replicas = replicas
+
+        points = sorted(
+            (_get_hash('{}:{}'.format(shard, replica)), shard)
+            for shard in range(num_shards)
+            for replica in range(replicas))
+
+        self._hashes = [point[0] for point in points]
+        self._shards = [point[1] for point in points]
+
+    def __repr__(self):
+        return '{} num_shards={}'.format(
+            self.__class__.__name__, self.num_shards)
+
+    def get_shard(self, room):
+        """Get the shard that owns a room.
+
+        Args:
+            room (str): The room id.
+        Returns:
+            int: The shard number.
+        """
+        index = bisect.bisect_left(self._hashes, _get_hash(room))
+        return self._shards[index % len(self._shards)]
+
+
+class ShardRouter(object):
+    """Route clients' messages to shard processes, and relay their replies.
+
+    Has the same handle() as RoomManager, so a view can use either.
+    """
+
+    def __init__(self, num_shards, emit, join, replicas=DEFAULT_REPLICAS,
+                 room_ttl=ROOM_TTL, max_rooms=MAX_ROOMS,
+                 checkpoint_path=None):
+        """Create a router. Shards are not started until start() is called.
+
+        Args:
+            num_shards (int): Number of shard processes.
+            emit (function): Sends a message (see RoomState), called from
+                poll().
+            join (function): Adds a client to a room (see RoomManager),
+                called from poll().
+            replicas (Optional[int]): Points on the hash ring per shard.
+            room_ttl (Optional[float]): Seconds a room may go without a
+                message before its shard closes it (see RoomManager).
+            max_rooms (Optional[int]): Most rooms to keep open in each
+                shard (see RoomManager).
+            checkpoint_path (Optional[str]): SQLite database that shards
+                restore their rooms from when started, and checkpoint them
+                to (see Checkpointer). None to not checkpoint.
+        """
+        self.emit = emit
+        self.join = join
+        self.ring = ConsistentHashRing(num_shards, replicas=replicas)
+
+        # Spawned rather than forked, so that shards do not inherit the
+        # server's sockets or its event loop
+        context = multiprocessing.get_context('spawn')
+        self.inboxes = [context.Queue() for _ in range(num_shards)]
+        self.outbox = context.Queue()
+        self.processes = [
+            context.Process(
+                target=run_shard, daemon=True,
+                args=(shard, inbox, self.outbox, room_ttl, max_rooms,
+                      self.ring, checkpoint_path))
+            for shard, inbox in enumerate(self.inboxes)]
+
+        # To map client session ids to the room ids they asked to join
+        self.sid_to_room = {}
+
+        # The latest metrics sent by each shard
+        self.shard_metrics = [{} for _ in range(num_shards)]
+
+    def __repr__(self):
+        return '{} num_shards={} num_clients={}'.format(
+            self.__class__.__name__, self.ring.num_shards,
+            len(self.sid_to_room))
+
+    def start(self):
+        for process in self.processes:
+            process.start()
+
+    def stop(self):
+        """Stop all shards, waiting for them to finish their messages (and
+        last checkpoints)."""
+        for inbox in self.inboxes:
+            inbox.put(None)
+
+        for process in self.processes:
+            process.join()
+
+    def handle(self, command, sid, data):
+        """Send a client's message to the shard that owns its room.
+
+        Messages from a client that is not in a room (other than to join
+        one) are dropped.
+
+        Args:
+            command (str): The message name, e.g. 'play'.
+            sid (str): The client's session id.
+            data (dict): The message data.
+        """
+        if command == 'addUser':
+            data = dict(data)
+
+            # Room ids are chosen here rather than by shards, since the
+            # room's id decides its shard
+            if data.get('room') is None:
+                data['room'] = get_new_room_id(
+                    set(self.sid_to_room.values()))
+                data['createRoom'] = True
+
+            room = self.sid_to_room[sid] = data['room']
+
+        elif command == 'disconnect':
+            room = self.sid_to_room.pop(sid, None)
+
+        else:
+            room = self.sid_to_room.get(sid)
+
+        if room is None:
+            return
+
+        self.inboxes[self.ring.get_shard(room)].put((command, sid, data))
+
+    def get_metrics(self):
+        """Get counts of rooms and clients, summed across shards.
+
+        Returns:
+            dict: As RoomManager.get_metrics, as of each shard's last sweep.
+        """
+        metrics = {}
+
+        for shard_metrics in self.shard_metrics:
+            for key, value in shard_metrics.items():
+                metrics[key] = metrics.get(key, 0) + value
+
+        return metrics
+
+    def poll(self):
+        """Relay all messages that shards have sent so far, without waiting.
+
+        Returns:
+            int: The number of messages relayed.
+        """
+        num_messages = 0
+
+        while True:
+            try:
+                message = self.outbox.get_nowait()
+            except queue.Empty:
+                return num_messages
+
+            if message[0] == 'emit':
+                self.emit(*message[1:])
+            elif message[0] == 'join':
+                self.join(*message[1:])
+            elif message[0] == 'metrics':
+                self.shard_metrics[message[1]] = message[2]
+
+            num_messages += 1
+
+
+def run_shard(shard, inbox, outbox, room_ttl=ROOM_TTL, max_rooms=MAX_ROOMS,
+              ring=None, checkpoint_path=None):
+    """Handle messages for a shard's rooms until a None message arrives.
+
+    Every SWEEP_INTERVAL seconds, closes idle rooms and sends metrics. With
+    a checkpoint_path, restores the shard's rooms when started, checkpoints
+    them every CHECKPOINT_INTERVAL seconds, and once more when stopped.
+
+    Args:
+        shard (int): The shard number.
+        inbox (Queue): Where (command, sid, data) messages arrive.
+        outbox (Queue): Where to send 'emit', 'join', and 'metrics'
+            messages.
+        room_ttl (Optional[float]): See RoomManager.
+        max_rooms (Optional[int]): See RoomManager.
+        ring (Optional[ConsistentHashRing]): Which rooms belong to which
+            shard. None if this is the only shard.
+        checkpoint_path (Optional[str]): See ShardRouter.
+    """
+    # Heap of (time, count, function), with count breaking ties so that
+    # functions are never compared
+    timers = []
+    counter = itertools.count()
+
+    def emit(event, data, to):
+        outbox.put(('emit', event, data, to))
+
+    def join(sid, room):
+        outbox.put(('join', sid, room))
+
+    def schedule(delay, function):
+        heapq.heappush(
+            timers, (time.monotonic() + delay, next(counter), function))
+
+    def owns_room(room):
+        return ring is None or ring.get_shard(room) == shard
+
+    rooms = RoomManager(emit, join, schedule, room_ttl=room_ttl,
+                        max_rooms=max_rooms, owns_room=owns_room)
+
+    def sweep():
+        rooms.sweep()
+        outbox.put(('metrics', shard, rooms.get_metrics()))
+        schedule(SWEEP_INTERVAL, sweep)
+
+    schedule(SWEEP_INTERVAL, sweep)
+
+    checkpointer = None
+    if checkpoint_path is not None:
+        checkpointer = Checkpointer(checkpoint_path)
+        rooms.restore(checkpointer.load(owns_room))
+
+        def checkpoint():
+            checkpointer.checkpoint(rooms.room_to_state)
+            schedule(CHECKPOINT_INTERVAL, checkpoint)
+
+        schedule(CHECKPOINT_INTERVAL, checkpoint)
+
+    while True:
+        timeout = None
+        if timers:
+            timeout = max(0, timers[0][0] - time.monotonic())
+
+        try:
+            message = inbox.get(timeout=timeout)
+        except queue.Empty:
+            pass
+        else:
+            if message is None:
+                break
+
+            _call_logged(rooms.handle, *message)
+
+        while timers and timers[0][0] <= time.monotonic():
+            _call_logged(heapq.heappop(timers)[2])
+
+    if checkpointer is not None:
+        checkpointer.checkpoint(rooms.room_to_state)
+        checkpointer.close()
+
+
+###########
+# Helpers #
+###########
+
+def _get_hash(key):
+    """Hash a string the same way in every process (unlike hash())."""
+    digest = hashlib.md5(key.encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'big')
+
+
+def _call_logged(function, *args):
+    """Call a function, logging rather than raising any exception, so that
+    one bad message does not stop a shard."""
+    try:
+        function(*args)
+    except Exception:
+        logger.exception('Error in shard calling %s%s', function, args)
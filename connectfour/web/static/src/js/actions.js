@@ -11,6 +11,7 @@ export const ADD_PLAYER = 'ADD_PLAYER';
 export const REMOVE_PLAYER = 'REMOVE_PLAYER';
 export const SET_NEXT_PLAYER = 'SET_NEXT_PLAYER';
 
+export const CREATE_BOARD = 'CREATE_BOARD';
 export const UPDATE_BOARD = 'UPDATE_BOARD';
 export const RESET_BOARD = 'RESET_BOARD';
 export const COLOR_SQUARE = 'COLOR_SQUARE';
@@ -76,6 +77,15 @@ export function setNextPlayer(player) {
   }
 }
 
+export function createBoard(numRows, numColumns, numToWin) {
+  return {
+    type: CREATE_BOARD,
+    numRows,
+    numColumns,
+    numToWin,
+  }
+}
+
 export function updateBoard(board) {
   return {
     type: UPDATE_BOARD,
@@ -8,10 +8,11 @@ import App from './components/App';
 import appReducer from './reducers';
 import {
   setIDs, setRoomDoesNotExist, updatePlayers, updatePlayer, addPlayer,
-  removePlayer, setNextPlayer, updateBoard, resetBoard, colorSquare,
-  blinkSquares, unblinkSquares, startGame, stopGame, reportDraw,
+  removePlayer, setNextPlayer, createBoard, updateBoard, resetBoard,
+  colorSquare, blinkSquares, unblinkSquares, startGame, stopGame, reportDraw,
   reportTryAgain,
 } from './actions';
+import { emitAddUser, emitResync } from './emitters';
 
 // This is where webpack compiles my sass to css
 import '../stylesheets/styles';
@@ -43,61 +44,149 @@ ReactDOM.render(
 // Respond to WebSocket events (these mostly update the store) //
 /////////////////////////////////////////////////////////////////
 
-window.ws.on('roomJoined', (data) => {
-  store.dispatch(setIDs(data.pk, data.room));
+// The room's event log, and the seq of the last event received from it, so
+// that only missed events need to be sent after losing the connection
+let logId = null;
+let lastSeq = 0;
+
+// The secret that the server requires to take our player back, which (unlike
+// our pk) only we are sent
+let rejoinToken = null;
+
+// Whether missed events have been requested, so that events arriving before
+// them do not each request them again
+let resyncing = false;
+
+// Show the whole room, sent when joining or after missing too many events
+function showRoom(data) {
+  logId = data.logId;
+  lastSeq = data.seq;
+  resyncing = false;
 
   if (data.board) {
     store.dispatch(updateBoard(data.board));
   }
 
-  if (data.players) {
-    store.dispatch(updatePlayers(data.players));
-  }
-});
-
-window.ws.on('roomDoesNotExist', () => {
-  store.dispatch(setRoomDoesNotExist())
-});
-
-window.ws.on('playerAdded', ({ player }) => {
-  store.dispatch(addPlayer(player))
-});
+  store.dispatch(updatePlayers(data.players));
 
-window.ws.on('playerRemoved', ({ player }) => {
-  store.dispatch(removePlayer(player))
+  if (data.gameInProgress) {
+    store.dispatch(startGame());
+    store.dispatch(setNextPlayer(data.nextPlayer));
+  } else {
+    store.dispatch(stopGame());
+  }
+}
+
+// After losing the connection (e.g. while the server restarts), take our
+// player back
+window.ws.on('connect', () => {
+  const { pk, room, players } = store.getState();
+  const player = players.find(p => p.pk === pk);
+
+  if (room && player) {
+    emitAddUser({
+      username: player.name, room, pk, rejoinToken, logId, lastSeq,
+    });
+  }
 });
 
-window.ws.on('nextPlayer', ({ player }) => {
-  store.dispatch(setNextPlayer(player))
-});
+window.ws.on('roomJoined', (data) => {
+  store.dispatch(setIDs(data.pk, data.room));
+  rejoinToken = data.rejoinToken;
 
-window.ws.on('boardCreated', ({ board }) => {
-  store.dispatch(unblinkSquares());
-  store.dispatch(updateBoard(board));
+  // Without the room, missed events follow instead
+  if (data.players) {
+    showRoom(data);
+  }
 });
 
-window.ws.on('colorPlayed', ({ color, position }) => {
-  store.dispatch(colorSquare(color, position));
+window.ws.on('roomDoesNotExist', () => {
+  store.dispatch(setRoomDoesNotExist())
 });
 
-window.ws.on('gameStarted', () => {
-  store.dispatch(unblinkSquares());
-  store.dispatch(resetBoard());
-  store.dispatch(startGame());
+// The server closed the room (e.g. after it sat idle), so start over
+window.ws.on('roomClosed', () => {
+  location.reload();
 });
 
-window.ws.on('gameWon', ({ winner, winningPositions, players }) => {
-  store.dispatch(stopGame());
-  store.dispatch(blinkSquares(winningPositions));
-  store.dispatch(updatePlayers(players));
-});
+window.ws.on('roomSnapshot', showRoom);
+
+// Handlers for events about the game, keyed on event name
+const gameEventHandlers = {
+  playerAdded: ({ player }) => {
+    store.dispatch(addPlayer(player))
+  },
+
+  playerRemoved: ({ player }) => {
+    store.dispatch(removePlayer(player))
+  },
+
+  playerRejoined: ({ player, oldPk }) => {
+    const { players, nextPlayer } = store.getState();
+    store.dispatch(updatePlayers(players.map(p =>
+      (p.pk === oldPk) ? player : p)));
+
+    if (nextPlayer && nextPlayer.pk === oldPk) {
+      store.dispatch(setNextPlayer(player));
+    }
+  },
+
+  nextPlayer: ({ player }) => {
+    store.dispatch(setNextPlayer(player))
+  },
+
+  boardCreated: ({ numRows, numColumns, numToWin }) => {
+    store.dispatch(unblinkSquares());
+    store.dispatch(createBoard(numRows, numColumns, numToWin));
+  },
+
+  colorPlayed: ({ color, position }) => {
+    store.dispatch(colorSquare(color, position));
+  },
+
+  gameStarted: () => {
+    store.dispatch(unblinkSquares());
+    store.dispatch(resetBoard());
+    store.dispatch(startGame());
+  },
+
+  gameWon: ({ winner, winningPositions, players }) => {
+    store.dispatch(stopGame());
+    store.dispatch(blinkSquares(winningPositions));
+    store.dispatch(updatePlayers(players));
+  },
+
+  gameDraw: ({ players }) => {
+    store.dispatch(stopGame());
+    store.dispatch(updatePlayers(players));
+    store.dispatch(reportDraw());
+  },
+
+  tryAgain: ({ player, reason }) => {
+    store.dispatch(reportTryAgain(player, reason));
+  },
+};
+
+// Events that happen together (e.g. a color being played, then the next
+// player's turn) arrive batched in a single 'events' message, as a list of
+// [name, data] pairs, with the seq of the last of them
+window.ws.on('events', ({ events, seq }) => {
+  const firstSeq = seq - events.length + 1;
+
+  // Events were missed, so ask for them (or the whole room) instead
+  if (firstSeq > lastSeq + 1) {
+    if (!resyncing) {
+      resyncing = true;
+      emitResync({ logId, lastSeq });
+    }
+    return;
+  }
 
-window.ws.on('gameDraw', ({ players }) => {
-  store.dispatch(stopGame());
-  store.dispatch(updatePlayers(players));
-  store.dispatch(reportDraw());
-});
+  // Skip events already received (e.g. replayed while also sent live)
+  events.slice(lastSeq + 1 - firstSeq).forEach(([name, data]) => {
+    gameEventHandlers[name](data);
+  });
 
-window.ws.on('tryAgain', ({ player, reason }) => {
-  store.dispatch(reportTryAgain(player, reason));
+  lastSeq = Math.max(lastSeq, seq);
+  resyncing = false;
 });
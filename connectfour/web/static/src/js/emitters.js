@@ -13,3 +13,7 @@ export function emitStartGame(data) {
 export function emitPlay(data) {
   window.ws.emit('play', data);
 }
+
+export function emitResync(data) {
+  window.ws.emit('resync', data);
+}
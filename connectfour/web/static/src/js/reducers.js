@@ -1,7 +1,7 @@
 import {
   SET_IDS, SET_ROOM_DOES_NOT_EXIST, UPDATE_PLAYERS, UPDATE_PLAYER, ADD_PLAYER,
-  REMOVE_PLAYER, SET_NEXT_PLAYER, UPDATE_BOARD, RESET_BOARD, COLOR_SQUARE,
-  BLINK_SQUARES, UNBLINK_SQUARES, START_GAME, STOP_GAME, REPORT_DRAW,
+  REMOVE_PLAYER, SET_NEXT_PLAYER, CREATE_BOARD, UPDATE_BOARD, RESET_BOARD,
+  COLOR_SQUARE, BLINK_SQUARES, UNBLINK_SQUARES, START_GAME, STOP_GAME, REPORT_DRAW,
   REPORT_TRY_AGAIN,
 } from './actions';
 
@@ -85,6 +85,20 @@ function appReducer(state = initialState, action) {
       });
     }
 
+    case CREATE_BOARD: {
+      const newGrid = [];
+      for (let row = 0; row < action.numRows; row++) {
+        newGrid.push(new Array(action.numColumns).fill(null));
+      }
+
+      return update(state, {
+        numRows: action.numRows,
+        numColumns: action.numColumns,
+        numToWin: action.numToWin,
+        grid: newGrid,
+      });
+    }
+
     case UPDATE_BOARD: {
       return update(state, {
         numRows: action.board.numRows,
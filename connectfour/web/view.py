@@ -1,15 +1,27 @@
-import random
-import string
+from flask import Flask, Response, render_template, request
+from flask_socketio import SocketIO
 
-from flask import Flask, render_template, request
-from flask_socketio import SocketIO, join_room, emit
+from connectfour.instrumentation import PubSubStats, get_rooms_prometheus_text
+from connectfour.model import DEFAULT_ROWS, DEFAULT_COLUMNS, DEFAULT_TO_WIN
+from connectfour.web.checkpoints import CHECKPOINT_INTERVAL, Checkpointer
+from connectfour.web.rooms import SWEEP_INTERVAL, RoomManager
+from connectfour.web.sharding import ShardRouter
 
-from connectfour.model import (
-    ConnectFourModel, DEFAULT_ROWS, DEFAULT_COLUMNS, DEFAULT_TO_WIN)
-from connectfour.pubsub import ModelAction, ViewAction, PubSub
-from connectfour.web.localsettings import DEBUG
+try:
+    from connectfour.web.localsettings import DEBUG
+except ImportError:
+    DEBUG = False
 
-ROOM_ID_LENGTH = 4
+# Whether to collect statistics about each room's pubsub, served in the
+# Prometheus text format at /metrics along with room counts. Only rooms run
+# in the server's own process (i.e., not sharded) are included.
+COLLECT_PUBSUB_STATS = False
+
+# Seconds between checks for messages from shards
+SHARD_POLL_INTERVAL = 0.005
+
+# SQLite database to checkpoint rooms to, and restore them from at startup
+CHECKPOINT_PATH = 'rooms.sqlite3'
 
 
 # Set up application
@@ -20,84 +32,97 @@ app.config.update(
 )
 socketio = SocketIO(app, async_mode=async_mode)
 
-# To map user session ids to room
-sid_to_room = {}
-
-# To map rooms to room-specific state
-room_to_state = {}
-
-
-class RoomState():
-    """Room-specific state, including model and model event handlers."""
-
-    def __init__(self, room):
-        self.room = room
-        self.pubsub = PubSub()
-        self.model = ConnectFourModel(self.pubsub)
-        self._create_subscriptions()
-
-    def _create_subscriptions(self):
-        responses = {
-            ModelAction.board_created: self.on_board_created,
-            ModelAction.player_added: self.on_player_added,
-            ModelAction.player_removed: self.on_player_removed,
-            ModelAction.game_started: self.on_game_started,
-            ModelAction.next_player: self.on_next_player,
-            ModelAction.try_again: self.on_try_again,
-            ModelAction.color_played: self.on_color_played,
-            ModelAction.game_won: self.on_game_won,
-            ModelAction.game_draw: self.on_game_draw,
-        }
-
-        for action, response in responses.items():
-            self.pubsub.subscribe(action, response)
-
-    def on_player_added(self, player):
-        socketio.emit('playerAdded', {
-            'player': player.get_json(),
-        }, room=self.room)
-
-    def on_player_removed(self, player):
-        socketio.emit('playerRemoved', {
-            'player': player.get_json(),
-        }, room=self.room)
-
-    def on_board_created(self, board):
-        socketio.emit('boardCreated', {
-            'board': board.get_json(),
-        }, room=self.room)
-
-    def on_game_started(self):
-        socketio.emit('gameStarted', {}, room=self.room)
-
-    def on_next_player(self, player):
-        socketio.emit('nextPlayer', {
-            'player': player.get_json(),
-        }, room=self.room)
-
-    def on_try_again(self, player, reason):
-        socketio.emit('tryAgain', {
-            'player': player.get_json(),
-            'reason': reason.name,
-        }, room=self.room)
-
-    def on_color_played(self, color, position):
-        socketio.emit('colorPlayed', {
-            'color': color.name,
-            'position': position,
-        }, room=self.room)
-
-    def on_game_won(self, winner, winning_positions):
-        socketio.emit('gameWon', {
-            'winner': winner.get_json(),
-            'players': self.model.get_json_players(),
-            'winningPositions': list(sorted(winning_positions)),
-        }, room=self.room)
-
-    def on_game_draw(self):
-        socketio.emit('gameDraw', {
-            'players': self.model.get_json_players(),
-        }, room=self.room)
+# Statistics collected from all rooms' pubsubs
+pubsub_stats = PubSubStats()
+
+
+def _emit(event, data, to):
+    socketio.emit(event, data, room=to)
+
+
+def _join(sid, room):
+    # Through the server, since flask_socketio.join_room only joins the
+    # client of the current request, and shards' joins are relayed outside
+    # of any request
+    socketio.server.enter_room(sid, room, namespace='/')
+
+
+def _schedule(delay, function):
+    """Call a function after a delay, in a background task.
+
+    Waiting with socketio.sleep lets the server handle other events
+    (including other rooms) in the meantime.
+    """
+    def call_later():
+        socketio.sleep(delay)
+        function()
+
+    socketio.start_background_task(call_later)
+
+
+# All rooms, in this process unless start is called with shards. Either
+# way, rooms.handle(command, sid, data) handles a message from a client.
+rooms = RoomManager(
+    _emit, _join, _schedule,
+    pubsub_stats=pubsub_stats if COLLECT_PUBSUB_STATS else None)
+
+# Checkpoints rooms run in this process, if enabled
+checkpointer = None
+
+
+def start(num_shards=0, checkpoint_path=CHECKPOINT_PATH):
+    """Start background tasks. Must be called before the server starts.
+
+    Args:
+        num_shards (Optional[int]): Number of shard processes to run rooms
+            in. 0 to run rooms in this process.
+        checkpoint_path (Optional[str]): SQLite database to restore rooms
+            from, then checkpoint them to. None to not checkpoint.
+    """
+    global rooms, checkpointer
+
+    if not num_shards:
+        # Shards sweep and checkpoint their own rooms
+        def sweep_rooms():
+            while True:
+                socketio.sleep(SWEEP_INTERVAL)
+                rooms.sweep()
+
+        socketio.start_background_task(sweep_rooms)
+
+        if checkpoint_path is not None:
+            checkpointer = Checkpointer(checkpoint_path)
+            rooms.restore(checkpointer.load())
+
+            def checkpoint_rooms():
+                while True:
+                    socketio.sleep(CHECKPOINT_INTERVAL)
+                    checkpointer.checkpoint(rooms.room_to_state)
+
+            socketio.start_background_task(checkpoint_rooms)
+
+        return
+
+    rooms = ShardRouter(num_shards, _emit, _join,
+                        checkpoint_path=checkpoint_path)
+    rooms.start()
+
+    def relay_messages():
+        while True:
+            rooms.poll()
+            socketio.sleep(SHARD_POLL_INTERVAL)
+
+    socketio.start_background_task(relay_messages)
+
+
+def stop():
+    """Checkpoint all rooms one last time, e.g. before a restart."""
+    if isinstance(rooms, ShardRouter):
+        rooms.stop()
+
+    elif checkpointer is not None:
+        checkpointer.checkpoint(rooms.room_to_state)
+        checkpointer.close()
 
 
 @app.route('/', methods=['POST', 'GET'])
@@ -112,98 +137,42 @@ def index():
     return render_template('index.html', **context)
 
 
-@socketio.on('addUser')
-def on_add_user(data):
-    name = data['username']
+@app.route('/metrics')
+def metrics():
+    """Room counts, and pubsub statistics from all rooms, for Prometheus."""
+    text = get_rooms_prometheus_text(rooms.get_metrics())
 
-    if 'room' in data:
-        room = data['room']
+    if COLLECT_PUBSUB_STATS:
+        text += pubsub_stats.get_prometheus_text()
 
-        if room not in room_to_state:
-            emit('roomDoesNotExist', {
-              'room': room,
-            })
-            return
+    return Response(text, mimetype='text/plain; version=0.0.4')
 
-    else:
-        room = _create_new_room()
 
-    join_room(room)
-    sid_to_room[request.sid] = room
-    room_state = _get_room_state(request)
-    model = room_state.model
+@socketio.on('addUser')
+def on_add_user(data):
+    rooms.handle('addUser', request.sid, data)
 
-    emit('roomJoined', {
-        'pk': request.sid,
-        'room': room,
-        'players': model.get_json_players(),
-        'board': model.get_json_board(),
-    })
 
-    pubsub = room_state.pubsub
-    pubsub.publish(
-        ViewAction.add_player, trigger_queue=True, name=name, pk=request.sid)
+@socketio.on('resync')
+def on_resync(data):
+    rooms.handle('resync', request.sid, data)
 
 
 @socketio.on('disconnect')
 def on_disconnect():
-    try:
-        model = _get_room_state(request).model
-    except KeyError:
-        return
-
-    player = [p for p in model.players if p.pk == request.sid][0]
-    pubsub = _get_room_state(request).pubsub
-    pubsub.publish(ViewAction.remove_player, trigger_queue=True, player=player)
-
-    room = sid_to_room[request.sid]
-    del sid_to_room[request.sid]
-
-    if not model.players:
-        del room_to_state[room]
+    rooms.handle('disconnect', request.sid, {})
 
 
 @socketio.on('createBoard')
 def on_create_board(data):
-    num_rows = int(data['numRows'])
-    num_columns = int(data['numColumns'])
-    num_to_win = int(data['numToWin'])
-
-    pubsub = _get_room_state(request).pubsub
-    pubsub.publish(
-        ViewAction.create_board, trigger_queue=True, num_rows=num_rows,
-        num_columns=num_columns, num_to_win=num_to_win)
+    rooms.handle('createBoard', request.sid, data)
 
 
 @socketio.on('startGame')
 def on_start_game(data):
-    # TODO: add error checking
-    pubsub = _get_room_state(request).pubsub
-    pubsub.publish(ViewAction.start_game, trigger_queue=True)
+    rooms.handle('startGame', request.sid, data)
 
 
 @socketio.on('play')
 def on_play(data):
-    # TODO: add error checking (that current player really played)
-    column = int(data['column'])
-    pubsub = _get_room_state(request).pubsub
-    pubsub.publish(ViewAction.play, trigger_queue=True, column=column)
-
-
-###########
-# Helpers #
-###########
-
-def _get_room_state(request):
-    return room_to_state[sid_to_room[request.sid]]
-
-
-def _create_new_room():
-    room = _get_random_string(ROOM_ID_LENGTH)
-    room_to_state[room] = RoomState(room)
-    return room
-
-
-def _get_random_string(length):
-    return ''.join(random.choice(string.ascii_uppercase)
-                   for _ in range(length))
+    rooms.handle('play', request.sid, data)
@@ -0,0 +1,43 @@
+#!/usr/bin/env python
+
+import argparse
+import time
+
+from connectfour.ai.book import (
+    DEFAULT_BOOK_PATH, DEFAULT_NUM_PLIES, generate_book, write_book)
+from connectfour.model import (
+    Board, Color, DEFAULT_ROWS, DEFAULT_COLUMNS, DEFAULT_TO_WIN)
+
+
+parser = argparse.ArgumentParser(
+    description='Generate an opening book for the expert AI.')
+
+parser.add_argument('--plies', type=int, default=DEFAULT_NUM_PLIES,
+                    help='Include positions with up to this many plays')
+parser.add_argument('--depth', type=int, default=None,
+                    help='Plays to look ahead from each position '
+                         '(default: rest of the game)')
+parser.add_argument('--time', type=float, default=5.0,
+                    help='Seconds to search each position for '
+                         '(0 to always search to --depth)')
+parser.add_argument('--rows', type=int, default=DEFAULT_ROWS)
+parser.add_argument('--columns', type=int, default=DEFAULT_COLUMNS)
+parser.add_argument('--to-win', type=int, default=DEFAULT_TO_WIN)
+parser.add_argument('--output', default=DEFAULT_BOOK_PATH,
+                    help='Where to write the book')
+
+args = parser.parse_args()
+
+board = Board(args.rows, args.columns, args.to_win)
+records = []
+start = time.time()
+
+for record in generate_book(
+        board, (Color.black, Color.red), num_plies=args.plies,
+        max_depth=args.depth, max_time=args.time or None):
+    records.append(record)
+    print('{} positions searched ({:.0f} s)'.format(
+        len(records), time.time() - start), end='\r')
+
+write_book(args.output, board, records)
+print('\nWrote {} positions to {}'.format(len(records), args.output))
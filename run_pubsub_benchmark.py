@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+
+import argparse
+import time
+
+from connectfour.pubsub import ModelAction, PubSub
+
+
+class ClosurePubSub(PubSub):
+    """
+    PubSub as it was, with subscriptions keyed on Action, and queueing one
+    closure per subscribed callback.
+    """
+
+    def subscribe(self, action, callback):
+        if action not in self.subscriptions:
+            self.subscriptions[action] = []
+
+        self.subscriptions[action].append(callback)
+
+    def do_queue(self):
+        while len(self.queue):
+            callback = self.queue.popleft()
+            callback()
+
+    def publish(self, action, trigger_queue=False, *args, **kwargs):
+        if action not in self.subscriptions:
+            return
+
+        for callback in self.subscriptions[action]:
+            def do_callback():
+                return callback(*args, **kwargs)
+
+            self.queue.append(do_callback)
+
+        if trigger_queue:
+            self.do_queue()
+
+
+def run(pubsub, num_events, num_subscribers):
+    """
+    Publish a move's worth of actions (color_played, then next_player) at a
+    time, draining the queue after each move, as a view would. Returns the
+    number of callbacks called per second.
+    """
+    def callback(**kwargs):
+        pass
+
+    for action in (ModelAction.color_played, ModelAction.next_player):
+        for i in range(num_subscribers):
+            pubsub.subscribe(action, callback)
+
+    start = time.perf_counter()
+
+    for i in range(num_events // 2):
+        pubsub.publish(ModelAction.color_played, color=None, position=(0, 0))
+        pubsub.publish(ModelAction.next_player, player=None)
+        pubsub.do_queue()
+
+    return num_events * num_subscribers / (time.perf_counter() - start)
+
+
+parser = argparse.ArgumentParser(
+    description='Compare event throughput of the old and current PubSub.')
+
+parser.add_argument('--events', type=int, default=500000,
+                    help='Actions to publish')
+parser.add_argument('--subscribers', type=int, default=2,
+                    help='Callbacks subscribed to each action')
+parser.add_argument('--repeat', type=int, default=3,
+                    help='Runs of each, keeping the fastest')
+
+args = parser.parse_args()
+
+for name, pubsub_class in (('dict, closures', ClosurePubSub),
+                           ('current', PubSub)):
+    rate = max(run(pubsub_class(), args.events, args.subscribers)
+               for i in range(args.repeat))
+    print('{:18} {:>12,.0f} events/s'.format(name, rate))
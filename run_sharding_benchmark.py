@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+
+import argparse
+import random
+import time
+
+from connectfour.web.sharding import ShardRouter
+
+
+class Clients(object):
+    """
+    Two clients per room, each playing a random column whenever it is their
+    turn, and starting another game when a game ends, until each room has
+    played enough games.
+    """
+
+    def __init__(self, num_rooms, num_games):
+        self.num_rooms = num_rooms
+        self.num_games = num_games
+        self.router = None
+        self.rng = random.Random(0)
+
+        # To map rooms to the number of games finished in them
+        self.room_to_num_games = {}
+        self.num_finished_rooms = 0
+
+    def emit(self, event, data, to):
+        if event == 'roomJoined' and to.startswith('a'):
+            # The room's creator adds the second player, then sets up
+            room = data['room']
+            self.room_to_num_games[room] = 0
+            self.router.handle('addUser', 'b' + to[1:], {
+                'username': 'b', 'room': room})
+            self.router.handle('createBoard', to, {
+                'numRows': 6, 'numColumns': 7, 'numToWin': 4})
+            self.router.handle('startGame', to, {})
+
+        elif event == 'events':
+            for name, event_data in data['events']:
+                self.on_event(to, name, event_data)
+
+    def on_event(self, room, name, data):
+        if name == 'nextPlayer':
+            self.router.handle('play', data['player']['pk'], {
+                'column': self.rng.randrange(7)})
+
+        elif name in ('gameWon', 'gameDraw'):
+            self.room_to_num_games[room] += 1
+
+            if self.room_to_num_games[room] < self.num_games:
+                sid = data['players'][0]['pk']
+                self.router.handle('startGame', sid, {})
+            else:
+                self.num_finished_rooms += 1
+
+        elif name == 'tryAgain':
+            self.router.handle('play', data['player']['pk'], {
+                'column': self.rng.randrange(7)})
+
+    def join(self, sid, room):
+        pass
+
+    def run(self, num_shards):
+        """Play all games, returning the number finished per second."""
+        self.router = ShardRouter(num_shards, self.emit, self.join)
+        self.router.start()
+
+        start = time.perf_counter()
+
+        for i in range(self.num_rooms):
+            self.router.handle('addUser', 'a{}'.format(i), {'username': 'a'})
+
+        while self.num_finished_rooms < self.num_rooms:
+            if not self.router.poll():
+                time.sleep(0.001)
+
+        seconds = time.perf_counter() - start
+        self.router.stop()
+        return self.num_rooms * self.num_games / seconds
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Measure games played per second, by number of shards.')
+    parser.add_argument(
+        '--shards', type=int, nargs='+', default=[1, 2, 4],
+        help='numbers of shards to try (default: 1 2 4)')
+    parser.add_argument(
+        '--rooms', type=int, default=64,
+        help='number of rooms playing at once (default: 64)')
+    parser.add_argument(
+        '--games', type=int, default=20,
+        help='number of games per room (default: 20)')
+    args = parser.parse_args()
+
+    for num_shards in args.shards:
+        games_per_second = Clients(args.rooms, args.games).run(num_shards)
+        print('{} shards: {:,.0f} games/s'.format(
+            num_shards, games_per_second))
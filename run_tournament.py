@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+
+import argparse
+import time
+
+from connectfour.model import DEFAULT_ROWS, DEFAULT_COLUMNS, DEFAULT_TO_WIN
+from connectfour.tournament import (
+    Entrant, ResultWriter, Standings, run_tournament)
+
+
+parser = argparse.ArgumentParser(
+    description='Play a round-robin tournament between AI players.')
+
+parser.add_argument('entrants', nargs='+', metavar='AI',
+                    help="An AI difficulty, optionally with the seconds it "
+                         "may spend per play (e.g. 'easy', 'expert:0.1')")
+parser.add_argument('--games', type=int, default=10,
+                    help='Games each pair of AIs plays')
+parser.add_argument('--workers', type=int, default=1,
+                    help='Processes to play games in')
+parser.add_argument('--seed', type=int, default=None)
+parser.add_argument('--rows', type=int, default=DEFAULT_ROWS)
+parser.add_argument('--columns', type=int, default=DEFAULT_COLUMNS)
+parser.add_argument('--to-win', type=int, default=DEFAULT_TO_WIN)
+parser.add_argument('--output', default='tournament.jsonl',
+                    help='Where to write each game (.csv for CSV, '
+                         'JSON Lines otherwise)')
+
+args = parser.parse_args()
+
+try:
+    entrants = [Entrant.from_spec(spec) for spec in args.entrants]
+except ValueError as e:
+    parser.error(e)
+
+names = [entrant.name for entrant in entrants]
+standings = Standings(names)
+start = time.time()
+
+with ResultWriter(args.output) as writer:
+    for result in run_tournament(
+            entrants, args.games, num_workers=args.workers,
+            num_rows=args.rows, num_columns=args.columns,
+            num_to_win=args.to_win, seed=args.seed):
+        writer.write(result)
+        standings.add_result(result)
+        print('{} games played ({:.1f} games/s)'.format(
+            standings.num_games,
+            standings.num_games / (time.time() - start)), end='\r')
+
+elapsed = time.time() - start
+print('\n{} games, {} plays in {:.1f} s ({:.1f} games/s, {:.0f} plays/s)'
+      .format(standings.num_games, standings.num_moves, elapsed,
+              standings.num_games / elapsed, standings.num_moves / elapsed))
+print('Wrote results to {}\n'.format(args.output))
+
+ratings = standings.get_elo_ratings()
+width = max(len(name) for name in names)
+
+print('{:{width}}  {:>6}  {:>7}  {:>6}  {:>15}'.format(
+    'AI', 'Elo', 'Points', 'Score', '95% interval', width=width))
+
+for name in sorted(names, key=ratings.get, reverse=True):
+    points = standings.get_points(name)
+    num_games = standings.get_num_games(name)
+    low, high = standings.get_score_interval(name)
+    print('{:{width}}  {:>+6.0f}  {:>7}  {:>6.1%}  {:>6.1%} - {:>6.1%}'
+          .format(name, ratings[name], '{:g}/{}'.format(points, num_games),
+                  points / num_games if num_games else 0, low, high,
+                  width=width))
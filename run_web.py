@@ -1,7 +1,29 @@
 #!/usr/bin/env python
 
-from connectfour.web.view import app, socketio
+import argparse
+
+from connectfour.web.view import CHECKPOINT_PATH, app, socketio, start, stop
 
 
 if __name__ == '__main__':
-    socketio.run(app)
+    parser = argparse.ArgumentParser(description='Run the web server.')
+    parser.add_argument(
+        '--shards', type=int, default=0,
+        help='number of processes to run rooms in (default: 0, meaning '
+             'rooms run in the server process)')
+    parser.add_argument(
+        '--checkpoint', default=CHECKPOINT_PATH,
+        help='SQLite database to save rooms to, and restore them from when '
+             'started (default: {})'.format(CHECKPOINT_PATH))
+    parser.add_argument(
+        '--no-checkpoint', action='store_true',
+        help='do not save or restore rooms')
+    args = parser.parse_args()
+
+    start(num_shards=args.shards,
+          checkpoint_path=None if args.no_checkpoint else args.checkpoint)
+
+    try:
+        socketio.run(app)
+    finally:
+        stop()